@@ -1,42 +1,58 @@
 import sys
 import os
-from PyQt5.QtWidgets import (QMainWindow, QApplication, QTextEdit,
+import time
+import startup_trace
+
+if __name__ == '__main__':
+    # 打包后查找进程池的工作进程也从这里启动，需要最先处理；
+    # 未打包时 freeze_support 什么也不做，不必在启动时导入 multiprocessing
+    if getattr(sys, 'frozen', False):
+        import multiprocessing
+        multiprocessing.freeze_support()
+    # 已有实例在运行时把文件交给它打开后直接退出，不必再加载编辑器的其余部分
+    import single_instance
+    # 相对路径要在切换工作目录之前转换
+    file_args = [os.path.abspath(arg) for arg in sys.argv[1:]]
+    if single_instance.send_to_running_instance(file_args):
+        sys.exit(0)
+
+from PyQt5.QtWidgets import (QMainWindow, QApplication, QWidget, QVBoxLayout,
                            QAction, QFileDialog, QMessageBox,
-                           QTabWidget, QLabel, QSystemTrayIcon, QMenu,
-                           QDialog, QVBoxLayout, QHBoxLayout, QPushButton,
-                           QKeySequenceEdit, QFormLayout)
-from PyQt5.QtGui import QIcon, QTextOption, QFont, QColor, QKeySequence
-from PyQt5.QtCore import Qt, QSettings, QAbstractNativeEventFilter
-from PyQt5.Qsci import (QsciScintilla, QsciLexerPython, QsciLexerCPP, 
-                       QsciLexerHTML, QsciLexerJavaScript, QsciLexerCSS,
-                       QsciLexerXML, QsciLexerSQL)
-import winreg
-import ctypes
-from ctypes import wintypes
+                           QTabWidget, QSystemTrayIcon, QMenu, QToolButton,
+                           QActionGroup)
+from PyQt5.QtGui import QIcon, QFont, QColor, QKeySequence
+from PyQt5.QtCore import Qt, QTimer
+from PyQt5.Qsci import QsciScintilla
+import platform_support
+from platform_support import MOD_ALT, MOD_CONTROL, MOD_SHIFT, MOD_WIN
+from file_loader import FileLoader, LoadProgressWidget
+from file_saver import FileSaver, snapshot_bytes
+from huge_viewer import HugeFileViewer, DEFAULT_THRESHOLD_MB
+from hex_viewer import HexViewer
+import encoding_detect
+import ui_scheduler
+import settings_store
+import lexers
+import perf_profile
+from tab_hibernation import TabPlaceholder, TabHibernator
+import perf_trace
+from perf_hud import PerfHud
+from find_bar import FindBar
+import outline
+from change_watch import FileChangeWatcher, ReloadWorker, apply_hunks
+import compressed_files
+import hot_exit
+import file_metadata
 
 # 在文件开头添加版本号常量
 VERSION = "2025/2/14-03"
 
-# Windows 热键常量
-MOD_ALT = 0x0001
-MOD_CONTROL = 0x0002
-MOD_SHIFT = 0x0004
-MOD_WIN = 0x0008
-WM_HOTKEY = 0x0312
-
-class GlobalHotkeyFilter(QAbstractNativeEventFilter):
-    """全局热键事件过滤器"""
-    def __init__(self, callback):
-        super().__init__()
-        self.callback = callback
-
-    def nativeEventFilter(self, eventType, message):
-        if eventType == "windows_generic_MSG":
-            msg = wintypes.MSG.from_address(message.__int__())
-            if msg.message == WM_HOTKEY:
-                self.callback()
-                return True, 0
-        return False, 0
+# 换行符显示名称 -> Scintilla 的换行模式
+EOL_MODES = {
+    'Windows (CRLF)': QsciScintilla.SC_EOL_CRLF,
+    'Unix (LF)': QsciScintilla.SC_EOL_LF,
+    'Mac (CR)': QsciScintilla.SC_EOL_CR,
+}
 
 def resource_path(relative_path):
     """获取资源的绝对路径"""
@@ -49,76 +65,44 @@ def resource_path(relative_path):
     
     return os.path.join(base_path, relative_path)
 
-def is_admin():
-    """检查是否具有管理员权限"""
-    try:
-        return ctypes.windll.shell32.IsUserAnAdmin()
-    except:
-        return False
-
-def add_context_menu():
-    """添加右键菜单"""
-    try:
-        # 获取程序路径
-        exe_path = sys.executable if getattr(sys, 'frozen', False) else sys.argv[0]
-        exe_path = f'"{exe_path}"'  # 添加引号以处理路径中的空格
-        
-        # 为所有文件添加右键菜单
-        key_path = "*\\shell\\TextEditor"
-        key = winreg.CreateKey(winreg.HKEY_CLASSES_ROOT, key_path)
-        
-        # 设置默认值
-        winreg.SetValue(key, "", winreg.REG_SZ, "TextEditor Context menu")
-        
-        # 设置显示的文本
-        winreg.SetValueEx(key, "MUIVerb", 0, winreg.REG_SZ, "使用文本编辑器打开(&T)")
-        
-        # 设置图标
-        if getattr(sys, 'frozen', False):
-            # 如果是打包后的exe，使用exe本身作为图标源
-            exe_path = sys.executable
-            winreg.SetValueEx(key, "Icon", 0, winreg.REG_SZ, f'"{exe_path}",0')
-        else:
-            # 开发环境下使用icon.ico
-            icon_path = resource_path("icon.ico")
-            if os.path.exists(icon_path):
-                abs_icon_path = os.path.abspath(icon_path)
-                abs_icon_path = abs_icon_path.replace('/', '\\')
-                winreg.SetValueEx(key, "Icon", 0, winreg.REG_SZ, f'"{abs_icon_path}",0')
-        
-        # 创建command子键
-        key_command = winreg.CreateKey(key, "command")
-        winreg.SetValue(key_command, "", winreg.REG_SZ, f'{exe_path} "%1"')
-        
-        # 关闭键
-        winreg.CloseKey(key_command)
-        winreg.CloseKey(key)
-        return True
-    except Exception as e:
-        print(f"添加右键菜单失败: {str(e)}")
-        return False
-
-def remove_context_menu():
-    """移除右键菜单"""
-    try:
-        key_path = "*\\shell\\TextEditor"
-        # 直接删除主键即可，子键会自动删除
-        winreg.DeleteKey(winreg.HKEY_CLASSES_ROOT, key_path)
-        return True
-    except Exception as e:
-        print(f"移除右键菜单失败: {str(e)}")
-        return False
-
 class Editor(QsciScintilla):
     """单个编辑器组件"""
     def __init__(self, parent=None):
         super().__init__(parent)
-        self.settings = QSettings('TextEditor', 'EditorSettings')
+        self.settings = settings_store.get_store('EditorSettings')
         self.setup_editor()
         self.modified = False  # 添加修改状态标志
         self.filepath = None
         self.encoding = 'UTF-8'  # 默认编码
+        self.encoding_confidence = 1.0
         self.line_ending = 'Windows (CRLF)'  # 默认换行符
+        self.mixed_line_endings = False
+        self.loader = None  # 正在进行的后台加载
+        self.saver = None   # 正在进行的后台保存
+        self.text_version = 0  # 每次用户修改文本时递增，用于判断保存期间是否又有修改
+        self.main_window = None  # 加入标签页时由主窗口设置
+        self.title = '未命名'      # 不含修改标记的标签标题
+        self.shown_title = None  # 标签上当前显示的标题
+        self.margin_digits = 0   # 行号栏当前按多少位数字设置的宽度
+        self.profile = perf_profile.FULL  # 当前性能档位
+        self.profile_override = None      # 用户手动指定的档位，None 表示自动
+        self.profile_length = 0           # 上次评估档位时的文档字节数
+        self.profile_lines = 1            # 上次评估档位时的行数
+        self.longest_line = 0             # 已知的最长行长度
+        self.last_active = time.monotonic()  # 最近一次成为当前标签的时间
+        self.pending_view_state = None    # 加载完成后要恢复的视图状态（休眠恢复时）
+        self.appending_loaded_text = False
+        self.language = None              # 当前语法高亮的语言，None 表示纯文本
+        self.follower = None              # 跟随文件末尾时的 FileFollower
+        self.loaded_size = 0              # 已读入编辑器的文件字节数，跟随时从这里继续读
+        self.disk_changed = False         # 文件被其他程序修改，尚未询问是否重新加载
+        self.reloader = None              # 正在进行的重新加载
+        self.compression = None           # 压缩文件的格式，保存时按它重新压缩
+        self.journal = None               # 热退出的修改日志（hot_exit.EditJournal）
+        self.pending_recovery = None      # 加载完成后要重放的日志（恢复上次会话时）
+        # 转换编码后尚未保存的新编码；它不改变文本，撤销到保存点时文档仍是已修改
+        self.pending_encoding = None
+        self.symbols = None               # 符号索引（outline.DocumentSymbols）
         # 连接文本修改信号
         self.textChanged.connect(self.handleTextChanged)
         # 恢复缩放级别
@@ -156,88 +140,181 @@ class Editor(QsciScintilla):
         # 连接信号
         self.modificationChanged.connect(self.handleModificationChanged)
         
+    @perf_trace.timed('handleTextChanged')
     def handleTextChanged(self):
         """处理文本变化"""
+        if self.appending_loaded_text:
+            # 后台加载追加的内容不算用户修改
+            self.scheduleUpdate(ui_scheduler.MARGIN)
+            return
         self.modified = True
-        self.updateLineNumberWidth()
-        # 通知父窗口更新标签
-        main_window = self.get_main_window()
-        if main_window:
-            index = main_window.tabs.indexOf(self)
-            main_window.updateTabTitle(index)
+        self.text_version += 1
+        self.scheduleUpdate(ui_scheduler.MARGIN | ui_scheduler.TAB_TITLE | ui_scheduler.PROFILE)
     
     def handleModificationChanged(self, modified):
         """处理文本修改状态改变"""
-        self.modified = modified
+        self.modified = modified or self.pending_encoding is not None
         # 通知父窗口更新标签
-        if hasattr(self, 'parent'):
-            parent = self.parent()
-            while parent and not isinstance(parent, TextEditor):
-                parent = parent.parent()
-            if parent:
-                index = parent.tabs.indexOf(self)
-                parent.updateTabTitle(index)
+        self.scheduleUpdate(ui_scheduler.TAB_TITLE)
+
+    def scheduleUpdate(self, flags):
+        """请求在本轮事件循环空闲时更新界面，尚未加入主窗口时立即更新行号栏"""
+        main_window = self.get_main_window()
+        if main_window:
+            main_window.scheduler.schedule(self, flags)
+        elif flags & ui_scheduler.MARGIN:
+            self.updateLineNumberWidth()
     
-    def set_lexer_by_filename(self, filename):
-        """根据文件名设置对应的语法高亮"""
-        if not filename:
+    def set_lexer_by_filename(self, filename, text=None, language=None):
+        """根据文件名（或文件开头的 shebang/模式行）设置对应的语法高亮
+
+        language 已知时（来自元数据缓存）直接使用，不再判断。
+        """
+        if self.profile == perf_profile.HUGE:
+            # 超大文件档位不使用语法高亮
             return
-            
-        ext = os.path.splitext(filename)[1].lower()
-        lexer = None
-        
-        if ext in ['.py', '.pyw']:
-            lexer = QsciLexerPython(self)
-        elif ext in ['.c', '.cpp', '.h', '.hpp']:
-            lexer = QsciLexerCPP(self)
-        elif ext in ['.html', '.htm']:
-            lexer = QsciLexerHTML(self)
-        elif ext == '.js':
-            lexer = QsciLexerJavaScript(self)
-        elif ext == '.css':
-            lexer = QsciLexerCSS(self)
-        elif ext == '.xml':
-            lexer = QsciLexerXML(self)
-        elif ext == '.sql':
-            lexer = QsciLexerSQL(self)
-            
+        language = language or lexers.language_for(filename, text)
+        if not language:
+            return
+        self.language = language
+
+        lexer = lexers.get_lexer(language, self.font, self)
         if lexer:
-            # 设置lexer的字体
-            lexer.setFont(self.font)
             self.setLexer(lexer)
     
+    def evaluateProfile(self, size=None, lines=None, longest_line=None):
+        """根据文档规模（未给出的取当前值）选择并应用性能档位"""
+        if size is not None:
+            self.profile_length = size
+        if lines is not None:
+            self.profile_lines = lines
+        if longest_line is not None:
+            self.longest_line = longest_line
+        profile = self.profile_override or perf_profile.choose_profile(
+            self.profile_length, self.profile_lines, self.longest_line)
+        if profile != self.profile:
+            self.profile = profile
+            perf_profile.apply_profile(self, profile)
+            self.scheduleUpdate(ui_scheduler.STATUS_BAR)
+
+    def checkProfile(self):
+        """文档长度变化较大时（例如大段粘贴）重新评估性能档位"""
+        length = self.SendScintilla(QsciScintilla.SCI_GETLENGTH)
+        if abs(length - self.profile_length) < perf_profile.REEVALUATE_BYTES:
+            return
+        lines = self.lines()
+        longest = self.longest_line
+        added = lines - self.profile_lines
+        if added >= 0:
+            # 新内容位于光标之前的 added 行中
+            caret_line = self.getCursorPosition()[0]
+            longest = max(longest, perf_profile.longest_line_in(
+                self, max(0, caret_line - added), caret_line))
+        self.evaluateProfile(length, lines, longest)
+
     def detect_line_ending(self, text):
         """检测文本的换行符类型"""
-        if '\r\n' in text:
-            self.line_ending = 'Windows (CRLF)'
-        elif '\n' in text:
-            self.line_ending = 'Unix (LF)'
-        elif '\r' in text:
-            self.line_ending = 'Mac (CR)'
-        else:
-            self.line_ending = 'Windows (CRLF)'  # 默认值
+        counts = encoding_detect.count_line_endings(text)
+        self.line_ending, self.mixed_line_endings = encoding_detect.line_ending_from_counts(counts)
+
+    @property
+    def line_ending(self):
+        """主要换行符的显示名称，见 encoding_detect.LINE_ENDINGS"""
+        return self._line_ending
+
+    @line_ending.setter
+    def line_ending(self, name):
+        # 缓冲区中保持文件原有的换行符，输入新行时使用主要换行符
+        self._line_ending = name
+        self.SendScintilla(QsciScintilla.SCI_SETEOLMODE,
+                           EOL_MODES.get(name, QsciScintilla.SC_EOL_CRLF))
+
+    def convertLineEndings(self, line_ending):
+        """把所有换行符转换为 line_ending，作为一个撤销步骤
+
+        复制出缓冲区的 UTF-8 字节，用 bytes.replace 转换后一次替换回去，
+        转换和撤销都只是几次内存复制。SCI_CONVERTEOLS 会为每个换行符记录
+        一条撤销操作，撤销时逐条重放，大文件上要几分钟。和全部替换一样，
+        替换期间不发送修改通知、不自动换行。
+        """
+        data = snapshot_bytes(self)
+        eol = encoding_detect.LINE_ENDINGS[line_ending].encode()
+        converted = data.replace(b'\r\n', b'\n').replace(b'\r', b'\n')
+        if eol != b'\n':
+            converted = converted.replace(b'\n', eol)
+        if converted != data:
+            # 换行符转换不改变行号和行内位置
+            line, index = self.getCursorPosition()
+            first_line = self.firstVisibleLine()
+            send = self.SendScintilla
+            mask = send(QsciScintilla.SCI_GETMODEVENTMASK)
+            send(QsciScintilla.SCI_SETMODEVENTMASK, 0)
+            wrap = send(QsciScintilla.SCI_GETWRAPMODE)
+            send(QsciScintilla.SCI_SETWRAPMODE, QsciScintilla.SC_WRAP_NONE)
+            send(QsciScintilla.SCI_BEGINUNDOACTION)
+            try:
+                send(QsciScintilla.SCI_SETTARGETRANGE, 0, len(data))
+                send(QsciScintilla.SCI_REPLACETARGET, len(converted), converted)
+            finally:
+                send(QsciScintilla.SCI_ENDUNDOACTION)
+                send(QsciScintilla.SCI_SETWRAPMODE, wrap)
+                send(QsciScintilla.SCI_SETMODEVENTMASK, mask)
+            self.setCursorPosition(line, index)
+            self.setFirstVisibleLine(first_line)
+            self.textChanged.emit()
+            if self.journal is not None:
+                # 修改通知被关闭过，日志改以快照为基准
+                self.journal.resync()
+        self.line_ending = line_ending
+        self.mixed_line_endings = False
             
+    @perf_trace.timed('setText')
     def setText(self, text):
         """重写 setText 方法以检测换行符"""
         self.detect_line_ending(text)
         super().setText(text)
         # 通知父窗口更新状态栏
-        if hasattr(self, 'parent'):
-            parent = self.parent()
-            while parent and not isinstance(parent, TextEditor):
-                parent = parent.parent()
-            if parent:
-                parent.updateStatusBar()
-
-    def updateLineNumberWidth(self):
-        """更新行号栏的宽度"""
+        self.scheduleUpdate(ui_scheduler.STATUS_BAR)
+
+    def appendLoadedText(self, text):
+        """追加后台加载的文本块，不记入撤销历史；加载期间编辑器是只读的，也能追加"""
+        self.appending_loaded_text = True
+        read_only = self.SendScintilla(QsciScintilla.SCI_GETREADONLY)
+        self.SendScintilla(QsciScintilla.SCI_SETREADONLY, 0)
+        self.SendScintilla(QsciScintilla.SCI_SETUNDOCOLLECTION, 0)
+        # 自动换行时插入会同步排版插入的每一行，关掉再打开后改为按需换行
+        wrap = self.SendScintilla(QsciScintilla.SCI_GETWRAPMODE)
+        self.SendScintilla(QsciScintilla.SCI_SETWRAPMODE, QsciScintilla.SC_WRAP_NONE)
+        self.append(text)
+        self.SendScintilla(QsciScintilla.SCI_SETWRAPMODE, wrap)
+        self.SendScintilla(QsciScintilla.SCI_SETUNDOCOLLECTION, 1)
+        self.SendScintilla(QsciScintilla.SCI_SETREADONLY, read_only)
+        self.appending_loaded_text = False
+
+    def clearLoadedText(self):
+        """清空已加载的内容（后台加载更换编码重新开始时调用）"""
+        self.appending_loaded_text = True
+        read_only = self.SendScintilla(QsciScintilla.SCI_GETREADONLY)
+        self.SendScintilla(QsciScintilla.SCI_SETREADONLY, 0)
+        self.SendScintilla(QsciScintilla.SCI_SETUNDOCOLLECTION, 0)
+        self.SendScintilla(QsciScintilla.SCI_CLEARALL)
+        self.SendScintilla(QsciScintilla.SCI_SETUNDOCOLLECTION, 1)
+        self.SendScintilla(QsciScintilla.SCI_SETREADONLY, read_only)
+        self.appending_loaded_text = False
+
+    def updateLineNumberWidth(self, force=False):
+        """更新行号栏的宽度，位数没有变化时跳过（缩放后需要 force）"""
         lines = self.lines()
         # 计算行号需要的位数，然后使用字符串设置宽度
         # QsciScintilla 会根据字符串的长度和当前字体自动计算宽度
         digits = len(str(lines))
+        if digits == self.margin_digits and not force:
+            return
+        self.margin_digits = digits
         # 使用 '9' 字符来设置宽度，加上一些额外空间
         self.setMarginWidth(0, '9' * (digits + 2))
     
+    @perf_trace.timed('keystroke')
     def keyPressEvent(self, event):
         """处理按键事件"""
         # 检查是否按下了 Ctrl+X
@@ -266,8 +343,36 @@ class Editor(QsciScintilla):
             # 其他按键保持默认行为
             super().keyPressEvent(event)
             
+    def dragEnterEvent(self, event):
+        # 拖入的文件交给主窗口打开，而不是把路径作为文本插入
+        if event.mimeData().hasUrls():
+            event.acceptProposedAction()
+            return
+        super().dragEnterEvent(event)
+
+    def dragMoveEvent(self, event):
+        if event.mimeData().hasUrls():
+            event.acceptProposedAction()
+            return
+        super().dragMoveEvent(event)
+
+    def dropEvent(self, event):
+        if event.mimeData().hasUrls():
+            main_window = self.get_main_window()
+            if main_window:
+                main_window.dropEvent(event)
+            return
+        super().dropEvent(event)
+
+    @perf_trace.timed('editor.paint')
+    def paintEvent(self, event):
+        """绘制可见部分，语法高亮的着色也在这里进行"""
+        super().paintEvent(event)
+
     def get_main_window(self):
         """获取主窗口实例"""
+        if self.main_window is not None:
+            return self.main_window
         parent = self.parent()
         while parent:
             if isinstance(parent, TextEditor):
@@ -275,6 +380,26 @@ class Editor(QsciScintilla):
             parent = parent.parent()
         return None
 
+    def viewState(self):
+        """休眠前需要保留的光标、滚动和缩放状态"""
+        return {
+            'cursor': self.getCursorPosition(),
+            'first_line': self.firstVisibleLine(),
+            'zoom': self.SendScintilla(self.SCI_GETZOOM),
+            'profile_override': self.profile_override,
+        }
+
+    def restoreViewState(self, state):
+        """恢复 viewState() 保存的状态"""
+        self.SendScintilla(self.SCI_SETZOOM, state['zoom'])
+        self.updateLineNumberWidth(force=True)
+        line, index = state['cursor']
+        self.setCursorPosition(line, index)
+        self.setFirstVisibleLine(state['first_line'])
+        if state['profile_override'] is not None:
+            self.profile_override = state['profile_override']
+            self.evaluateProfile()
+
     def saveZoomLevel(self):
         """保存缩放级别"""
         current_zoom = self.SendScintilla(self.SCI_GETZOOM)
@@ -285,7 +410,7 @@ class Editor(QsciScintilla):
         zoom_level = self.settings.value('zoomLevel', 0, type=int)
         self.SendScintilla(self.SCI_SETZOOM, zoom_level)
         # 更新行号宽度以适应缩放
-        self.updateLineNumberWidth()
+        self.updateLineNumberWidth(force=True)
         
 class TextEditor(QMainWindow):
     def __init__(self):
@@ -293,7 +418,12 @@ class TextEditor(QMainWindow):
         # 使用 PNG 图标
         icon_path = resource_path("2048x2048.png")
         self.setWindowIcon(QIcon(icon_path))
-        self.settings = QSettings('TextEditor', 'WindowState')
+        self.settings = settings_store.get_store('WindowState')
+        # 窗口拖动、缩放时合并保存窗口状态
+        self.window_state_timer = QTimer(self)
+        self.window_state_timer.setSingleShot(True)
+        self.window_state_timer.setInterval(300)
+        self.window_state_timer.timeout.connect(self.saveWindowState)
         self.hotkey_id = 1  # 热键ID
         self.initUI()
         # 托盘图标也使用相同的 PNG 图标
@@ -306,10 +436,31 @@ class TextEditor(QMainWindow):
         self.tabs = QTabWidget()
         self.tabs.setTabsClosable(True)  # 允许关闭标签
         self.tabs.tabCloseRequested.connect(self.closeTab)
-        self.setCentralWidget(self.tabs)
+        self.tabs.currentChanged.connect(self.handleCurrentTabChanged)
+        # 查找栏放在标签页下方
+        self.findBar = FindBar(self)
+        central = QWidget()
+        centralLayout = QVBoxLayout(central)
+        centralLayout.setContentsMargins(0, 0, 0, 0)
+        centralLayout.setSpacing(0)
+        centralLayout.addWidget(self.tabs)
+        centralLayout.addWidget(self.findBar)
+        self.setCentralWidget(central)
+        self.scheduler = ui_scheduler.UpdateScheduler(self)
+        self.hibernator = TabHibernator(self)
+        # 检测文件被其他程序修改
+        self.changeWatcher = FileChangeWatcher(self)
+        self.changeWatcher.fileChanged.connect(self.handleExternalChange)
+        # 记录修改日志，崩溃或退出后可以恢复所有标签
+        self.recovery = hot_exit.RecoveryManager(self, Editor)
+        self.recovery.start()
+        self.batchOpens = []  # 正在进行的批量打开
+        self.decompressors = []  # 正在为只读查看器解压的超大压缩文件
+        # 拖放文件到窗口时打开
+        self.setAcceptDrops(True)
+        self.status_shown = None  # 状态栏当前显示的内容
         
-        # 创建第一个标签页
-        self.newFile()
+        # 第一个空白标签页在窗口第一次显示时才创建（见 showWindow）
         
         # 创建菜单栏
         menubar = self.menuBar()
@@ -329,12 +480,12 @@ class TextEditor(QMainWindow):
         
         openAction = QAction('打开(&O)', self)
         openAction.setShortcut('Ctrl+O')
-        openAction.triggered.connect(self.openFile)
+        openAction.triggered.connect(lambda: self.openFile())
         fileMenu.addAction(openAction)
         
         saveAction = QAction('保存(&S)', self)
         saveAction.setShortcut('Ctrl+S')
-        saveAction.triggered.connect(self.saveFile)
+        saveAction.triggered.connect(lambda: self.saveFile())
         fileMenu.addAction(saveAction)
         
         # 添加关闭标签的动作
@@ -355,6 +506,80 @@ class TextEditor(QMainWindow):
         zoomOutAction.triggered.connect(self.zoomOut)
         viewMenu.addAction(zoomOutAction)
         
+        goToLineAction = QAction('跳转到行(&G)', self)
+        goToLineAction.setShortcut('Ctrl+G')
+        goToLineAction.triggered.connect(self.goToLine)
+        viewMenu.addAction(goToLineAction)
+
+        viewMenu.addSeparator()
+        self.followAction = QAction('跟随文件末尾(&L)', self)
+        self.followAction.setShortcut('Ctrl+Shift+L')
+        self.followAction.setCheckable(True)
+        self.followAction.toggled.connect(self.toggleFollow)
+        viewMenu.addAction(self.followAction)
+
+        followScrollAction = QAction('跟随时自动滚动', self)
+        followScrollAction.setCheckable(True)
+        followScrollAction.setChecked(
+            settings_store.get_store('EditorSettings').boolValue('followAutoScroll', True))
+        followScrollAction.toggled.connect(self.setFollowAutoScroll)
+        viewMenu.addAction(followScrollAction)
+        
+        searchMenu = menubar.addMenu('搜索(&S)')
+
+        findAction = QAction('查找(&F)', self)
+        findAction.setShortcut('Ctrl+F')
+        findAction.triggered.connect(lambda: self.showFind())
+        searchMenu.addAction(findAction)
+
+        replaceAction = QAction('替换(&R)', self)
+        replaceAction.setShortcut('Ctrl+H')
+        replaceAction.triggered.connect(lambda: self.showFind(replace=True))
+        searchMenu.addAction(replaceAction)
+
+        findNextAction = QAction('查找下一个(&N)', self)
+        findNextAction.setShortcut('F3')
+        findNextAction.triggered.connect(self.findNext)
+        searchMenu.addAction(findNextAction)
+
+        findPrevAction = QAction('查找上一个(&P)', self)
+        findPrevAction.setShortcut('Shift+F3')
+        findPrevAction.triggered.connect(self.findPrevious)
+        searchMenu.addAction(findPrevAction)
+
+        # 在文件中查找面板，第一次使用时创建
+        self.findInFiles = None
+        findInFilesAction = QAction('在文件中查找(&I)', self)
+        findInFilesAction.setShortcut('Ctrl+Shift+F')
+        findInFilesAction.triggered.connect(self.showFindInFiles)
+        searchMenu.addSeparator()
+        searchMenu.addAction(findInFilesAction)
+
+        # 符号索引、大纲面板和转到符号
+        self.symbolIndex = outline.SymbolIndex(self)
+        self.outline = outline.OutlinePanel(self)
+        self.addDockWidget(Qt.LeftDockWidgetArea, self.outline)
+        self.outline.hide()
+        self.symbolPopup = outline.SymbolPopup(self)
+        goToSymbolAction = QAction('转到符号(&S)', self)
+        goToSymbolAction.setShortcut('Ctrl+Shift+O')
+        goToSymbolAction.triggered.connect(self.symbolPopup.popup)
+        searchMenu.addAction(goToSymbolAction)
+
+        # 性能面板（打开时才记录计时数据）
+        self.perfHud = PerfHud(self)
+        self.addDockWidget(Qt.BottomDockWidgetArea, self.perfHud)
+        self.perfHud.hide()
+        perfHudAction = self.perfHud.toggleViewAction()
+        perfHudAction.setText('性能面板(&P)')
+        perfHudAction.setShortcut('Ctrl+Shift+P')
+        viewMenu.addSeparator()
+        outlineAction = self.outline.toggleViewAction()
+        outlineAction.setText('大纲(&U)')
+        outlineAction.setShortcut('Ctrl+Shift+U')
+        viewMenu.addAction(outlineAction)
+        viewMenu.addAction(perfHudAction)
+
         # 添加标签切换动作
         nextTabAction = QAction('下一个标签页', self)
         nextTabAction.setShortcut('Ctrl+PgDown')
@@ -392,10 +617,185 @@ class TextEditor(QMainWindow):
         
         # 添加状态栏
         self.statusBar = self.statusBar()
-        self.encodingLabel = QLabel('UTF-8')
-        self.lineEndingLabel = QLabel('Windows (CRLF)')
-        self.statusBar.addPermanentWidget(self.encodingLabel)
-        self.statusBar.addPermanentWidget(self.lineEndingLabel)
+        self.encodingButton = self.createStatusButton('UTF-8', self.createEncodingMenu())
+        self.lineEndingButton = self.createStatusButton('Windows (CRLF)', self.createLineEndingMenu())
+        self.profileButton = perf_profile.ProfileButton(self)
+        self.statusBar.addPermanentWidget(self.profileButton)
+        self.statusBar.addPermanentWidget(self.encodingButton)
+        self.statusBar.addPermanentWidget(self.lineEndingButton)
+
+    def createStatusButton(self, text, menu):
+        """状态栏中单击弹出菜单的按钮"""
+        button = QToolButton(self)
+        button.setText(text)
+        button.setAutoRaise(True)
+        button.setPopupMode(QToolButton.InstantPopup)
+        button.setMenu(menu)
+        return button
+
+    def createEncodingMenu(self):
+        """编码菜单：选择保存时使用的编码，或按指定编码重新读取文件"""
+        menu = QMenu(self)
+        group = QActionGroup(menu)
+        reopenMenu = QMenu('按编码重新打开(&R)', menu)
+        for name in encoding_detect.ENCODINGS:
+            action = QAction(name, group)
+            action.setCheckable(True)
+            action.triggered.connect(lambda checked, n=name: self.convertEncoding(n))
+            menu.addAction(action)
+            reopenAction = QAction(name, reopenMenu)
+            reopenAction.triggered.connect(lambda checked, n=name: self.reopenWithEncoding(n))
+            reopenMenu.addAction(reopenAction)
+        menu.addSeparator()
+        menu.addMenu(reopenMenu)
+
+        def update():
+            editor = self.currentEditor()
+            for action in group.actions():
+                action.setChecked(editor is not None and action.text() == editor.encoding)
+        menu.aboutToShow.connect(update)
+        return menu
+
+    def createLineEndingMenu(self):
+        """换行符菜单：把当前文档的所有换行符转换为选中的一种"""
+        menu = QMenu(self)
+        mixedAction = QAction('文件中混用了多种换行符', menu)
+        mixedAction.setEnabled(False)
+        menu.addAction(mixedAction)
+        group = QActionGroup(menu)
+        for name in encoding_detect.LINE_ENDINGS:
+            action = QAction(name, group)
+            action.setCheckable(True)
+            action.triggered.connect(lambda checked, n=name: self.setLineEnding(n))
+            menu.addAction(action)
+
+        def update():
+            editor = self.currentEditor()
+            mixed = editor is not None and editor.mixed_line_endings
+            mixedAction.setVisible(mixed)
+            for action in group.actions():
+                action.setChecked(editor is not None and not mixed
+                                  and action.text() == editor.line_ending)
+        menu.aboutToShow.connect(update)
+        return menu
+
+    def editableEditor(self, what):
+        """返回可以修改的当前编辑器；不能修改时在状态栏说明原因并返回 None"""
+        editor = self.currentEditor()
+        if not isinstance(editor, Editor):
+            self.statusBar.showMessage(f'当前标签不能{what}', 2000)
+            return None
+        if editor.loader is not None or editor.reloader is not None:
+            self.statusBar.showMessage(f'文件仍在加载中，请稍后再{what}', 2000)
+            return None
+        if editor.isReadOnly():
+            self.statusBar.showMessage(f'文档为只读，不能{what}', 2000)
+            return None
+        return editor
+
+    def setLineEnding(self, line_ending):
+        """把当前文档的所有换行符转换为 line_ending（可以撤销）"""
+        editor = self.editableEditor('转换换行符')
+        if editor is None:
+            return
+        if editor.line_ending == line_ending and not editor.mixed_line_endings:
+            return
+        with perf_trace.span('convertLineEndings'):
+            editor.convertLineEndings(line_ending)
+        self.updateStatusBar()
+        self.statusBar.showMessage(f'换行符已转换为 {line_ending}', 2000)
+
+    def convertEncoding(self, encoding):
+        """保存当前文档时改用 encoding 编码"""
+        editor = self.editableEditor('转换编码')
+        if editor is None or editor.encoding == encoding:
+            return
+        editor.encoding = encoding
+        editor.encoding_confidence = 1.0
+        editor.pending_encoding = encoding
+        editor.modified = True
+        self.updateTabTitle(self.tabs.indexOf(editor))
+        self.updateStatusBar()
+        self.recovery.scheduleSave()
+        self.statusBar.showMessage(f'保存时将使用 {encoding} 编码', 3000)
+
+    def reopenWithEncoding(self, encoding):
+        """按 encoding 重新读取当前文件（检测出的编码不对时使用）"""
+        if isinstance(self.currentEditor(), HexViewer):
+            self.reopenAsText(self.currentEditor(), encoding)
+            return
+        editor = self.editableEditor('重新打开')
+        if editor is None:
+            return
+        if not editor.filepath:
+            self.statusBar.showMessage('文档尚未保存到文件', 2000)
+            return
+        if editor.saver is not None:
+            self.statusBar.showMessage('正在保存，请稍候', 2000)
+            return
+        if editor.modified:
+            reply = QMessageBox.question(
+                self, '按编码重新打开',
+                '重新打开会替换未保存的修改（可以撤销）。\n是否继续？',
+                QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
+            if reply != QMessageBox.Yes:
+                return
+        self.reloadFile(editor, encoding)
+
+    def reopenAsText(self, viewer, encoding):
+        """把十六进制查看器中的文件按 encoding 作为文本重新打开"""
+        fname = viewer.filepath
+        index = self.tabs.indexOf(viewer)
+        viewer.closeFile()
+        if self.isHugeFile(fname):
+            self.tabs.removeTab(index)
+            self.scheduler.discard(viewer)
+            viewer.deleteLater()
+            self.openHugeFile(fname, encoding)
+            return
+        editor = self.createFileEditor(fname)
+        self.replaceTab(index, editor)
+        editor.title = os.path.basename(fname)
+        self.updateTabTitle(index)
+        self.startLoading(editor, fname, encoding)
+        self.updateStatusBar()
+        editor.setFocus()
+
+    def showFind(self, replace=False):
+        """显示查找栏；十六进制查看器使用自己的查找框"""
+        editor = self.currentEditor()
+        if isinstance(editor, HexViewer):
+            editor.showSearch()
+        else:
+            self.findBar.showBar(replace)
+
+    def findNext(self):
+        editor = self.currentEditor()
+        if isinstance(editor, HexViewer):
+            editor.findNext()
+        else:
+            self.findBar.findNext()
+
+    def findPrevious(self):
+        editor = self.currentEditor()
+        if isinstance(editor, HexViewer):
+            editor.findPrevious()
+        else:
+            self.findBar.findPrevious()
+
+    def showFindInFiles(self):
+        """显示在文件中查找面板
+
+        面板和进程池用到的 multiprocessing、concurrent.futures 导入较慢，
+        第一次使用时才导入并创建面板，停靠位置从上次保存的窗口状态恢复。
+        """
+        if self.findInFiles is None:
+            import find_in_files
+            self.findInFiles = find_in_files.FindInFilesPanel(self)
+            if not self.restoreDockWidget(self.findInFiles):
+                self.addDockWidget(Qt.BottomDockWidgetArea, self.findInFiles)
+            QApplication.instance().aboutToQuit.connect(find_in_files.shutdown_pool)
+        self.findInFiles.showPanel()
 
     def createTrayIcon(self, icon_path):
         """创建系统托盘图标"""
@@ -452,6 +852,9 @@ class TextEditor(QMainWindow):
 
         self.activateWindow()
 
+        if self.tabs.count() == 0:
+            self.newFile()
+
         # 自动将焦点设置到当前编辑器
         editor = self.currentEditor()
         if editor:
@@ -461,147 +864,847 @@ class TextEditor(QMainWindow):
         """获取当前活动的编辑器"""
         return self.tabs.currentWidget()
     
+    def addEditorTab(self, editor, title, activate=True):
+        """添加标签页，activate 为 True 时切换过去"""
+        editor.main_window = self
+        editor.title = title
+        editor.shown_title = title
+        self.tabs.addTab(editor, title)
+        if isinstance(editor, Editor):
+            self.recovery.track(editor)
+        if activate:
+            self.tabs.setCurrentWidget(editor)
+
+    def replaceTab(self, index, widget):
+        """用 widget 替换第 index 个标签页，保持标题和当前标签不变"""
+        old = self.tabs.widget(index)
+        widget.main_window = self
+        widget.title = old.title
+        widget.shown_title = old.shown_title
+        was_current = self.tabs.currentIndex() == index
+        self.tabs.blockSignals(True)
+        self.tabs.insertTab(index, widget, old.shown_title)
+        if was_current:
+            self.tabs.setCurrentIndex(index)
+        self.tabs.removeTab(index + 1)
+        self.tabs.blockSignals(False)
+        self.scheduler.discard(old)
+        self.recovery.discard(old)
+        self.symbolIndex.discard(old)
+        if isinstance(widget, Editor):
+            self.recovery.track(widget)
+        old.deleteLater()
+
+    def handleCurrentTabChanged(self, index):
+        """切换标签时加载尚未加载的标签，并更新状态栏"""
+        editor = self.tabs.widget(index)
+        if isinstance(editor, TabPlaceholder):
+            editor = self.materializeTab(index)
+        if editor is not None:
+            editor.last_active = time.monotonic()
+            self.scheduler.schedule(editor, ui_scheduler.STATUS_BAR)
+            if isinstance(editor, Editor):
+                # 恢复的未命名文档等不经过 finishLoading 的标签在这里加入索引
+                self.symbolIndex.track(editor)
+        if self.findBar.isVisible():
+            self.findBar.setEditor(editor)
+        if getattr(editor, 'disk_changed', False):
+            # 等切换完成后再询问
+            QTimer.singleShot(0, lambda: self.promptReload(editor))
+        self.followAction.blockSignals(True)
+        self.followAction.setChecked(editor is not None and editor.follower is not None)
+        self.followAction.blockSignals(False)
+
+    def isLoadedEditor(self, editor):
+        """editor 是否是已加载内容的普通编辑器"""
+        return isinstance(editor, Editor)
+
+    def isHibernatable(self, editor):
+        """editor 能否休眠：内容已保存在文件中且没有后台任务"""
+        return (isinstance(editor, Editor) and editor.filepath and not editor.modified
+                and editor.loader is None and editor.saver is None
+                and editor.reloader is None and not editor.disk_changed
+                and editor.follower is None and not editor.isReadOnly())
+
+    def materializeTab(self, index):
+        """为占位标签创建编辑器并开始加载，恢复休眠前的视图状态"""
+        placeholder = self.tabs.widget(index)
+        editor = self.createFileEditor(placeholder.filepath)
+        editor.pending_view_state = placeholder.view_state
+        self.replaceTab(index, editor)
+        self.startLoading(editor, placeholder.filepath)
+        return editor
+
+    def hibernateTab(self, index):
+        """释放标签的编辑器，只保留路径和视图状态"""
+        editor = self.tabs.widget(index)
+        placeholder = self.createPlaceholder(editor.filepath, editor.viewState())
+        placeholder.last_active = editor.last_active
+        self.changeWatcher.unwatch(editor)
+        self.replaceTab(index, placeholder)
+
     def newFile(self):
         editor = Editor()
-        self.tabs.addTab(editor, "未命名")
-        self.tabs.setCurrentWidget(editor)
+        self.addEditorTab(editor, "未命名")
         # 设置焦点到编辑器
         editor.setFocus()
     
-    def openFile(self, filepath=None):
-        """打开文件"""
+    @perf_trace.timed('openFile')
+    def openFile(self, filepath=None, activate=True):
+        """打开文件；activate 为 False 时只添加占位标签，第一次切换过去时才加载"""
         if filepath is None:
-            fname, _ = QFileDialog.getOpenFileName(self, '打开文件', '',
+            fnames, _ = QFileDialog.getOpenFileNames(self, '打开文件', '',
                 '所有文件 (*);;Python文件 (*.py);;C/C++文件 (*.c *.cpp *.h);;HTML文件 (*.html *.htm);;'
                 'JavaScript文件 (*.js);;CSS文件 (*.css);;XML文件 (*.xml);;SQL文件 (*.sql)')
+            if len(fnames) > 1:
+                self.openFiles(fnames, show=False)
+                return
+            fname = fnames[0] if fnames else ''
         else:
             fname = filepath
             
         if fname:
-            editor = Editor()
-            try:
-                # 以二进制模式读取文件以检测换行符
-                with open(fname, 'rb') as f:
-                    content = f.read()
-                    
-                # 检测文件的换行符类型
-                if b'\r\n' in content:
-                    editor.line_ending = 'Windows (CRLF)'
-                    text = content.decode(editor.encoding).replace('\r\n', '\n')
-                elif b'\n' in content:
-                    editor.line_ending = 'Unix (LF)'
-                    text = content.decode(editor.encoding)
-                elif b'\r' in content:
-                    editor.line_ending = 'Mac (CR)'
-                    text = content.decode(editor.encoding).replace('\r', '\n')
-                else:
-                    editor.line_ending = 'Windows (CRLF)'  # 默认值
-                    text = content.decode(editor.encoding)
-                    
-            except UnicodeDecodeError:
-                try:
-                    editor.encoding = 'GBK'
-                    text = content.decode(editor.encoding)
-                except:
-                    QMessageBox.warning(self, '错误', '无法识别文件编码')
-                    return
-                    
-            editor.setText(text)
-            editor.filepath = fname
-            editor.set_lexer_by_filename(fname)
-            self.tabs.addTab(editor, os.path.basename(fname))
-            self.tabs.setCurrentWidget(editor)
-            self.updateStatusBar()
+            if self.isHugeFile(fname):
+                self.openHugeFile(fname)
+                return
+            if not activate:
+                self.addEditorTab(self.createPlaceholder(fname), os.path.basename(fname), activate=False)
+                return
+            editor = self.createFileEditor(fname)
+            self.addEditorTab(editor, os.path.basename(fname))
+            self.startLoading(editor, fname)
             # 设置焦点到编辑器
             editor.setFocus()
+
+    def showLocation(self, filepath, line, index=0):
+        """打开文件（已打开时切换过去）并把光标移到 line 行 index 列，行列从 0 开始"""
+        target = os.path.normcase(os.path.abspath(filepath))
+        for i in range(self.tabs.count()):
+            widget = self.tabs.widget(i)
+            if widget.filepath and os.path.normcase(os.path.abspath(widget.filepath)) == target:
+                self.tabs.setCurrentIndex(i)
+                break
+        else:
+            self.openFile(filepath)
+        editor = self.currentEditor()
+        if editor is None or os.path.normcase(os.path.abspath(editor.filepath or '')) != target:
+            # 文件打开失败
+            return
+        if isinstance(editor, HugeFileViewer):
+            editor.goToLine(line)
+        elif editor.loader is not None:
+            # 还在加载，加载完成后再定位
+            editor.pending_view_state = dict(editor.viewState(), cursor=(line, index),
+                                             first_line=max(0, line - 5))
+        else:
+            editor.setCursorPosition(line, index)
+            editor.ensureLineVisible(line)
+        editor.setFocus()
+
+    def showSymbol(self, editor, line, index=0):
+        """切换到 editor 所在的标签并把光标移到符号的 line 行 index 列"""
+        i = self.tabs.indexOf(editor)
+        if i < 0:
+            return
+        self.tabs.setCurrentIndex(i)
+        line = min(line, editor.lines() - 1)
+        editor.setCursorPosition(line, index)
+        editor.ensureLineVisible(line)
+        editor.setFocus()
+
+    def createFileEditor(self, fname):
+        """为文件创建编辑器（尚未加载内容）"""
+        editor = Editor()
+        editor.filepath = fname
+        info = file_metadata.get_cache().get(fname)
+        if info:
+            # 文件没有变化，沿用上次打开时的检测结果和规模
+            self.applyMetadata(editor, info)
+            editor.evaluateProfile(info['size'], info['lines'], info['longest_line'])
+            editor.set_lexer_by_filename(fname, language=info['language'])
+            return editor
+        # 先按文件大小选择档位，避免流式加载时就开着自动换行和语法高亮
+        if os.path.isfile(fname):
+            editor.evaluateProfile(size=os.path.getsize(fname))
+        editor.set_lexer_by_filename(fname)
+        return editor
+
+    def createPlaceholder(self, fname, view_state=None):
+        """为尚未加载的文件创建占位标签，有缓存时状态栏可以显示编码和换行符"""
+        placeholder = TabPlaceholder(fname, view_state)
+        info = file_metadata.get_cache().get(fname)
+        if info:
+            self.applyMetadata(placeholder, info)
+        return placeholder
+
+    def applyMetadata(self, editor, info):
+        editor.encoding = info['encoding']
+        editor.encoding_confidence = info['confidence']
+        editor.line_ending = info['line_ending']
+        editor.mixed_line_endings = info['mixed']
+
+    def recordMetadata(self, editor, longest_line):
+        """记录文件当前的检测结果和规模，下次打开时跳过检测"""
+        file_metadata.get_cache().put(
+            editor.filepath, encoding=editor.encoding, confidence=editor.encoding_confidence,
+            line_ending=editor.line_ending, mixed=editor.mixed_line_endings,
+            language=editor.language, lines=editor.lines(), longest_line=longest_line)
+
+    def openFiles(self, paths, show=True):
+        """打开一批文件，show 为 True 时显示窗口
+
+        不超过 batch_open.MAX_BATCH_FILE_SIZE 的文件在线程池中并发读取、解码，
+        按请求的顺序逐个创建标签；更大的文件轮到时按 openFile 的方式流式加载
+        或用只读查看器打开。最后一个文件的标签成为当前标签。
+        """
+        if len(paths) == 1:
+            self.openFile(paths[0])
+        elif paths:
+            self.startBatchOpen(paths)
+        if show:
+            self.showWindow()
+
+    def startBatchOpen(self, paths):
+        import batch_open
+        cache = file_metadata.get_cache()
+        jobs = []
+        for path in paths:
+            try:
+                size = os.path.getsize(path)
+            except OSError:
+                size = 0  # 读取时报告错误
+            if size > batch_open.MAX_BATCH_FILE_SIZE or self.isHugeFile(path):
+                jobs.append((path, None, None, 1.0))
+                continue
+            info = cache.get(path)
+            if info:
+                jobs.append((path, size, info['encoding'], info['confidence']))
+            else:
+                jobs.append((path, size, None, 1.0))
+        batch = batch_open.BatchOpen(jobs, self)
+        self.batchOpens.append(batch)
+        last = len(jobs) - 1
+        failures = []
+        started = time.perf_counter()
+
+        def on_ready(index, path, result):
+            if result is None:
+                self.openFile(path, activate=(index == last))
+                return
+            self.addLoadedFile(path, result, activate=(index == last))
+            batch.consumed(jobs[index][1])
+            perf_trace.count('batchOpen.files')
+
+        def on_failed(index, path, message):
+            failures.append(f'{os.path.basename(path)}: {message}')
+
+        def on_finished():
+            self.batchOpens.remove(batch)
+            batch.deleteLater()
+            perf_trace.record('batchOpen', started, time.perf_counter() - started,
+                              category='io', args={'files': len(jobs)})
+            if failures:
+                QMessageBox.warning(self, '错误', '以下文件无法打开：\n' + '\n'.join(failures))
+
+        batch.fileReady.connect(on_ready)
+        batch.fileFailed.connect(on_failed)
+        batch.finished.connect(on_finished)
+        batch.start()
+
+    def addLoadedFile(self, fname, result, activate=True):
+        """为已在后台读取、解码好的文件（batch_open.LoadResult）创建标签"""
+        editor = self.createFileEditor(fname)
+        editor.encoding = result.encoding
+        editor.encoding_confidence = result.confidence
+        editor.line_ending = result.line_ending
+        editor.mixed_line_endings = result.mixed_line_endings
+        self.addEditorTab(editor, os.path.basename(fname), activate)
+        if editor.lexer() is None:
+            # 扩展名无法确定语言时根据 shebang 或模式行判断
+            editor.set_lexer_by_filename(fname, result.text[:4096])
+        editor.appendLoadedText(result.text)
+        self.finishLoading(editor, result)
+        if activate:
+            editor.setFocus()
+
+    def isHugeFile(self, fname):
+        """文件（压缩文件按解压后的估计大小）是否超过只读查看器的大小阈值"""
+        threshold_mb = settings_store.get_store('EditorSettings').value(
+            'hugeFileThresholdMB', DEFAULT_THRESHOLD_MB, type=int)
+        try:
+            return compressed_files.estimated_size(fname) >= threshold_mb * 1024 * 1024
+        except OSError:
+            return False
+
+    def openHugeFile(self, fname, encoding=None, source=None):
+        """用基于 mmap 的只读查看器打开超大文件
+
+        压缩文件先在后台解压到临时文件 source，再映射临时文件。
+        """
+        if source is None:
+            compression = compressed_files.detect_file(fname)
+            if compression is not None:
+                self.decompressHugeFile(fname, compression, encoding)
+                return
+        try:
+            viewer = HugeFileViewer(fname, encoding=encoding, source=source)
+        except (OSError, ValueError) as e:
+            if source is not None:
+                os.remove(source)
+            QMessageBox.warning(self, '错误', f'无法打开文件：{str(e)}')
+            return
+        if viewer.binary:
+            viewer.closeFile()
+            viewer.deleteLater()
+            self.openHexFile(fname, '文件不是文本文件')
+            return
+        self.addEditorTab(viewer, os.path.basename(fname) + ' [只读]')
+
+        progress = LoadProgressWidget(f'正在索引 {os.path.basename(fname)}', viewer.indexer)
+        self.statusBar.addWidget(progress)
+
+        def on_finished(cancelled):
+            self.statusBar.removeWidget(progress)
+            progress.deleteLater()
+
+        viewer.indexer.loadFinished.connect(on_finished)
+        viewer.startIndexing()
+        self.updateStatusBar()
+        viewer.setFocus()
+
+    def decompressHugeFile(self, fname, compression, encoding=None):
+        """把超大的压缩文件流式解压到临时文件，完成后用只读查看器打开
+
+        临时文件在查看期间占用解压后大小的磁盘空间，解压前提示大小和剩余
+        空间，由用户确认。
+        """
+        directory = compressed_files.temp_dir(fname)
+        try:
+            size = compressed_files.estimated_size(fname)
+        except OSError as e:
+            QMessageBox.warning(self, '错误', f'无法打开文件：{str(e)}')
+            return
+        free = compressed_files.free_space(directory)
+        message = (f'{os.path.basename(fname)} 解压后约 {size / (1024 * 1024):.0f} MB，'
+                   f'需要先解压到 {directory} 中的临时文件，关闭标签时删除')
+        if free is not None:
+            message += f'（该磁盘剩余 {free / (1024 * 1024):.0f} MB）'
+            if size > free:
+                message += '。\n剩余空间可能不足，解压可能失败'
+        reply = QMessageBox.question(self, '解压大文件', message + '。\n是否继续？',
+                                     QMessageBox.Yes | QMessageBox.No, QMessageBox.Yes)
+        if reply != QMessageBox.Yes:
+            return
+        worker = compressed_files.Decompressor(fname, compression, self)
+        self.decompressors.append(worker)
+        progress = LoadProgressWidget(f'正在解压 {os.path.basename(fname)}', worker)
+        self.statusBar.addWidget(progress)
+
+        def on_done():
+            self.statusBar.removeWidget(progress)
+            progress.deleteLater()
+            self.decompressors.remove(worker)
+            worker.deleteLater()
+
+        def on_finished(cancelled):
+            on_done()
+            if not cancelled:
+                self.openHugeFile(fname, encoding, worker.output)
+
+        def on_failed(message):
+            on_done()
+            QMessageBox.warning(self, '错误', message)
+
+        worker.loadFinished.connect(on_finished)
+        worker.loadFailed.connect(on_failed)
+        worker.start()
+
+    def createHexViewer(self, fname, reason):
+        """为不能作为文本打开的文件创建十六进制查看器，失败时提示并返回 None"""
+        try:
+            viewer = HexViewer(fname)
+        except (OSError, ValueError) as e:
+            QMessageBox.warning(self, '错误', f'无法打开文件：{str(e)}')
+            return None
+        viewer.reason = reason
+        self.statusBar.showMessage(
+            f'{reason}，已以十六进制显示；可在状态栏的编码菜单中按编码重新打开', 5000)
+        return viewer
+
+    def openHexFile(self, fname, reason):
+        """在新标签中以十六进制显示文件"""
+        viewer = self.createHexViewer(fname, reason)
+        if viewer is None:
+            return
+        self.addEditorTab(viewer, os.path.basename(fname) + ' [十六进制]')
+        self.updateStatusBar()
+        viewer.setFocus()
+
+    def startLoading(self, editor, fname, encoding=None):
+        """在后台线程中分块加载文件，加载过程中文档可以浏览，但在加载完成前是只读的
+
+        给出 encoding 时按该编码解码，不检测也不尝试后备编码。文件不能
+        作为文本打开时，标签换成十六进制查看器。
+        """
+        info = file_metadata.get_cache().get(fname)
+        if encoding:
+            loader = FileLoader(fname, self, encoding, 1.0, strict=True)
+        elif info:
+            # 文件没有变化，沿用上次检测的编码
+            loader = FileLoader(fname, self, info['encoding'], info['confidence'])
+        else:
+            loader = FileLoader(fname, self)
+        editor.loader = loader
+        # 加载完成时会清空撤销历史和修改标记，加载期间输入的内容会丢失
+        editor.setReadOnly(True)
+        started = time.perf_counter()
+        progress = LoadProgressWidget(f'正在加载 {os.path.basename(fname)}', loader)
+        self.statusBar.addWidget(progress)
+
+        def on_chunk(text):
+            if editor.lexer() is None and editor.length() == 0:
+                # 扩展名无法确定语言时根据 shebang 或模式行判断
+                editor.set_lexer_by_filename(fname, text)
+            editor.appendLoadedText(text)
+            perf_trace.count('load.chunks')
+            loader.chunkConsumed()
+
+        def on_encoding(encoding, confidence):
+            editor.encoding = encoding
+            editor.encoding_confidence = confidence
+            self.updateStatusBar()
+
+        def on_line_ending(line_ending, mixed):
+            editor.line_ending = line_ending
+            editor.mixed_line_endings = mixed
+            self.updateStatusBar()
+
+        def on_finished(cancelled):
+            self.statusBar.removeWidget(progress)
+            progress.deleteLater()
+            editor.loader = None
+            if not cancelled:
+                perf_trace.record('load', started, time.perf_counter() - started,
+                                  category='io', args={'file': fname})
+                if perf_trace.enabled():
+                    perf_trace.record_throughput('load', os.path.getsize(fname),
+                                                 time.perf_counter() - started)
+            self.finishLoading(editor, loader, cancelled)
+            loader.deleteLater()
+
+        def on_failed(message):
+            self.statusBar.removeWidget(progress)
+            progress.deleteLater()
+            index = self.tabs.indexOf(editor)
+            if index >= 0:
+                self.tabs.removeTab(index)
+            # 等待中的界面更新不能再访问即将销毁的编辑器
+            self.scheduler.discard(editor)
+            self.recovery.discard(editor)
+            editor.deleteLater()
+            loader.deleteLater()
+            QMessageBox.warning(self, '错误', message)
+
+        def on_binary(reason):
+            self.statusBar.removeWidget(progress)
+            progress.deleteLater()
+            loader.deleteLater()
+            editor.loader = None
+            index = self.tabs.indexOf(editor)
+            if index < 0:
+                return
+            viewer = self.createHexViewer(fname, reason)
+            if viewer is None:
+                self.tabs.removeTab(index)
+                self.scheduler.discard(editor)
+                self.recovery.discard(editor)
+                editor.deleteLater()
+                return
+            self.replaceTab(index, viewer)
+            viewer.title = os.path.basename(fname) + ' [十六进制]'
+            self.updateTabTitle(index)
+            if self.tabs.currentIndex() == index:
+                self.updateStatusBar()
+                viewer.setFocus()
+
+        loader.chunkLoaded.connect(on_chunk)
+        loader.encodingDetected.connect(on_encoding)
+        loader.lineEndingDetected.connect(on_line_ending)
+        loader.restarted.connect(editor.clearLoadedText)
+        loader.loadFinished.connect(on_finished)
+        loader.loadFailed.connect(on_failed)
+        loader.binaryDetected.connect(on_binary)
+        loader.start()
     
+    def finishLoading(self, editor, result, cancelled=False):
+        """内容全部放入编辑器之后的处理
+
+        result 为 FileLoader 或 batch_open.LoadResult，提供 bytes_read、digest
+        和 longest_line。
+        """
+        if not cancelled:
+            editor.setReadOnly(False)
+            editor.loaded_size = result.bytes_read
+            editor.compression = result.compression
+            self.changeWatcher.watch(editor, result.digest)
+        editor.evaluateProfile(editor.SendScintilla(QsciScintilla.SCI_GETLENGTH),
+                               editor.lines(), result.longest_line)
+        editor.SendScintilla(QsciScintilla.SCI_EMPTYUNDOBUFFER)
+        editor.pending_encoding = None
+        editor.setModified(False)
+        if not cancelled:
+            self.recordMetadata(editor, result.longest_line)
+            # 恢复上次会话的标签在这里重放未保存的修改
+            self.recovery.fileLoaded(editor, result.digest)
+        if editor.pending_view_state is not None:
+            editor.restoreViewState(editor.pending_view_state)
+            editor.pending_view_state = None
+        if cancelled:
+            # 只加载了部分内容，禁止编辑以免保存时截断原文件
+            editor.setReadOnly(True)
+            self.statusBar.showMessage('加载已取消，文档为只读', 3000)
+        self.updateTabTitle(self.tabs.indexOf(editor))
+        self.symbolIndex.track(editor)
+
+    @perf_trace.timed('saveFile')
     def saveFile(self):
         editor = self.currentEditor()
         if not editor:
             return
+        if editor.loader is not None:
+            self.statusBar.showMessage('文件仍在加载中，请稍后再保存', 2000)
+            return False
+        if editor.saver is not None:
+            self.statusBar.showMessage('正在保存，请稍候', 2000)
+            return False
+        if editor.reloader is not None:
+            self.statusBar.showMessage('正在重新加载，请稍后再保存', 2000)
+            return False
+        if editor.isReadOnly():
+            QMessageBox.warning(self, '无法保存', '当前文档为只读')
+            return False
             
         if editor.filepath:
             fname = editor.filepath
+            if self.changeWatcher.isStale(editor):
+                reply = QMessageBox.question(
+                    self, '文件已被修改',
+                    f'{os.path.basename(fname)} 已被其他程序修改，保存将覆盖这些修改。\n是否仍然保存？',
+                    QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
+                if reply != QMessageBox.Yes:
+                    return False
         else:
             fname, _ = QFileDialog.getSaveFileName(self, '保存文件', '',
                                                  '文本文件 (*.txt);;所有文件 (*)')
             
         if fname:
+            self.startSaving(editor, fname)
+            return True
+        return False
+
+    def startSaving(self, editor, fname):
+        """在后台线程中按文档原编码和换行符保存，保存期间可以继续编辑"""
+        data = snapshot_bytes(editor)
+        if editor.filepath and FileChangeWatcher.key(fname) == FileChangeWatcher.key(editor.filepath):
+            compression = editor.compression
+        else:
+            # 另存为时按扩展名决定是否压缩
+            compression = compressed_files.for_extension(fname)
+        saver = FileSaver(data, fname, editor.encoding, self, compression)
+        editor.saver = saver
+        started = time.perf_counter()
+        version = editor.text_version
+        progress = LoadProgressWidget(f'正在保存 {os.path.basename(fname)}', saver)
+        progress.cancelButton.hide()
+        self.statusBar.addWidget(progress)
+
+        def on_done():
+            self.statusBar.removeWidget(progress)
+            progress.deleteLater()
+            editor.saver = None
+            saver.deleteLater()
+
+        def on_finished(path):
+            on_done()
+            perf_trace.record('save', started, time.perf_counter() - started,
+                              category='io', args={'file': path})
+            perf_trace.record_throughput('save', len(data), time.perf_counter() - started)
+            editor.filepath = path
+            editor.compression = compression
             try:
-                # 获取文本并规范化换行符
-                text = editor.text()
-                # 先将所有换行符统一为\n
-                text = text.replace('\r\n', '\n')  # 将Windows换行符转换为\n
-                text = text.replace('\r', '\n')    # 将Mac换行符转换为\n
-
-                # 根据当前设置的换行符类型进行转换
-                if editor.line_ending == 'Windows (CRLF)':
-                    text = text.replace('\n', '\r\n')  # 转换为Windows格式
-                elif editor.line_ending == 'Unix (LF)':
-                    pass  # 已经是Unix格式，无需转换
-                elif editor.line_ending == 'Mac (CR)':
-                    text = text.replace('\n', '\r')  # 转换为Mac格式
-                
-                with open(fname, 'w', encoding='utf-8', newline='') as f:
-                    f.write(text)
-                editor.filepath = fname
+                editor.loaded_size = os.path.getsize(path)
+            except OSError:
+                pass
+            self.changeWatcher.watch(editor, saver.digest)
+            # 保存期间没有新的修改时才清除修改标记
+            if editor.text_version == version:
+                editor.pending_encoding = None
+                editor.setModified(False)
                 editor.modified = False  # 重置修改状态
-                self.updateTabTitle(self.tabs.currentIndex())
-                # 显示保存成功消息
-                self.statusBar.showMessage('文件已保存', 2000)  # 显示2秒
-                return True
-            except Exception as e:
-                QMessageBox.warning(self, '保存失败', f'保存文件时发生错误：{str(e)}')
-                return False
-        return False
-    
+                self.recordMetadata(editor, editor.longest_line)
+                if editor.journal is not None:
+                    editor.journal.resetToFile(saver.digest)
+            elif editor.journal is not None:
+                # 保存期间的修改相对于旧内容记录，改以快照为基准
+                editor.journal.compact()
+            index = self.tabs.indexOf(editor)
+            if index >= 0:
+                self.updateTabTitle(index)
+            # 显示保存成功消息
+            self.statusBar.showMessage('文件已保存', 2000)  # 显示2秒
+
+        def on_failed(message):
+            on_done()
+            QMessageBox.warning(self, '保存失败', f'保存文件时发生错误：{message}')
+
+        saver.saveFinished.connect(on_finished)
+        saver.saveFailed.connect(on_failed)
+        saver.start()
+
     def closeTab(self, index):
         if self.tabs.count() > 1:  # 保持至少一个标签页
+            self.cancelLoading(self.tabs.widget(index))
             self.tabs.removeTab(index)
+
+    def cancelLoading(self, editor):
+        """关闭标签前停止其后台加载并释放资源"""
+        if editor is not None and editor.loader is not None:
+            editor.loader.cancel()
+        if editor is not None and editor.follower is not None:
+            self.stopFollowing(editor)
+        self.changeWatcher.unwatch(editor)
+        self.recovery.discard(editor)
+        self.symbolIndex.discard(editor)
+        if isinstance(editor, (HugeFileViewer, HexViewer)):
+            editor.closeFile()
         
+    def handleExternalChange(self, editor):
+        """文件被其他程序修改：当前标签且窗口激活时立即询问，否则等切换过来时再问"""
+        if editor is self.currentEditor() and self.isActiveWindow():
+            self.promptReload(editor)
+        else:
+            index = self.tabs.indexOf(editor)
+            if index >= 0:
+                self.statusBar.showMessage(f'{editor.title} 已被其他程序修改', 3000)
+
+    def promptReload(self, editor):
+        """询问是否重新加载被外部修改的文件"""
+        if not editor.disk_changed or self.tabs.indexOf(editor) < 0:
+            return
+        # 先清除标记，对话框显示期间再次收到通知时不会重复询问
+        editor.disk_changed = False
+        message = f'{os.path.basename(editor.filepath)} 已被其他程序修改。\n是否重新加载？'
+        if editor.modified:
+            message += '\n\n重新加载会替换未保存的修改（可以撤销）。'
+        reply = QMessageBox.question(self, '文件已被修改', message,
+                                     QMessageBox.Yes | QMessageBox.No, QMessageBox.Yes)
+        if reply == QMessageBox.Yes:
+            self.reloadFile(editor)
+        else:
+            self.changeWatcher.acknowledge(editor)
+
+    def reloadFile(self, editor, encoding=None):
+        """在后台读取磁盘上的新内容，只把有差异的行替换到编辑器中
+
+        光标、滚动位置和撤销历史都会保留，重新加载本身作为一个撤销步骤。
+        给出 encoding 时按该编码解码，不再检测。
+        """
+        if editor.loader is not None or editor.saver is not None or editor.reloader is not None:
+            return
+        worker = ReloadWorker(editor.filepath, snapshot_bytes(editor), encoding, self)
+        editor.reloader = worker
+        started = time.perf_counter()
+        version = editor.text_version
+
+        def on_ready(hunks):
+            editor.reloader = None
+            worker.deleteLater()
+            if self.tabs.indexOf(editor) < 0:
+                return
+            if editor.text_version != version:
+                # 比较期间文档又被修改，差异已失效，重新比较
+                self.reloadFile(editor, encoding)
+                return
+            apply_hunks(editor, hunks)
+            editor.pending_encoding = None
+            editor.setModified(False)
+            editor.modified = False
+            editor.encoding = worker.encoding
+            if encoding is not None:
+                editor.encoding_confidence = 1.0
+            editor.line_ending = worker.line_ending
+            editor.mixed_line_endings = worker.mixed_line_endings
+            editor.loaded_size = worker.size
+            editor.compression = worker.compression
+            self.recordMetadata(editor, editor.longest_line)
+            self.changeWatcher.watch(editor, worker.digest, worker.stamp)
+            if editor.journal is not None:
+                editor.journal.resetToFile(worker.digest)
+            perf_trace.record('reload', started, time.perf_counter() - started,
+                              category='io', args={'file': editor.filepath, 'hunks': len(hunks)})
+            self.updateTabTitle(self.tabs.indexOf(editor))
+            self.updateStatusBar()
+            self.statusBar.showMessage('已重新加载', 2000)
+
+        def on_failed(message):
+            editor.reloader = None
+            worker.deleteLater()
+            QMessageBox.warning(self, '错误', f'无法重新加载文件：{message}')
+
+        worker.reloadReady.connect(on_ready)
+        worker.reloadFailed.connect(on_failed)
+        worker.start()
+
+    def toggleFollow(self, checked):
+        """开始或停止跟随当前文件的末尾"""
+        editor = self.currentEditor()
+        if checked:
+            if not self.startFollowing(editor):
+                self.followAction.blockSignals(True)
+                self.followAction.setChecked(False)
+                self.followAction.blockSignals(False)
+        elif editor is not None and editor.follower is not None:
+            self.stopFollowing(editor)
+
+    def startFollowing(self, editor):
+        """只读取文件新追加的内容并追加到末尾，跟随期间文档只读"""
+        if not isinstance(editor, Editor) or not editor.filepath:
+            self.statusBar.showMessage('只能跟随已保存到文件的文档', 2000)
+            return False
+        if editor.loader is not None:
+            self.statusBar.showMessage('文件仍在加载中，请稍后再试', 2000)
+            return False
+        if editor.modified or editor.isReadOnly():
+            self.statusBar.showMessage('文档有未保存的修改或只加载了部分内容，无法跟随', 3000)
+            return False
+        if editor.compression is not None:
+            self.statusBar.showMessage('压缩文件不能跟随', 2000)
+            return False
+        from file_follow import FileFollower
+        settings = settings_store.get_store('EditorSettings')
+        follower = FileFollower(editor, editor.filepath, editor.encoding, editor.loaded_size,
+                                editor)
+        follower.auto_scroll = settings.boolValue('followAutoScroll', True)
+        follower.max_lines = settings.intValue('followMaxLines', 0)
+        follower.truncated.connect(
+            lambda: self.statusBar.showMessage('文件被截断或替换，已从头重新读取', 3000))
+        # 跟随期间文件的变化由 FileFollower 处理
+        self.changeWatcher.unwatch(editor)
+        editor.follower = follower
+        editor.setReadOnly(True)
+        editor.title = os.path.basename(editor.filepath) + ' [跟随]'
+        self.updateTabTitle(self.tabs.indexOf(editor))
+        follower.start()
+        return True
+
+    def stopFollowing(self, editor):
+        follower = editor.follower
+        editor.follower = None
+        follower.stop()
+        follower.deleteLater()
+        editor.loaded_size = follower.offset
+        if follower.trimmed:
+            # 开头的行已被丢弃，保存会截掉文件内容
+            self.statusBar.showMessage('已丢弃超出行数上限的内容，文档保持只读', 3000)
+        else:
+            editor.setReadOnly(False)
+            self.changeWatcher.watch(editor)
+        editor.title = os.path.basename(editor.filepath)
+        index = self.tabs.indexOf(editor)
+        if index >= 0:
+            self.updateTabTitle(index)
+
+    def setFollowAutoScroll(self, enabled):
+        settings_store.get_store('EditorSettings').setValue('followAutoScroll', enabled)
+        for index in range(self.tabs.count()):
+            follower = self.tabs.widget(index).follower
+            if follower is not None:
+                follower.auto_scroll = enabled
+
     def zoomIn(self):
-        if editor := self.currentEditor():
+        if isinstance(editor := self.currentEditor(), Editor):
             # 获取当前缩放级别
             current_zoom = editor.SendScintilla(editor.SCI_GETZOOM)
             # 设置新的缩放级别，最大可到 100
             new_zoom = min(current_zoom + 3, 100)
             editor.SendScintilla(editor.SCI_SETZOOM, new_zoom)
             # 更新行号宽度以适应缩放后的字体
-            editor.updateLineNumberWidth()
+            editor.updateLineNumberWidth(force=True)
             # 保存缩放级别
             editor.saveZoomLevel()
 
     def zoomOut(self):
-        if editor := self.currentEditor():
+        if isinstance(editor := self.currentEditor(), Editor):
             # 获取当前缩放级别
             current_zoom = editor.SendScintilla(editor.SCI_GETZOOM)
             # 设置新的缩放级别，最小可到 -10
             new_zoom = max(current_zoom - 3, -10)
             editor.SendScintilla(editor.SCI_SETZOOM, new_zoom)
             # 更新行号宽度以适应缩放后的字体
-            editor.updateLineNumberWidth()
+            editor.updateLineNumberWidth(force=True)
             # 保存缩放级别
             editor.saveZoomLevel()
     
+    def goToLine(self):
+        """跳转到指定行"""
+        editor = self.currentEditor()
+        if not editor:
+            return
+        from PyQt5.QtWidgets import QInputDialog
+        if isinstance(editor, HexViewer):
+            self.goToOffset(editor)
+            return
+        if isinstance(editor, HugeFileViewer):
+            line_count = max(1, editor.lineCount())
+            current = editor.scrollBar.value() + 1
+        else:
+            line_count = editor.lines()
+            current = editor.getCursorPosition()[0] + 1
+        line, ok = QInputDialog.getInt(self, '跳转到行', f'行号 (1 - {line_count}):',
+                                       current, 1, line_count)
+        if not ok:
+            return
+        if isinstance(editor, HugeFileViewer):
+            editor.goToLine(line - 1)
+        else:
+            editor.setCursorPosition(line - 1, 0)
+            editor.ensureLineVisible(line - 1)
+            editor.setFocus()
+
+    def goToOffset(self, viewer):
+        """十六进制查看器中跳转到指定的字节偏移"""
+        from PyQt5.QtWidgets import QInputDialog
+        from hex_viewer import parse_offset
+        last = max(0, viewer.canvas.size - 1)
+        text, ok = QInputDialog.getText(self, '跳转到偏移',
+                                        f'字节偏移（0x 开头为十六进制，0 - 0x{last:X}）：',
+                                        text=f'0x{viewer.cursorOffset():X}')
+        if not ok or not text.strip():
+            return
+        try:
+            offset = parse_offset(text)
+        except ValueError:
+            self.statusBar.showMessage('偏移格式错误', 2000)
+            return
+        if offset > last:
+            self.statusBar.showMessage('偏移超出文件大小，已跳转到文件末尾', 2000)
+        viewer.goToOffset(offset)
+
+    @perf_trace.timed('updateTabTitle')
     def updateTabTitle(self, index):
-        """更新标签标题，添加修改标记"""
+        """更新标签标题，添加修改标记；标题没有变化时不重设"""
         editor = self.tabs.widget(index)
-        current_text = self.tabs.tabText(index)
-        
-        # 移除可能存在的修改标记
-        if current_text.endswith('*'):
-            current_text = current_text[:-1]
-            
         # 如果有修改则添加星号
-        if editor.modified:
-            self.tabs.setTabText(index, current_text + '*')
-        else:
-            self.tabs.setTabText(index, current_text)
+        title = editor.title + '*' if editor.modified else editor.title
+        if title != editor.shown_title:
+            self.tabs.setTabText(index, title)
+            editor.shown_title = title
     
     def closeCurrentTab(self):
         """关闭当前标签页"""
         current_index = self.tabs.currentIndex()
         if self.tabs.count() > 1:  # 保持至少一个标签页
+            self.cancelLoading(self.tabs.widget(current_index))
             self.tabs.removeTab(current_index)
     
     def nextTab(self):
@@ -620,12 +1723,42 @@ class TextEditor(QMainWindow):
         else:
             self.tabs.setCurrentIndex(self.tabs.count() - 1)
     
+    @perf_trace.timed('updateStatusBar')
     def updateStatusBar(self):
         """更新状态栏信息"""
         editor = self.currentEditor()
         if editor:
-            self.encodingLabel.setText(editor.encoding)
-            self.lineEndingLabel.setText(editor.line_ending)
+            compression = getattr(editor, 'compression', None)
+            shown = (editor, editor.encoding, editor.encoding_confidence, compression,
+                     editor.line_ending, editor.mixed_line_endings, editor.profile,
+                     editor.profile_override)
+            if shown == self.status_shown:
+                return
+            self.status_shown = shown
+            if editor.profile is None:
+                self.profileButton.hide()
+            else:
+                self.profileButton.showProfile(editor)
+                self.profileButton.show()
+            if isinstance(editor, HexViewer):
+                self.encodingButton.setText(editor.encoding)
+                self.encodingButton.setToolTip(f'{editor.reason}；可在此菜单中按编码重新打开')
+            elif compression is not None:
+                self.encodingButton.setText(f'{editor.encoding} ({compression.name})')
+                self.encodingButton.setToolTip(
+                    f'检测置信度：{editor.encoding_confidence:.0%}\n'
+                    f'{compression.name} 压缩（级别 {compression.level}），保存时按原格式重新压缩')
+            else:
+                self.encodingButton.setText(editor.encoding)
+                self.encodingButton.setToolTip(f'检测置信度：{editor.encoding_confidence:.0%}')
+            self.lineEndingButton.setVisible(bool(editor.line_ending))
+            if editor.mixed_line_endings:
+                self.lineEndingButton.setText(editor.line_ending + ' (混合)')
+                self.lineEndingButton.setToolTip('文件中混用了多种换行符，保存时保持原样；'
+                                                 '选择一种换行符可以统一转换')
+            else:
+                self.lineEndingButton.setText(editor.line_ending)
+                self.lineEndingButton.setToolTip('')
     
     def showAbout(self):
         """显示关于对话框"""
@@ -638,28 +1771,30 @@ class TextEditor(QMainWindow):
     
     def addContextMenu(self):
         """添加右键菜单的处理函数"""
-        if not is_admin():
+        if not platform_support.is_admin():
             QMessageBox.warning(self, '权限不足', '添加右键菜单需要管理员权限。\n请以管理员身份运行程序。')
             return
         
-        if add_context_menu():
+        if platform_support.add_context_menu(resource_path("icon.ico")):
             QMessageBox.information(self, '成功', '右键菜单添加成功！')
         else:
             QMessageBox.warning(self, '失败', '右键菜单添加失败！')
     
     def removeContextMenu(self):
         """移除右键菜单的处理函数"""
-        if not is_admin():
+        if not platform_support.is_admin():
             QMessageBox.warning(self, '权限不足', '移除右键菜单需要管理员权限。\n请以管理员身份运行程序。')
             return
 
-        if remove_context_menu():
+        if platform_support.remove_context_menu():
             QMessageBox.information(self, '成功', '右键菜单移除成功！')
         else:
             QMessageBox.warning(self, '失败', '右键菜单移除失败！')
 
     def registerGlobalHotkey(self):
         """注册全局热键"""
+        if not platform_support.IS_WINDOWS:
+            return
         # 获取保存的热键设置，默认为 Ctrl+Alt+T
         hotkey_str = self.settings.value('globalHotkey', 'Ctrl+Alt+T')
 
@@ -670,15 +1805,12 @@ class TextEditor(QMainWindow):
             # 注册热键
             hwnd = int(self.winId())
 
-            # 先尝试注销可能存在的旧热键
-            ctypes.windll.user32.UnregisterHotKey(hwnd, self.hotkey_id)
-
             # 注册新热键
-            result = ctypes.windll.user32.RegisterHotKey(hwnd, self.hotkey_id, modifiers, key)
+            result = platform_support.register_hotkey(hwnd, self.hotkey_id, modifiers, key)
             if result:
                 # 安装事件过滤器
                 if not hasattr(self, 'hotkey_filter'):
-                    self.hotkey_filter = GlobalHotkeyFilter(self.onGlobalHotkey)
+                    self.hotkey_filter = platform_support.GlobalHotkeyFilter(self.onGlobalHotkey)
                     QApplication.instance().installNativeEventFilter(self.hotkey_filter)
             else:
                 # 静默失败，不弹窗警告，只在日志中记录
@@ -686,12 +1818,8 @@ class TextEditor(QMainWindow):
 
     def unregisterGlobalHotkey(self):
         """注销全局热键"""
-        try:
-            hwnd = int(self.winId())
-            ctypes.windll.user32.UnregisterHotKey(hwnd, self.hotkey_id)
-        except:
-            # 忽略注销失败的错误
-            pass
+        if platform_support.IS_WINDOWS:
+            platform_support.unregister_hotkey(int(self.winId()), self.hotkey_id)
 
     def parseHotkey(self, hotkey_str):
         """解析热键字符串，返回修饰符和按键码"""
@@ -753,11 +1881,14 @@ class TextEditor(QMainWindow):
             # 隐藏窗口前先保存状态
             self.saveWindowState()
             self.hide()
+            settings_store.flush_all()
         else:
             self.showWindow()
 
     def showHotkeyDialog(self):
         """显示热键设置对话框"""
+        from PyQt5.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QPushButton,
+                                     QKeySequenceEdit, QFormLayout)
         dialog = QDialog(self)
         dialog.setWindowTitle('设置唤醒快捷键')
         dialog.setModal(True)
@@ -812,8 +1943,14 @@ class TextEditor(QMainWindow):
         if window_state:
             self.restoreState(window_state)
 
+    def scheduleWindowStateSave(self):
+        """稍后保存窗口状态，连续的移动、缩放事件只保存一次"""
+        self.window_state_timer.start()
+
+    @perf_trace.timed('saveWindowState')
     def saveWindowState(self):
         """保存窗口状态"""
+        self.window_state_timer.stop()
         # 如果窗口是最大化的，不保存几何信息（会保存最大化前的位置）
         if not self.isMaximized():
             self.settings.setValue('windowX', self.x())
@@ -831,63 +1968,120 @@ class TextEditor(QMainWindow):
             # 隐藏窗口到托盘
             self.hide()
             self.saveWindowState()
+            settings_store.flush_all()
+            self.recovery.shutdown()
             event.ignore()  # 阻止窗口关闭
         else:
             self.saveWindowState()
+            settings_store.flush_all()
+            self.recovery.shutdown()
+            self.symbolIndex.shutdown()
             event.accept()
 
     def quitApplication(self):
         """真正退出应用程序"""
+        for batch in self.batchOpens:
+            batch.cancel()
+            batch.wait()
+        for worker in self.decompressors:
+            worker.cancel()
+            worker.wait()
+        for i in range(self.tabs.count()):
+            editor = self.tabs.widget(i)
+            if editor.loader is not None:
+                editor.loader.cancel()
+                editor.loader.wait()
+            if editor.saver is not None:
+                # 等待正在进行的保存完成，避免留下半写的临时文件
+                editor.saver.wait()
+            if getattr(editor, 'reloader', None) is not None:
+                editor.reloader.wait()
+            if isinstance(editor, (HugeFileViewer, HexViewer)):
+                # 停止后台查找，删除解压出的临时文件
+                editor.closeFile()
+        self.symbolIndex.shutdown()
+        # 所有标签（包括未保存的）在下次启动时恢复
+        self.recovery.shutdown()
         self.saveWindowState()
+        settings_store.flush_all()
         self.unregisterGlobalHotkey()  # 注销全局热键
         self.tray_icon.hide()  # 隐藏托盘图标
         QApplication.quit()  # 退出应用
 
+    def dragEnterEvent(self, event):
+        if any(url.isLocalFile() for url in event.mimeData().urls()):
+            event.acceptProposedAction()
+
+    def dropEvent(self, event):
+        """打开拖放到窗口上的文件"""
+        paths = [url.toLocalFile() for url in event.mimeData().urls() if url.isLocalFile()]
+        paths = [path for path in paths if os.path.isfile(path)]
+        if paths:
+            event.acceptProposedAction()
+            self.openFiles(paths, show=False)
+
     def resizeEvent(self, event):
         """窗口大小改变事件"""
         super().resizeEvent(event)
-        self.saveWindowState()
+        self.scheduleWindowStateSave()
 
     def moveEvent(self, event):
         """窗口移动事件"""
         super().moveEvent(event)
-        self.saveWindowState()
+        self.scheduleWindowStateSave()
 
     def changeEvent(self, event):
         """窗口状态改变事件（最大化、最小化等）"""
         super().changeEvent(event)
         if event.type() == event.WindowStateChange:
-            self.saveWindowState()
+            self.scheduleWindowStateSave()
+        elif event.type() == event.ActivationChange and self.isActiveWindow():
+            # 切回窗口时检查文件是否在外部被修改（包括收不到监视通知的情况）
+            self.changeWatcher.checkAll()
+            editor = self.currentEditor()
+            if getattr(editor, 'disk_changed', False):
+                QTimer.singleShot(0, lambda: self.promptReload(editor))
 
 if __name__ == '__main__':
+    startup_trace.mark('imports')
+
     # 切换工作目录到脚本所在目录
     script_dir = os.path.dirname(os.path.abspath(__file__))
     os.chdir(script_dir)
 
-    # 如果没有管理员权限，请求管理员权限重新运行
-    # if not is_admin():
-    #     ctypes.windll.shell32.ShellExecuteW(None, "runas", sys.executable, " ".join(sys.argv), None, 1)
-    #     sys.exit()
-
     # 设置Windows任务栏图标（Windows 7及以上）
-    try:
-        # 设置AppUserModelID以确保任务栏图标正确显示
-        myappid = 'mycompany.texteditor.1.0'
-        ctypes.windll.shell32.SetCurrentProcessExplicitAppUserModelID(myappid)
-    except:
-        pass
+    platform_support.set_app_user_model_id('mycompany.texteditor.1.0')
 
     app = QApplication(sys.argv)
     app.setWindowIcon(QIcon(resource_path("2048x2048.png")))
+    # 退出前写入尚未保存的设置
+    app.aboutToQuit.connect(settings_store.flush_all)
+    app.aboutToQuit.connect(file_metadata.flush)
+    startup_trace.mark('QApplication')
+
     editor = TextEditor()
+    startup_trace.mark('window')
+    startup_trace.mark_first_paint(editor)
+
+    # 接收之后启动的进程转发过来的文件
+    instance_server = single_instance.InstanceServer(editor)
+    instance_server.filesReceived.connect(editor.openFiles)
+    instance_server.listen()
+
+    # 恢复上次退出或崩溃时的标签
+    editor.recovery.restore()
+    startup_trace.mark('restore')
 
-    # 如果是第一次运行，添加右键菜单
-    if len(sys.argv) == 1:  # 没有命令行参数时尝试添加右键菜单
-        add_context_menu()
+    # 如果是第一次运行，添加右键菜单；已注册时不再写注册表，并推迟到事件循环开始后
+    if not file_args and platform_support.IS_WINDOWS:
+        def ensure_context_menu():
+            if not platform_support.context_menu_installed():
+                platform_support.add_context_menu(resource_path("icon.ico"))
+        QTimer.singleShot(0, ensure_context_menu)
 
     # 如果有文件路径参数，打开该文件并显示窗口
-    if len(sys.argv) > 1:
-        editor.openFile(sys.argv[1])
-        editor.showWindow()  # 从右键菜单打开文件时显示窗口
+    if file_args:
+        editor.openFiles(file_args)  # 从右键菜单打开文件时显示窗口
 
+    QTimer.singleShot(0, lambda: startup_trace.mark('event loop'))
     sys.exit(app.exec_())
@@ -0,0 +1,171 @@
+"""批量打开文件
+
+一次打开很多文件（多选、拖放、命令行参数、其他实例转发）时，中等大小的
+文件在线程池中并发读取、解码，界面线程只负责把解码好的文本放进编辑器。
+读取文件和计算摘要时不持有 GIL，多个文件的读取可以与解码、与界面线程
+同时进行；解码由 C 实现的编解码器完成，速度主要取决于磁盘。
+
+正在读取和已解码但界面尚未取走的文件总字节数有上限，超过时暂停提交新的
+文件，打开几百个文件也不会一次占用大量内存。结果按请求的顺序交给界面，
+标签页的顺序与请求一致。
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from PyQt5.QtCore import QThread, pyqtSignal
+
+import compressed_files
+import encoding_detect
+from file_loader import new_digest
+
+# 不超过该大小的文件在线程池中整体读取；更大的文件由 FileLoader 分块流式加载
+MAX_BATCH_FILE_SIZE = 16 * 1024 * 1024
+# 正在读取和等待界面取走的文件总字节数上限
+MAX_BYTES_IN_FLIGHT = 64 * 1024 * 1024
+# 线程池的线程数上限；读取大部分时间在等待磁盘，线程数可以比 CPU 核数多一些
+MAX_WORKERS = 8
+
+
+class LoadResult:
+    """一个文件读取、解码后的结果，属性与 FileLoader 加载完成时一致"""
+    def __init__(self, text, encoding, confidence, line_ending, mixed_line_endings,
+                 longest_line, bytes_read, digest):
+        self.text = text  # 换行符保持原样
+        self.encoding = encoding
+        self.confidence = confidence
+        self.line_ending = line_ending
+        self.mixed_line_endings = mixed_line_endings
+        self.longest_line = longest_line
+        self.bytes_read = bytes_read
+        self.digest = digest
+        self.compression = None  # 压缩文件不在线程池中读取
+
+
+def read_file(path, encoding=None, confidence=1.0):
+    """读取并解码整个文件（在线程池中运行）
+
+    encoding 已知时（元数据缓存）不再检测，解码失败时依次尝试后备编码。
+    文件不是文本、无法解码或是压缩文件时返回 None（由界面按单个文件打开），
+    读取失败时抛出 OSError。
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    if compressed_files.detect_header(data[:compressed_files.HEADER_SIZE]):
+        return None
+    digest = new_digest()
+    digest.update(data)
+    if encoding is None:
+        result = encoding_detect.detect(data, complete=True)
+        if result.binary:
+            return None
+        encoding, confidence = result.encoding, result.confidence
+    text = None
+    for candidate in [encoding] + encoding_detect.fallback_encodings(encoding):
+        bom = encoding_detect.bom_for(candidate)
+        body = data[len(bom):] if bom and data.startswith(bom) else data
+        try:
+            text = body.decode(encoding_detect.codec_for(candidate))
+        except UnicodeDecodeError:
+            continue
+        if candidate != encoding:
+            confidence = encoding_detect.FALLBACK_CONFIDENCE
+        encoding = candidate
+        break
+    if text is None:
+        return None
+    counts = encoding_detect.count_line_endings(text)
+    line_ending, mixed = encoding_detect.line_ending_from_counts(counts)
+    separator = encoding_detect.line_separator(counts)
+    longest = max(map(len, text.split(separator))) if text else 0
+    return LoadResult(text, encoding, confidence, line_ending, mixed, longest,
+                      len(data), digest.hexdigest())
+
+
+class BatchOpen(QThread):
+    """按顺序交付一批文件的读取结果
+
+    jobs 为 [(路径, 大小, 已知编码, 置信度)]，大小为 None 的项不在线程池中
+    读取（由界面按其他方式打开），只是按顺序原样交付。不能作为文本读取
+    的文件和压缩文件同样以 None 交付。
+    """
+    fileReady = pyqtSignal(int, str, object)   # 序号，路径，LoadResult 或 None
+    fileFailed = pyqtSignal(int, str, str)     # 序号，路径，错误信息
+
+    def __init__(self, jobs, parent=None):
+        super().__init__(parent)
+        self.jobs = jobs
+        self._cancelled = False
+        self._in_flight = 0
+        self._condition = threading.Condition()
+
+    def cancel(self):
+        self._cancelled = True
+        with self._condition:
+            self._condition.notify_all()
+
+    def consumed(self, size):
+        """界面取走一个结果后调用，释放它占用的额度"""
+        with self._condition:
+            self._in_flight -= size
+            self._condition.notify_all()
+
+    def tryAcquire(self, size):
+        """额度足够时占用并返回 True；单个文件超过上限时在没有其他文件占用时读取"""
+        with self._condition:
+            if self._in_flight and self._in_flight + size > MAX_BYTES_IN_FLIGHT:
+                return False
+            self._in_flight += size
+            return True
+
+    def waitForRelease(self):
+        with self._condition:
+            self._condition.wait(0.1)
+
+    def run(self):
+        workers = min(MAX_WORKERS, (os.cpu_count() or 1) + 4)
+        running = {}   # future -> 序号
+        done = {}      # 序号 -> future（已完成、等待按顺序交付），不在线程池中读取的为 None
+        next_submit = next_emit = 0
+        total = len(self.jobs)
+        with ThreadPoolExecutor(workers, thread_name_prefix='batch-open') as pool:
+            while next_emit < total and not self._cancelled:
+                while next_submit < total and len(running) < workers * 2:
+                    path, size, encoding, confidence = self.jobs[next_submit]
+                    if size is None:
+                        done[next_submit] = None
+                    elif self.tryAcquire(size):
+                        running[pool.submit(read_file, path, encoding, confidence)] = next_submit
+                    else:
+                        break
+                    next_submit += 1
+                # 按请求的顺序交付
+                while next_emit in done and not self._cancelled:
+                    self.emitResult(next_emit, done.pop(next_emit))
+                    next_emit += 1
+                if next_emit >= total:
+                    break
+                if running:
+                    finished, _ = wait(list(running), timeout=0.1, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        done[running.pop(future)] = future
+                else:
+                    # 额度被界面尚未取走的结果占满
+                    self.waitForRelease()
+            for future in running:
+                future.cancel()
+
+    def emitResult(self, index, future):
+        path, size, _, _ = self.jobs[index]
+        if future is None:
+            self.fileReady.emit(index, path, None)
+            return
+        try:
+            result = future.result()
+        except OSError as e:
+            self.consumed(size)
+            self.fileFailed.emit(index, path, str(e))
+            return
+        if result is None:
+            self.consumed(size)
+        self.fileReady.emit(index, path, result)
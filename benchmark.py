@@ -0,0 +1,648 @@
+"""编辑器热点路径的基准测试
+
+在无界面环境下运行（默认设置 QT_QPA_PLATFORM=offscreen），覆盖打开文件、
+保存、setText、连续按键、大量标签页切换和缩放。每个用例在单独的子进程中
+运行，记录耗时、峰值内存（RSS）和 Python 内存分配，并与保存的基准比较，
+超出容差时以非零状态退出。基准与机器有关，不随代码提交，需要先在本机用
+--save-baseline 生成；没有基准（或基准中没有某个用例）时会给出警告，这些
+用例不做比较。
+
+    python benchmark.py                    # 运行默认用例并与基准比较
+    python benchmark.py --save-baseline    # 把本次结果保存为基准
+    python benchmark.py --sizes 1,100,1024 # 包含 1 GB 文件
+    python benchmark.py --sizes 1024,4096  # 十六进制视图的 1 GB 查找和 4 GB 浏览
+    python benchmark.py -k open_1mb        # 只运行名称包含该字符串的用例
+    python benchmark.py --list
+
+测试数据生成在 --data-dir 中并在多次运行之间复用。编辑器设置写到临时
+目录，不会影响正在使用的编辑器。
+"""
+import argparse
+import importlib.util
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BASELINE = os.path.join(SCRIPT_DIR, 'benchmark_baseline.json')
+DEFAULT_DATA_DIR = os.path.join(tempfile.gettempdir(), 'texteditor-bench')
+# 文件大小（MB），1 GB 需要用 --sizes 显式指定
+DEFAULT_SIZES = (1, 100)
+# 相对基准允许的增幅
+DEFAULT_TIME_TOLERANCE = 0.25
+DEFAULT_MEMORY_TOLERANCE = 0.15
+# 等待后台加载或保存的最长时间（秒）
+WAIT_TIMEOUT = 600
+RESULT_PREFIX = 'BENCH-RESULT '
+
+LINE_ENDINGS = {'crlf': '\r\n', 'lf': '\n', 'cr': '\r'}
+ENCODINGS = {'utf8': 'utf-8', 'gbk': 'gbk'}
+# 生成数据用的行，包含中英文和代码常见的符号
+SAMPLE_LINES = [
+    'def handle_request(self, request, *args, **kwargs):  # 处理请求',
+    '    for index, value in enumerate(values):',
+    '        total += value * weights[index]  # 加权求和',
+    '日志 2025-02-14 12:00:00 INFO 服务启动完成，监听端口 8080',
+    '{"id": 12345, "name": "测试数据", "tags": ["a", "b", "c"], "ok": true}',
+    '',
+    '    return {key: value for key, value in items if value is not None}',
+    'SELECT id, name, created_at FROM users WHERE name LIKE \'%张%\' ORDER BY id;',
+]
+
+
+class Case:
+    """一个基准用例：setup 准备数据（不计时），返回真正要计时的函数"""
+    def __init__(self, name, setup, repeat=3, sizes=()):
+        self.name = name
+        self.setup = setup
+        self.repeat = repeat
+        self.sizes = sizes  # 用到的数据文件大小，用于按 --sizes 过滤
+
+
+CASES = {}
+
+
+def register(name, setup, repeat=3, sizes=()):
+    CASES[name] = Case(name, setup, repeat, sizes)
+
+
+def data_path(data_dir, size_mb, eol='lf', encoding='utf8'):
+    return os.path.join(data_dir, f'{size_mb}mb_{eol}_{encoding}.txt')
+
+
+def generate_file(path, size_mb, eol, encoding):
+    """生成指定大小的文本文件，已存在且大小正确时直接复用"""
+    size = size_mb * 1024 * 1024
+    if os.path.exists(path) and os.path.getsize(path) == size:
+        return path
+    block = (LINE_ENDINGS[eol].join(SAMPLE_LINES * 256) + LINE_ENDINGS[eol])
+    block = block.encode(ENCODINGS[encoding])
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        written = 0
+        while written < size:
+            piece = block[:size - written]
+            if encoding == 'gbk':
+                # 不在双字节字符中间截断
+                piece = piece.decode('gbk', errors='ignore').encode('gbk')
+                piece += b' ' * (min(len(block), size - written) - len(piece))
+            f.write(piece)
+            written += len(piece)
+    os.replace(tmp_path, path)
+    return path
+
+
+def sample_text(size_mb):
+    line = '\n'.join(SAMPLE_LINES) + '\n'
+    count = size_mb * 1024 * 1024 // len(line.encode('utf-8')) + 1
+    return line * count
+
+
+class Bench:
+    """子进程中的运行环境：QApplication、编辑器模块和等待辅助函数"""
+    def __init__(self, data_dir):
+        self.data_dir = data_dir
+        self.settings_dir = tempfile.mkdtemp(prefix='texteditor-bench-settings-')
+        self.work_dir = tempfile.mkdtemp(prefix='texteditor-bench-work-')
+        os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+        sys.path.insert(0, SCRIPT_DIR)
+
+        from PyQt5.QtCore import QSettings
+        from PyQt5.QtWidgets import QApplication
+        # 设置写到临时目录
+        for fmt in (QSettings.NativeFormat, QSettings.IniFormat):
+            QSettings.setPath(fmt, QSettings.UserScope, self.settings_dir)
+        self.app = QApplication.instance() or QApplication([sys.argv[0]])
+
+        # 1.py 不能直接 import，按文件路径加载
+        spec = importlib.util.spec_from_file_location(
+            'texteditor_main', os.path.join(SCRIPT_DIR, '1.py'))
+        self.module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(self.module)
+        # 无人值守运行，确认对话框（如解压超大的压缩文件）一律回答“是”
+        self.module.QMessageBox.question = staticmethod(
+            lambda *args, **kwargs: self.module.QMessageBox.Yes)
+        self.window = None
+
+    def new_window(self):
+        """关闭上一个窗口，创建一个新的主窗口"""
+        self.close_window()
+        self.window = self.module.TextEditor()
+        self.window.show()
+        self.process_events()
+        return self.window
+
+    def close_window(self):
+        if self.window is not None:
+            window = self.window
+            self.window = None
+            for i in range(window.tabs.count()):
+                window.cancelLoading(window.tabs.widget(i))
+            window.tray_icon.hide()
+            window.hide()
+            window.deleteLater()
+            self.process_events()
+
+    def process_events(self):
+        from PyQt5.QtCore import QCoreApplication, QEvent
+        self.app.processEvents()
+        # deleteLater 只在 DeferredDelete 事件中执行
+        QCoreApplication.sendPostedEvents(None, QEvent.DeferredDelete)
+
+    def wait_until(self, condition, what):
+        from PyQt5.QtCore import QEventLoop
+        deadline = time.monotonic() + WAIT_TIMEOUT
+        while not condition():
+            if time.monotonic() > deadline:
+                raise RuntimeError(f'等待{what}超时')
+            self.app.processEvents(QEventLoop.AllEvents, 20)
+        self.process_events()
+
+    def open_and_wait(self, path):
+        """打开文件并等待后台加载（或超大文件的索引）完成"""
+        window = self.window
+        window.openFile(path)
+        editor = window.currentEditor()
+        self.wait_until(lambda: editor.loader is None, '加载')
+        return editor
+
+
+def open_case(path):
+    def setup(bench):
+        import file_metadata
+
+        def run():
+            # 测量完整的编码检测，不使用上一轮留下的元数据缓存
+            file_metadata.get_cache().clear()
+            bench.new_window()
+            bench.open_and_wait(path)
+        return run
+    return setup
+
+
+def save_case(path):
+    def setup(bench):
+        bench.new_window()
+        editor = bench.open_and_wait(path)
+        out_path = os.path.join(bench.work_dir, os.path.basename(path))
+
+        def run():
+            # 另存到别的路径，不再按原文件检查外部修改
+            bench.window.changeWatcher.unwatch(editor)
+            editor.filepath = out_path
+            bench.window.saveFile()
+            bench.wait_until(lambda: editor.saver is None, '保存')
+            # 原编码、原换行符写回，内容应与原文件完全一致
+            with open(path, 'rb') as a, open(out_path, 'rb') as b:
+                if a.read() != b.read():
+                    raise RuntimeError(f'保存结果与原文件不一致：{path}')
+        return run
+    return setup
+
+
+def eol_case(path):
+    """把文档的换行符转换为 LF 再转换回来"""
+    def setup(bench):
+        bench.new_window()
+        editor = bench.open_and_wait(path)
+
+        def run():
+            editor.convertLineEndings('Unix (LF)')
+            editor.convertLineEndings('Windows (CRLF)')
+            bench.process_events()
+        return run
+    return setup
+
+
+def set_text_case(size_mb):
+    def setup(bench):
+        bench.new_window()
+        bench.window.newFile()
+        editor = bench.window.currentEditor()
+        text = sample_text(size_mb)
+
+        def run():
+            editor.setText(text)
+            bench.process_events()
+        return run
+    return setup
+
+
+def keystroke_case(count):
+    def setup(bench):
+        from PyQt5.QtCore import Qt, QEvent
+        from PyQt5.QtGui import QKeyEvent
+        bench.new_window()
+        bench.window.newFile()
+        editor = bench.window.currentEditor()
+        editor.setText(sample_text(1))
+        editor.setCursorPosition(editor.lines() // 2, 0)
+        keys = []
+        for i in range(count):
+            if i % 60 == 59:
+                keys.append((Qt.Key_Return, '\r'))
+            else:
+                ch = 'abcdefghij 中文'[i % 13]
+                keys.append((Qt.Key_A if ch.isascii() else 0, ch))
+
+        def run():
+            for i, (key, ch) in enumerate(keys):
+                editor.keyPressEvent(QKeyEvent(QEvent.KeyPress, key, Qt.NoModifier, ch))
+                if i % 10 == 9:
+                    # 模拟用户输入的节奏：每隔几个按键处理一次事件
+                    bench.process_events()
+            bench.process_events()
+        return run
+    return setup
+
+
+def tabs_case(count):
+    def setup(bench):
+        def run():
+            window = bench.new_window()
+            for _ in range(count):
+                window.newFile()
+            bench.process_events()
+            for _ in range(count):
+                window.nextTab()
+                bench.process_events()
+            for _ in range(count):
+                window.prevTab()
+                bench.process_events()
+        return run
+    return setup
+
+
+def restore_case(count):
+    """恢复上次会话的 count 个标签，直到窗口可用（当前标签加载完成）"""
+    def setup(bench):
+        paths = []
+        text = sample_text(1)[:100000]
+        for i in range(count):
+            path = os.path.join(bench.work_dir, f'session_{i}.py')
+            with open(path, 'w', encoding='utf-8', newline='') as f:
+                f.write(text)
+            paths.append(path)
+        window = bench.new_window()
+        for path in paths:
+            bench.open_and_wait(path)
+        window.recovery.shutdown()
+
+        def run():
+            window = bench.new_window()
+            window.recovery.restore()
+            editor = window.currentEditor()
+            bench.wait_until(lambda: editor.loader is None, '恢复')
+        return run
+    return setup
+
+
+def batch_open_case(count):
+    """一次打开 count 个中等大小的文件，直到全部标签创建完成"""
+    def setup(bench):
+        import file_metadata
+        paths = []
+        text = sample_text(1)[:200000]
+        for i in range(count):
+            path = os.path.join(bench.work_dir, f'batch_{i}.py')
+            with open(path, 'w', encoding='utf-8', newline='') as f:
+                f.write(text)
+            paths.append(path)
+
+        def run():
+            file_metadata.get_cache().clear()
+            window = bench.new_window()
+            window.openFiles(paths, show=False)
+            bench.wait_until(lambda: not window.batchOpens, '批量打开')
+        return run
+    return setup
+
+
+def hex_case(size_mb, search=False):
+    """打开 size_mb 的二进制文件（稀疏文件，不占磁盘）并跳到末尾绘制；
+    search 为 True 时从头查找只出现在末尾的字节串"""
+    def setup(bench):
+        from hex_viewer import HexViewer
+        path = os.path.join(bench.work_dir, f'binary_{size_mb}mb.bin')
+        with open(path, 'wb') as f:
+            f.write(b'\x7fELF\x02\x01\x01\x00')
+            f.seek(size_mb * 1024 * 1024 - 8)
+            f.write(b'TAILMARK')
+
+        def run():
+            window = bench.new_window()
+            window.openFile(path)
+            bench.wait_until(lambda: isinstance(window.currentEditor(), HexViewer), '打开')
+            viewer = window.currentEditor()
+            viewer.resize(800, 600)
+            if search:
+                viewer.hexBox.setChecked(False)
+                viewer.searchEdit.setText('TAILMARK')
+                viewer.findNext()
+                bench.wait_until(lambda: viewer.search is None, '查找')
+            else:
+                viewer.goToOffset(size_mb * 1024 * 1024 - 1)
+            viewer.canvas.grab()
+        return run
+    return setup
+
+
+def gzip_case(size_mb, save=False):
+    """打开 gzip 压缩的 size_mb 文本文件；save 为 True 时测量重新压缩保存"""
+    def setup(bench):
+        import gzip
+        import shutil
+        source = data_path(bench.data_dir, size_mb, 'crlf', 'utf8')
+        path = os.path.join(bench.work_dir, os.path.basename(source) + '.gz')
+        if not os.path.exists(path):
+            with open(source, 'rb') as f, gzip.open(path, 'wb', 6) as out:
+                shutil.copyfileobj(f, out)
+        if not save:
+            return open_case(path)(bench)
+        bench.new_window()
+        editor = bench.open_and_wait(path)
+
+        def run():
+            editor.setModified(True)
+            bench.window.saveFile()
+            bench.wait_until(lambda: editor.saver is None, '保存')
+        return run
+    return setup
+
+
+def lexer_case(extension, copies, jumps):
+    """把 1MB 的示例文件重复 copies 次保存为 extension 文件，打开后在文档中
+    均匀跳转 jumps 次并绘制视口，测量自定义词法分析器的着色开销"""
+    def setup(bench):
+        source = data_path(bench.data_dir, 1, 'lf', 'utf8')
+        path = os.path.join(bench.work_dir, f'sample_{copies}mb{extension}')
+        if not os.path.exists(path):
+            with open(source, 'rb') as f:
+                data = f.read()
+            with open(path, 'wb') as f:
+                for _ in range(copies):
+                    f.write(data)
+
+        def run():
+            bench.new_window()
+            editor = bench.open_and_wait(path)
+            lines = editor.lines()
+            for i in range(jumps):
+                editor.setFirstVisibleLine(lines * i // jumps)
+                editor.viewport().grab()
+        return run
+    return setup
+
+
+def symbols_case(copies, edits):
+    """把 1.py 重复 copies 次保存为 Python 文件，打开后等待符号索引建立，
+    再在文档各处插入 edits 个方法，每次立即（不等待防抖）重新分析修改过的块"""
+    def setup(bench):
+        path = os.path.join(bench.work_dir, f'symbols_{copies}.py')
+        if not os.path.exists(path):
+            with open(os.path.join(SCRIPT_DIR, '1.py'), encoding='utf-8') as f:
+                source = f.read()
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write('\n'.join([source] * copies))
+
+        def run():
+            bench.new_window()
+            index = bench.window.symbolIndex
+            editor = bench.open_and_wait(path)
+            bench.wait_until(lambda: index.parser is None and editor.symbols.chunks, '符号索引')
+            lines = editor.lines()
+            for i in range(edits):
+                editor.insertAt('    def inserted(self):\n        pass\n', lines * i // edits, 0)
+                editor.symbols.timer.stop()
+                index.schedule(editor.symbols)
+                bench.wait_until(lambda: index.parser is None, '重新分析')
+        return run
+    return setup
+
+
+def zoom_case(steps):
+    def setup(bench):
+        bench.new_window()
+        bench.window.newFile()
+        bench.window.currentEditor().setText(sample_text(1))
+
+        def run():
+            for _ in range(steps):
+                bench.window.zoomIn()
+                bench.process_events()
+            for _ in range(steps):
+                bench.window.zoomOut()
+                bench.process_events()
+        return run
+    return setup
+
+
+def register_cases():
+    for size in (1, 100, 1024):
+        repeat = 3 if size <= 100 else 1
+        for eol in LINE_ENDINGS:
+            for encoding in ENCODINGS:
+                register(f'open_{size}mb_{eol}_{encoding}',
+                         lambda bench, s=size, e=eol, enc=encoding:
+                             open_case(data_path(bench.data_dir, s, e, enc))(bench),
+                         repeat, (size,))
+        if size <= 100:
+            for encoding in ENCODINGS:
+                register(f'save_{size}mb_crlf_{encoding}',
+                         lambda bench, s=size, enc=encoding:
+                             save_case(data_path(bench.data_dir, s, 'crlf', enc))(bench),
+                         repeat, (size,))
+            register(f'opengz_{size}mb_crlf_utf8', gzip_case(size), repeat, (size,))
+            register(f'savegz_{size}mb_crlf_utf8', gzip_case(size, save=True), repeat, (size,))
+            register(f'settext_{size}mb', set_text_case(size), repeat, (size,))
+            register(f'eol_{size}mb_crlf_utf8',
+                     lambda bench, s=size: eol_case(data_path(bench.data_dir, s, 'crlf', 'utf8'))(bench),
+                     repeat, (size,))
+    register('keystrokes_2000', keystroke_case(2000))
+    register('tabs_500', tabs_case(500), repeat=1)
+    register('zoom_100', zoom_case(100))
+    register('lexlog_32mb', lexer_case('.log', 32, 50), sizes=(1,))
+    register('lexcsv_4mb', lexer_case('.csv', 4, 50), sizes=(1,))
+    register('symbols_50k', symbols_case(25, 20), repeat=1)
+    register('restore_1', restore_case(1))
+    register('restore_50', restore_case(50))
+    register('batchopen_200', batch_open_case(200), repeat=1)
+    # 稀疏文件不占磁盘，但映射和查找的耗时与大小成正比，与 1 GB 文件一样按 --sizes 选择
+    register('hexview_4096mb', hex_case(4096), sizes=(4096,))
+    register('hexsearch_1024mb', hex_case(1024, search=True), repeat=1, sizes=(1024,))
+
+
+register_cases()
+
+
+def run_case(name, data_dir):
+    """在当前（子）进程中运行一个用例，返回结果字典"""
+    case = CASES[name]
+    bench = Bench(data_dir)
+    run = case.setup(bench)
+    times = []
+    for _ in range(case.repeat):
+        start = time.perf_counter()
+        run()
+        times.append((time.perf_counter() - start) * 1000)
+
+    # 单独跑一次统计 Python 分配，tracemalloc 会明显拖慢运行，不计入耗时
+    run = case.setup(bench)
+    tracemalloc.start()
+    run()
+    alloc_current, alloc_peak = tracemalloc.get_traced_memory()
+    blocks = sum(stat.count for stat in tracemalloc.take_snapshot().statistics('filename'))
+    tracemalloc.stop()
+    bench.close_window()
+
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        peak_rss //= 1024  # macOS 上单位是字节
+    return {
+        'wall_ms': round(min(times), 2),
+        'wall_ms_median': round(statistics.median(times), 2),
+        'peak_rss_kb': peak_rss,
+        'alloc_peak_kb': alloc_peak // 1024,
+        'alloc_blocks': blocks,
+    }
+
+
+def run_in_subprocess(name, data_dir):
+    env = dict(os.environ)
+    env.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    proc = subprocess.run([sys.executable, os.path.abspath(__file__), '--run-case', name,
+                           '--data-dir', data_dir],
+                          env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                          universal_newlines=True, encoding='utf-8')
+    for line in proc.stdout.splitlines():
+        if line.startswith(RESULT_PREFIX):
+            return json.loads(line[len(RESULT_PREFIX):])
+    raise RuntimeError(f'用例 {name} 运行失败（退出码 {proc.returncode}）：\n'
+                       f'{proc.stderr.strip()[-2000:]}')
+
+
+def compare(name, result, baseline, time_tolerance, memory_tolerance):
+    """与基准比较，返回回退说明的列表"""
+    base = baseline.get(name)
+    if not base:
+        return []
+    problems = []
+    for key, tolerance in (('wall_ms', time_tolerance),
+                           ('peak_rss_kb', memory_tolerance),
+                           ('alloc_peak_kb', memory_tolerance)):
+        old, new = base.get(key), result.get(key)
+        if old and new is not None and new > old * (1 + tolerance):
+            problems.append(f'{key} {old} -> {new} (+{(new / old - 1) * 100:.0f}%)')
+    return problems
+
+
+def selected_cases(args):
+    sizes = {int(s) for s in args.sizes.split(',') if s.strip()}
+    names = []
+    for name, case in CASES.items():
+        if case.sizes and not set(case.sizes) <= sizes:
+            continue
+        if args.keyword and not any(k in name for k in args.keyword):
+            continue
+        names.append(name)
+    return names
+
+
+def prepare_data(names, data_dir):
+    """生成所选用例需要的数据文件"""
+    os.makedirs(data_dir, exist_ok=True)
+    for name in names:
+        parts = name.split('_')
+        if parts[0] in ('lexlog', 'lexcsv'):
+            generate_file(data_path(data_dir, 1, 'lf', 'utf8'), 1, 'lf', 'utf8')
+        elif parts[0] in ('open', 'save', 'eol', 'opengz', 'savegz'):
+            size = int(parts[1][:-2])
+            path = data_path(data_dir, size, parts[2], parts[3])
+            if not os.path.exists(path):
+                print(f'生成测试数据 {os.path.basename(path)} ...', flush=True)
+            generate_file(path, size, parts[2], parts[3])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='文本编辑器基准测试')
+    parser.add_argument('-k', '--keyword', action='append',
+                        help='只运行名称包含该字符串的用例（可多次指定）')
+    parser.add_argument('--sizes', default=','.join(map(str, DEFAULT_SIZES)),
+                        help='测试文件大小（MB），逗号分隔，默认 %(default)s')
+    parser.add_argument('--data-dir', default=DEFAULT_DATA_DIR, help='测试数据目录')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='基准文件路径')
+    parser.add_argument('--save-baseline', action='store_true', help='把本次结果写入基准文件')
+    parser.add_argument('--time-tolerance', type=float, default=DEFAULT_TIME_TOLERANCE)
+    parser.add_argument('--memory-tolerance', type=float, default=DEFAULT_MEMORY_TOLERANCE)
+    parser.add_argument('--json', help='把本次结果写入该文件')
+    parser.add_argument('--list', action='store_true', help='列出所有用例')
+    parser.add_argument('--run-case', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_case:
+        result = run_case(args.run_case, args.data_dir)
+        print(RESULT_PREFIX + json.dumps(result), flush=True)
+        return 0
+
+    names = selected_cases(args)
+    if args.list:
+        print('\n'.join(names))
+        return 0
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+    elif not args.save_baseline:
+        print(f'警告：基准文件 {args.baseline} 不存在，本次结果不与基准比较；'
+              f'请先用 --save-baseline 生成', flush=True)
+
+    prepare_data(names, args.data_dir)
+    results = {}
+    regressions = {}
+    print(f'{"用例":<28}{"耗时(ms)":>12}{"峰值RSS(MB)":>14}{"分配峰值(MB)":>14}')
+    for name in names:
+        try:
+            result = run_in_subprocess(name, args.data_dir)
+        except RuntimeError as e:
+            print(f'{name:<28}失败\n{e}')
+            regressions[name] = ['运行失败']
+            continue
+        results[name] = result
+        problems = compare(name, result, baseline, args.time_tolerance, args.memory_tolerance)
+        if problems:
+            regressions[name] = problems
+        flag = '  <-- 回退' if problems else ''
+        print(f'{name:<28}{result["wall_ms"]:>12.1f}{result["peak_rss_kb"] / 1024:>14.1f}'
+              f'{result["alloc_peak_kb"] / 1024:>14.1f}{flag}', flush=True)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+    if args.save_baseline:
+        baseline.update(results)
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(baseline, f, indent=2, ensure_ascii=False, sort_keys=True)
+        print(f'基准已保存到 {args.baseline}')
+        return 0
+
+    unbased = [name for name in results if name not in baseline]
+    if baseline and unbased:
+        print(f'\n警告：以下用例没有基准，未做比较：{", ".join(unbased)}')
+    if regressions:
+        print('\n性能回退：')
+        for name, problems in regressions.items():
+            for problem in problems:
+                print(f'  {name}: {problem}')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
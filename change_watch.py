@@ -0,0 +1,336 @@
+"""外部修改检测与按差异重新加载
+
+每个已加载的标签在加载或保存后记下文件的大小、修改时间和内容摘要。
+文件监视器报告变化时先比较大小和修改时间，只有它们变了才在后台计算
+摘要，内容确实不同才通知主窗口（只是 touch 了文件不会打扰用户）。
+
+重新加载时 ReloadWorker 在后台读取并解码新文件，与编辑器内容的快照
+逐行比较，只把有差异的行替换到 Scintilla 缓冲区中。光标、滚动位置、
+折叠和撤销历史都得以保留，重新加载本身也可以撤销；大文件中改动一行
+不会重建整个缓冲区。
+"""
+import bisect
+import difflib
+import os
+
+from PyQt5.QtCore import QObject, QThread, QTimer, QFileSystemWatcher, pyqtSignal
+from PyQt5.Qsci import QsciScintilla
+
+import compressed_files
+import encoding_detect
+from file_loader import new_digest
+
+# 收到变化通知后等待多久再检查（毫秒），写入通常是连续的多次修改
+CHECK_DELAY = 300
+# 去掉相同的首尾后，差异部分超过该行数时先按唯一的行切分再比较
+MAX_DIFF_LINES = 20000
+# 计算摘要时每次读取的字节数
+READ_SIZE = 4 * 1024 * 1024
+
+
+def file_stamp(path):
+    """(大小, 修改时间)，文件不存在时返回 None"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_size, st.st_mtime_ns)
+
+
+def file_digest(path):
+    digest = new_digest()
+    with open(path, 'rb') as f:
+        while True:
+            data = f.read(READ_SIZE)
+            if not data:
+                break
+            digest.update(data)
+    return digest.hexdigest()
+
+
+def unique_anchors(old_lines, new_lines):
+    """两边都只出现一次的行中，前后顺序一致的最长序列 [(旧行号, 新行号), ...]
+
+    即 patience diff 的锚点，用最长递增子序列求得，O(n log n)。
+    """
+    counts = {}
+    for line in old_lines:
+        counts[line] = counts.get(line, 0) + 1
+    new_positions = {}
+    for j, line in enumerate(new_lines):
+        if counts.get(line) == 1:
+            new_positions[line] = -1 if line in new_positions else j
+    pairs = [(i, new_positions[line]) for i, line in enumerate(old_lines)
+             if counts[line] == 1 and new_positions.get(line, -1) >= 0]
+    # 按新行号求最长递增子序列
+    tails, tail_index, previous = [], [], [None] * len(pairs)
+    for k, (_, j) in enumerate(pairs):
+        pos = bisect.bisect_left(tails, j)
+        if pos == len(tails):
+            tails.append(j)
+            tail_index.append(k)
+        else:
+            tails[pos] = j
+            tail_index[pos] = k
+        previous[k] = tail_index[pos - 1] if pos else None
+    anchors = []
+    k = tail_index[-1] if tail_index else None
+    while k is not None:
+        anchors.append(pairs[k])
+        k = previous[k]
+    anchors.reverse()
+    return anchors
+
+
+def diff_hunks(old_lines, new_lines, offset=0):
+    """逐行比较，返回需要替换的 (旧起始行, 旧结束行, 新行列表)，按位置从前往后排列
+
+    先去掉相同的开头和结尾，大文件中的少量改动只比较很小的中间部分。
+    中间部分较小时用 difflib；较大时先以两边都唯一的行为锚点切开，
+    再分别比较锚点之间的部分，避免 difflib 在几十万行上耗时过长。
+    offset 为 old_lines 第一行在文档中的行号。
+    """
+    old_end, new_end = len(old_lines), len(new_lines)
+    start = 0
+    while start < old_end and start < new_end and old_lines[start] == new_lines[start]:
+        start += 1
+    while old_end > start and new_end > start and old_lines[old_end - 1] == new_lines[new_end - 1]:
+        old_end -= 1
+        new_end -= 1
+    if start == old_end and start == new_end:
+        return []
+    old_middle, new_middle = old_lines[start:old_end], new_lines[start:new_end]
+    offset += start
+    if len(old_middle) <= MAX_DIFF_LINES and len(new_middle) <= MAX_DIFF_LINES:
+        matcher = difflib.SequenceMatcher(None, old_middle, new_middle, autojunk=False)
+        return [(offset + i1, offset + i2, new_middle[j1:j2])
+                for tag, i1, i2, j1, j2 in matcher.get_opcodes() if tag != 'equal']
+    anchors = unique_anchors(old_middle, new_middle)
+    if not anchors:
+        return [(offset, offset + len(old_middle), new_middle)]
+    hunks = []
+    i = j = 0
+    for anchor_i, anchor_j in anchors + [(len(old_middle), len(new_middle))]:
+        if anchor_i > i or anchor_j > j:
+            hunks += diff_hunks(old_middle[i:anchor_i], new_middle[j:anchor_j], offset + i)
+        i, j = anchor_i + 1, anchor_j + 1
+    return hunks
+
+
+class ChangeCheck(QThread):
+    """在后台计算文件摘要"""
+    checked = pyqtSignal(object, object)  # 文件标记, 摘要（读取失败时为 None）
+
+    def __init__(self, path, parent=None):
+        super().__init__(parent)
+        self.path = path
+
+    def run(self):
+        stamp = file_stamp(self.path)
+        try:
+            digest = file_digest(self.path)
+        except OSError:
+            digest = None
+        self.checked.emit(stamp, digest)
+
+
+class ReloadWorker(QThread):
+    """读取磁盘上的新内容，计算与编辑器快照之间的差异"""
+    reloadReady = pyqtSignal(list)  # diff_hunks() 的结果，行为 UTF-8 字节
+    reloadFailed = pyqtSignal(str)
+
+    def __init__(self, path, snapshot, encoding=None, parent=None):
+        super().__init__(parent)
+        self.path = path
+        self.snapshot = snapshot  # 编辑器内容的 UTF-8 字节
+        self.encoding = encoding  # 给出时按该编码解码，不再检测
+        self.compression = None
+        self.line_ending = None
+        self.mixed_line_endings = False
+        self.stamp = None
+        self.digest = None
+        self.size = 0
+
+    def run(self):
+        try:
+            self.stamp = file_stamp(self.path)
+            with open(self.path, 'rb') as f:
+                data = f.read()
+        except OSError as e:
+            self.reloadFailed.emit(str(e))
+            return
+        digest = new_digest()
+        digest.update(data)
+        self.digest = digest.hexdigest()
+        self.size = len(data)
+        self.compression = compressed_files.detect_header(data[:compressed_files.HEADER_SIZE])
+        if self.compression is not None:
+            try:
+                data = compressed_files.decompress(data)
+            except compressed_files.ERRORS as e:
+                self.reloadFailed.emit(f'解压失败：{e}')
+                return
+
+        if self.encoding is not None:
+            candidates = [self.encoding]
+        else:
+            detected = encoding_detect.detect(data, complete=True).encoding
+            candidates = [detected] + encoding_detect.fallback_encodings(detected)
+        text = None
+        for encoding in candidates:
+            bom = encoding_detect.bom_for(encoding)
+            body = data[len(bom):] if bom and data.startswith(bom) else data
+            try:
+                text = body.decode(encoding_detect.codec_for(encoding))
+                break
+            except UnicodeDecodeError:
+                continue
+        if text is None:
+            if self.encoding is not None:
+                self.reloadFailed.emit(f'文件内容不是有效的 {self.encoding} 编码')
+            else:
+                self.reloadFailed.emit('无法识别文件编码')
+            return
+        self.encoding = encoding
+        counts = encoding_detect.count_line_endings(text)
+        self.line_ending, self.mixed_line_endings = encoding_detect.line_ending_from_counts(counts)
+
+        new = text.encode('utf-8')
+        hunks = diff_hunks(self.snapshot.splitlines(keepends=True),
+                           new.splitlines(keepends=True))
+        self.snapshot = None
+        self.reloadReady.emit(hunks)
+
+
+def apply_hunks(editor, hunks):
+    """把差异应用到编辑器，作为一个撤销步骤；从后往前替换，前面的位置不受影响"""
+    send = editor.SendScintilla
+    line_count = send(QsciScintilla.SCI_GETLINECOUNT)
+    length = send(QsciScintilla.SCI_GETLENGTH)
+
+    def position(line):
+        return length if line >= line_count else send(QsciScintilla.SCI_POSITIONFROMLINE, line)
+
+    send(QsciScintilla.SCI_BEGINUNDOACTION)
+    try:
+        for old_start, old_end, new_lines in reversed(hunks):
+            text = b''.join(new_lines)
+            send(QsciScintilla.SCI_SETTARGETSTART, position(old_start))
+            send(QsciScintilla.SCI_SETTARGETEND, position(old_end))
+            send(QsciScintilla.SCI_REPLACETARGET, len(text), text)
+    finally:
+        send(QsciScintilla.SCI_ENDUNDOACTION)
+
+
+class FileChangeWatcher(QObject):
+    """监视所有已加载标签的文件，内容确实变化时发出 fileChanged"""
+    fileChanged = pyqtSignal(object)  # 编辑器
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.watcher = QFileSystemWatcher(self)
+        self.watcher.fileChanged.connect(self.scheduleCheck)
+        self.editors = {}   # 规范化路径 -> 编辑器集合
+        self.known = {}     # 编辑器 -> (文件标记, 摘要)
+        self._due = set()
+        self._checks = {}   # 编辑器 -> 正在运行的 ChangeCheck
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(CHECK_DELAY)
+        self._timer.timeout.connect(self.runChecks)
+
+    @staticmethod
+    def key(path):
+        return os.path.normcase(os.path.abspath(path))
+
+    def watch(self, editor, digest=None, stamp=None):
+        """开始（或在保存、重新加载后继续）监视 editor 的文件，记下当前状态
+
+        digest 为 None 表示内容摘要未知，此后文件标记一变就认为内容变了。
+        """
+        self.unwatch(editor)
+        path = editor.filepath
+        editor.disk_changed = False
+        self.known[editor] = (stamp or file_stamp(path), digest)
+        self.editors.setdefault(self.key(path), set()).add(editor)
+        if os.path.exists(path) and path not in self.watcher.files():
+            self.watcher.addPath(path)
+
+    def unwatch(self, editor):
+        self.known.pop(editor, None)
+        self._due.discard(editor)
+        for key, editors in list(self.editors.items()):
+            if editor in editors:
+                editors.discard(editor)
+                if not editors:
+                    del self.editors[key]
+                    for path in self.watcher.files():
+                        if self.key(path) == key:
+                            self.watcher.removePath(path)
+
+    def acknowledge(self, editor):
+        """用户选择不重新加载：把当前磁盘状态当作已知，下次变化时再提示"""
+        if editor in self.known:
+            stamp = file_stamp(editor.filepath)
+            self.known[editor] = (stamp, None)
+            editor.disk_changed = False
+
+    def isStale(self, editor):
+        """磁盘上的文件是否与上次加载或保存时不同（只比较大小和修改时间）"""
+        if editor not in self.known:
+            return False
+        stamp = self.known[editor][0]
+        return stamp is not None and file_stamp(editor.filepath) != stamp
+
+    def scheduleCheck(self, path):
+        for editor in self.editors.get(self.key(path), ()):
+            self._due.add(editor)
+        if os.path.exists(path) and path not in self.watcher.files():
+            # 以替换方式保存的文件会从监视中移除，需要重新加入
+            self.watcher.addPath(path)
+        self._timer.start()
+
+    def checkAll(self):
+        """检查所有文件（窗口重新激活时调用，弥补收不到监视通知的情况）"""
+        for editor, (stamp, _) in self.known.items():
+            if file_stamp(editor.filepath) != stamp:
+                self._due.add(editor)
+        if self._due:
+            self._timer.start()
+
+    def runChecks(self):
+        due, self._due = self._due, set()
+        for editor in due:
+            if editor not in self.known or editor in self._checks:
+                continue
+            if editor.saver is not None:
+                # 自己正在保存，保存完成后会更新状态
+                continue
+            stamp, digest = self.known[editor]
+            current = file_stamp(editor.filepath)
+            if current == stamp or current is None:
+                continue
+            if digest is None or (stamp is not None and current[0] != stamp[0]):
+                self.report(editor)
+                continue
+            # 大小没变、修改时间变了，比较内容摘要
+            check = ChangeCheck(editor.filepath, self)
+            self._checks[editor] = check
+            check.checked.connect(
+                lambda new_stamp, new_digest, e=editor, c=check: self.handleChecked(e, c, new_stamp, new_digest))
+            check.start()
+
+    def handleChecked(self, editor, check, stamp, digest):
+        self._checks.pop(editor, None)
+        check.deleteLater()
+        if editor not in self.known:
+            return
+        if digest is not None and digest == self.known[editor][1]:
+            # 内容没变，只更新修改时间
+            self.known[editor] = (stamp, digest)
+            return
+        self.report(editor)
+
+    def report(self, editor):
+        editor.disk_changed = True
+        self.fileChanged.emit(editor)
@@ -0,0 +1,215 @@
+"""压缩文件的识别与流式读写
+
+按文件开头的魔数识别 gzip、bzip2、xz（以及 Python 3.14 起标准库支持的
+zstd）压缩的文件，与扩展名无关。加载时在工作线程中边读边解压，分块交给
+编辑器，不需要先解压到磁盘；保存时按原来的格式和压缩级别重新压缩。
+
+解压后超过只读查看器阈值的文件先流式解压到临时文件，再由只读查看器
+映射，解压后的全文不会作为一个 Python 字符串或字节串留在内存中。只读
+查看器需要随机访问，因此这些文件在查看期间要占用解压后大小的磁盘空间：
+临时文件放在压缩文件所在的目录（不可写时放在系统临时目录），关闭标签时
+删除；程序异常退出时会留下以 .texteditor- 开头的隐藏文件。打开前由界面
+提示解压后的大小和剩余空间，由用户确认。
+"""
+import bz2
+import gzip
+import lzma
+import os
+import shutil
+import tempfile
+import zlib
+
+from PyQt5.QtCore import QThread, pyqtSignal
+
+try:
+    from compression import zstd  # Python 3.14 起的标准库
+except ImportError:
+    zstd = None
+
+# 识别格式需要读取的文件头字节数
+HEADER_SIZE = 16
+# 解压时每次读取的字节数
+CHUNK_SIZE = 4 * 1024 * 1024
+# 无法从文件中得知解压后的大小时，按该压缩率估计（文本日志通常能压缩到十分之一左右）
+ESTIMATED_RATIO = 10
+# 扩展名 -> (格式, 默认压缩级别)，用于另存为压缩文件
+EXTENSIONS = {
+    '.gz': ('gzip', 6),
+    '.bz2': ('bzip2', 9),
+    '.xz': ('xz', 6),
+}
+if zstd is not None:
+    EXTENSIONS['.zst'] = ('zstd', 3)
+
+# 解压损坏或被截断的文件时可能抛出的异常
+ERRORS = (OSError, EOFError, zlib.error, lzma.LZMAError)
+if zstd is not None:
+    ERRORS += (zstd.ZstdError,)
+
+
+class Compression:
+    """压缩格式和压缩级别，读取时从文件头推断，保存时沿用"""
+    def __init__(self, name, level, check=lzma.CHECK_CRC64):
+        self.name = name      # 'gzip'、'bzip2'、'xz' 或 'zstd'
+        self.level = level
+        self.check = check    # xz 的校验类型
+
+    def reader(self, f):
+        """在二进制文件对象 f 上逐块解压的只读文件对象"""
+        if self.name == 'gzip':
+            return gzip.GzipFile(fileobj=f, mode='rb')
+        if self.name == 'bzip2':
+            return bz2.BZ2File(f, 'rb')
+        if self.name == 'xz':
+            return lzma.LZMAFile(f, 'rb')
+        return zstd.ZstdFile(f, 'r')
+
+    def writer(self, f, filename=''):
+        """写入时压缩到 f 的文件对象；filename 为 gzip 头中记录的原文件名"""
+        if self.name == 'gzip':
+            return gzip.GzipFile(filename, 'wb', self.level, f)
+        if self.name == 'bzip2':
+            return bz2.BZ2File(f, 'wb', compresslevel=self.level)
+        if self.name == 'xz':
+            return lzma.LZMAFile(f, 'wb', check=self.check, preset=self.level)
+        return zstd.ZstdFile(f, 'w', level=self.level)
+
+    def __repr__(self):
+        return f'Compression({self.name!r}, {self.level})'
+
+
+def detect_header(header):
+    """根据文件头判断压缩格式，不是压缩文件时返回 None
+
+    gzip 头中的 XFL 只区分最快和最高压缩，其余按 6 处理；bzip2 头中直接记有
+    压缩级别；xz 头中记有校验类型，压缩级别无法得知，按默认的 6 处理。
+    """
+    if header[:3] == b'\x1f\x8b\x08' and len(header) >= 10:
+        level = {2: 9, 4: 1}.get(header[8], 6)
+        return Compression('gzip', level)
+    if header[:3] == b'BZh' and len(header) >= 4 and header[3:4] in b'123456789':
+        return Compression('bzip2', header[3] - ord('0'))
+    if header[:6] == b'\xfd7zXZ\x00' and len(header) >= 8:
+        return Compression('xz', 6, header[7] & 0x0f)
+    if header[:4] == b'\x28\xb5\x2f\xfd' and zstd is not None:
+        return Compression('zstd', 3)
+    return None
+
+
+def detect_file(path):
+    """判断文件的压缩格式，不是压缩文件或无法读取时返回 None"""
+    try:
+        with open(path, 'rb') as f:
+            return detect_header(f.read(HEADER_SIZE))
+    except OSError:
+        return None
+
+
+def for_extension(path):
+    """按扩展名选择另存为时使用的压缩格式，不是压缩文件的扩展名时返回 None"""
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in EXTENSIONS:
+        return None
+    name, level = EXTENSIONS[extension]
+    return Compression(name, level)
+
+
+def original_name(path):
+    """去掉压缩扩展名后的文件名，写入 gzip 头"""
+    name = os.path.basename(path)
+    root, extension = os.path.splitext(name)
+    return root if extension.lower() in EXTENSIONS else name
+
+
+def estimated_size(path):
+    """文件内容（解压后）的大致字节数，用于选择打开方式；不是压缩文件时即文件大小
+
+    单个成员、小于 4 GB 的 gzip 文件末尾记有准确的大小，其他格式按压缩率估计。
+    """
+    size = os.path.getsize(path)
+    compression = detect_file(path)
+    if compression is None:
+        return size
+    if compression.name == 'gzip' and size >= 18:
+        with open(path, 'rb') as f:
+            f.seek(-4, os.SEEK_END)
+            original = int.from_bytes(f.read(4), 'little')
+        if original >= size:
+            return original
+    return size * ESTIMATED_RATIO
+
+
+def temp_dir(path):
+    """解压 path 得到的临时文件所在的目录
+
+    放在压缩文件旁边，与它在同一个磁盘上，不会占满空间往往较小的系统临时
+    目录；所在目录不可写时使用系统临时目录。
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    return directory if os.access(directory, os.W_OK) else tempfile.gettempdir()
+
+
+def free_space(directory):
+    """directory 所在磁盘的剩余字节数，无法得知时返回 None"""
+    try:
+        return shutil.disk_usage(directory).free
+    except OSError:
+        return None
+
+
+def decompress(data):
+    """data 是压缩数据时返回解压后的字节，否则原样返回（整体读取的小文件使用）"""
+    compression = detect_header(data[:HEADER_SIZE])
+    if compression is None:
+        return data
+    if compression.name == 'gzip':
+        return gzip.decompress(data)
+    if compression.name == 'bzip2':
+        return bz2.decompress(data)
+    if compression.name == 'xz':
+        return lzma.decompress(data)
+    return zstd.decompress(data)
+
+
+class Decompressor(QThread):
+    """把压缩文件流式解压到临时文件（在 temp_dir 中），交给只读查看器映射"""
+    progressChanged = pyqtSignal(object, object)  # 已读取的压缩字节数，压缩文件大小
+    loadFinished = pyqtSignal(bool)               # 参数为是否被取消
+    loadFailed = pyqtSignal(str)
+
+    def __init__(self, path, compression, parent=None):
+        super().__init__(parent)
+        self.path = path
+        self.compression = compression
+        self.output = None  # 解压得到的临时文件，由使用者负责删除
+        self._cancelled = False
+
+    def cancel(self):
+        """请求停止解压"""
+        self._cancelled = True
+
+    def run(self):
+        output = None
+        try:
+            fd, output = tempfile.mkstemp(prefix='.texteditor-', suffix='-' + original_name(self.path),
+                                          dir=temp_dir(self.path))
+            with open(self.path, 'rb') as raw, os.fdopen(fd, 'wb') as out:
+                total = os.fstat(raw.fileno()).st_size
+                reader = self.compression.reader(raw)
+                while not self._cancelled:
+                    data = reader.read(CHUNK_SIZE)
+                    if not data:
+                        break
+                    out.write(data)
+                    self.progressChanged.emit(raw.tell(), total)
+        except ERRORS as e:
+            # 包括创建临时文件失败和解压途中磁盘已满
+            if output is not None:
+                os.remove(output)
+            self.loadFailed.emit(f'解压失败：{e}')
+            return
+        if self._cancelled:
+            os.remove(output)
+        else:
+            self.output = output
+        self.loadFinished.emit(self._cancelled)
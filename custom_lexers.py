@@ -0,0 +1,401 @@
+"""日志、JSON、CSV 的自定义词法分析器
+
+基于 QsciLexerCustom，只给视口附近的行着色：Scintilla 请求着色的范围中
+离视口较远的部分只标记为未着色（样式 0，一次 SCI_SETSTYLING 完成），
+滚动到这些行时再补上颜色。每行结束时的状态（例如 CSV 引号内的字段）
+压缩成一个整数存在 Scintilla 的行状态中（加 1 存放，0 表示该行尚未分析）。
+跳转到文档中间时，先往回找最近一个已分析且没有因修改而过时的行，从那里
+只计算状态、不着色地分析到视口，不需要从文件开头重新分析；往回最多找
+STATE_LOOKBACK_LINES 行，找不到时从那里按初始状态开始，因此跨越更多行的
+结构（例如很长的 CSV 引号字段）在跳转后可能着色不准，从上方滚动过来时
+是准确的。着色开销只与视口大小有关，与文档大小无关。
+
+样式 0 保留给未着色的文本，各词法分析器的样式从 1 开始。
+"""
+import re
+import sys
+import unicodedata
+
+from PyQt5.QtGui import QColor
+from PyQt5.Qsci import QsciLexerCustom, QsciScintilla
+
+# 视口上下额外着色的行数，滚动几行时不必立即补着色
+STYLE_MARGIN_LINES = 100
+# 在视口上方往回查找已知行状态的最多行数
+STATE_LOOKBACK_LINES = 200
+# 单行最多分析的字节数，超出部分按普通文本显示
+MAX_LEXED_LINE_BYTES = 16 * 1024
+# 未着色的文本
+UNSTYLED = 0
+STYLE_BYTES = [bytes([style]) for style in range(256)]
+
+
+class IncrementalLexer(QsciLexerCustom):
+    """只给视口附近着色的词法分析器基类
+
+    子类给出 LANGUAGE、STYLES（样式号 -> (名称, 颜色, 是否加粗)，包含 TEXT），
+    并实现 styleLine(data, state)：返回 ([(字节数, 样式), ...], 下一行开始时的
+    状态)。状态是非负整数，0 为文档开头的状态。
+    """
+    LANGUAGE = ''
+    TEXT = 1  # 普通文本，超长行超出分析上限的部分也用这个样式
+    STYLES = {TEXT: ('文本', '#000000', False)}
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.stale_line = sys.maxsize  # 此行及之后的行状态可能因修改而过时
+        self.requested_end = 0         # 上次 Scintilla 请求着色的结束位置
+        self.setDefaultColor(QColor('#000000'))
+        self.setDefaultPaper(QColor('#ffffff'))
+        for style, (_, color, _) in self.STYLES.items():
+            self.setColor(QColor(color), style)
+        if isinstance(parent, QsciScintilla):
+            parent.SCN_UPDATEUI.connect(self.handleUpdateUI)
+
+    def language(self):
+        return self.LANGUAGE
+
+    def description(self, style):
+        if style == UNSTYLED:
+            return '默认'
+        return self.STYLES[style][0] if style in self.STYLES else ''
+
+    def font(self, style):
+        font = super().font(style)
+        if style in self.STYLES and self.STYLES[style][2]:
+            font.setBold(True)
+        return font
+
+    def visibleLines(self):
+        """视口中第一行和最后一行的行号（自动换行时按文档行计算）"""
+        send = self.editor().SendScintilla
+        first = send(QsciScintilla.SCI_GETFIRSTVISIBLELINE)
+        count = send(QsciScintilla.SCI_LINESONSCREEN)
+        return (send(QsciScintilla.SCI_DOCLINEFROMVISIBLE, first),
+                send(QsciScintilla.SCI_DOCLINEFROMVISIBLE, first + count))
+
+    def styleText(self, start, end):
+        """Scintilla 请求给 start 到 end 着色：只分析视口附近的行，其余标记为未着色"""
+        editor = self.editor()
+        if editor is None:
+            return
+        send = editor.SendScintilla
+        first_visible, last_visible = self.visibleLines()
+        first = send(QsciScintilla.SCI_LINEFROMPOSITION, start)
+        last = send(QsciScintilla.SCI_LINEFROMPOSITION, end)
+        if start < self.requested_end:
+            # 已着色的位置被修改退回，这一行之后的行状态都可能过时
+            self.stale_line = min(self.stale_line, first)
+        self.requested_end = end
+        low = max(first, first_visible - STYLE_MARGIN_LINES)
+        high = min(last, last_visible + STYLE_MARGIN_LINES)
+        if low > high:
+            self.clearStyling(start, end)
+            return
+        low_pos = send(QsciScintilla.SCI_POSITIONFROMLINE, low)
+        if low_pos > start:
+            self.clearStyling(start, low_pos)
+        styled = self.styleLines(low, high)
+        if styled < end:
+            self.clearStyling(styled, end)
+
+    def clearStyling(self, start, end):
+        self.startStyling(start)
+        self.setStyling(end - start, UNSTYLED)
+
+    def knownState(self, line):
+        """line 行之前最近一个状态已知的位置：返回 (开始分析的行, 该行开始时的状态)
+
+        往回最多找 STATE_LOOKBACK_LINES 行，找不到时从那里按初始状态开始。
+        """
+        send = self.editor().SendScintilla
+        limit = max(0, line - STATE_LOOKBACK_LINES)
+        line = min(line, self.stale_line)
+        while line > limit:
+            state = send(QsciScintilla.SCI_GETLINESTATE, line - 1)
+            if state:
+                return line, state - 1
+            line -= 1
+        return max(line, limit), 0
+
+    def styleLines(self, first, last):
+        """分析并着色 first 到 last 行，返回着色结束的位置
+
+        从 first 之前最近的已知状态开始分析，first 之前的行只记录状态、不着色。
+        """
+        send = self.editor().SendScintilla
+        begin, state = self.knownState(first)
+        start = send(QsciScintilla.SCI_POSITIONFROMLINE, first)
+        end = send(QsciScintilla.SCI_POSITIONFROMLINE, last + 1)
+        if last + 1 >= send(QsciScintilla.SCI_GETLINECOUNT):
+            end = send(QsciScintilla.SCI_GETLENGTH)
+        data_start = send(QsciScintilla.SCI_POSITIONFROMLINE, begin)
+        data = self.editor().bytes(data_start, end).data()[:end - data_start]
+        # 整段的样式拼好后一次设置，每次 SCI_SETSTYLING 都会通知编辑器重新排版
+        styles = bytearray()
+        line = begin
+        for text in data.splitlines(keepends=True):
+            if len(text) > MAX_LEXED_LINE_BYTES:
+                tokens, state = self.styleLine(text[:MAX_LEXED_LINE_BYTES], state)
+                tokens.append((len(text) - MAX_LEXED_LINE_BYTES, self.TEXT))
+            else:
+                tokens, state = self.styleLine(text, state)
+            if line >= first:
+                for length, style in tokens:
+                    styles += STYLE_BYTES[style] * length
+            send(QsciScintilla.SCI_SETLINESTATE, line, state + 1)
+            line += 1
+        if begin <= self.stale_line:
+            # 从可信的状态连续分析到这里，这些行的状态都已更新
+            self.stale_line = max(self.stale_line, line)
+        self.startStyling(start)
+        send(QsciScintilla.SCI_SETSTYLINGEX, len(styles), bytes(styles))
+        return end
+
+    def handleUpdateUI(self, updated):
+        """滚动到此前只标记为未着色的行时补上颜色"""
+        editor = self.editor()
+        if editor is None:
+            return
+        send = editor.SendScintilla
+        end_styled = send(QsciScintilla.SCI_GETENDSTYLED)
+        first_visible, last_visible = self.visibleLines()
+        first = last = None
+        for line in range(first_visible, last_visible + 1):
+            pos = send(QsciScintilla.SCI_POSITIONFROMLINE, line)
+            if pos >= end_styled:
+                # 之后的部分由 Scintilla 请求着色
+                break
+            if (send(QsciScintilla.SCI_GETLINEENDPOSITION, line) > pos
+                    and send(QsciScintilla.SCI_GETSTYLEAT, pos) == UNSTYLED):
+                first = line if first is None else first
+                last = line
+        if first is None:
+            return
+        first = max(0, first - STYLE_MARGIN_LINES)
+        last = min(last + STYLE_MARGIN_LINES,
+                   send(QsciScintilla.SCI_LINEFROMPOSITION, end_styled))
+        self.styleLines(first, last)
+        # 补着色不改变 Scintilla 记录的已着色位置
+        send(QsciScintilla.SCI_STARTSTYLING, end_styled, 0)
+
+    def styleLine(self, data, state):
+        """分析一行（含换行符）：默认整行为普通文本，状态不变"""
+        return [(len(data), self.TEXT)], state
+
+
+class LogLexer(IncrementalLexer):
+    """日志：时间戳、日志级别、引号中的字符串
+
+    行状态为最近一条日志的级别，没有时间戳、以空白开头的续行（例如异常
+    堆栈）沿用这条日志的级别着色。
+    """
+    LANGUAGE = 'Log'
+    TEXT, TIMESTAMP, ERROR, WARNING, INFO, DEBUG, STRING, ERROR_DETAIL = range(1, 9)
+    STYLES = {
+        TEXT: ('文本', '#000000', False),
+        TIMESTAMP: ('时间戳', '#008080', False),
+        ERROR: ('错误', '#d00000', True),
+        WARNING: ('警告', '#c06000', True),
+        INFO: ('信息', '#0050c0', False),
+        DEBUG: ('调试', '#808080', False),
+        STRING: ('字符串', '#a03080', False),
+        ERROR_DETAIL: ('错误详情', '#b04040', False),
+    }
+    LEVELS = {
+        b'FATAL': ERROR, b'CRITICAL': ERROR, b'ERROR': ERROR, b'SEVERE': ERROR,
+        b'PANIC': ERROR, b'WARNING': WARNING, b'WARN': WARNING, b'INFO': INFO,
+        b'NOTICE': INFO, b'DEBUG': DEBUG, b'TRACE': DEBUG, b'VERBOSE': DEBUG,
+    }
+    PATTERN = re.compile(
+        rb'(?P<TIMESTAMP>\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}:\d{2}(?:[.,]\d+)?(?:Z|[+-]\d{2}:?\d{2})?'
+        rb'|(?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec) [ \d]\d \d{2}:\d{2}:\d{2}'
+        rb'|\b\d{2}:\d{2}:\d{2}(?:[.,]\d+)?\b)'
+        rb'|(?P<LEVEL>\b(?:' + b'|'.join(LEVELS) + rb')\b)'
+        rb'|(?P<STRING>"[^"\r\n]*")')
+
+    def styleLine(self, data, state):
+        continuation = data[:1] in (b' ', b'\t') or data.startswith(b'Traceback')
+        default = self.ERROR_DETAIL if continuation and state == self.ERROR else self.TEXT
+        level = None
+        tokens = []
+        pos = 0
+        for match in self.PATTERN.finditer(data):
+            tokens.append((match.start() - pos, default))
+            if match.lastgroup == 'LEVEL':
+                style = self.LEVELS[match.group()]
+                level = level or style
+            else:
+                style = getattr(self, match.lastgroup)
+            tokens.append((match.end() - match.start(), style))
+            pos = match.end()
+        tokens.append((len(data) - pos, default))
+        if level is None and continuation:
+            level = state
+        return tokens, level or 0
+
+
+class JsonLexer(IncrementalLexer):
+    """JSON（以及带注释的 JSONC）：属性名、字符串、数字、关键字、标点、注释
+
+    JSON 字符串不能跨行，行状态只记录是否在 /* */ 注释中。
+    """
+    LANGUAGE = 'JSON'
+    TEXT, KEY, STRING, NUMBER, KEYWORD, OPERATOR, COMMENT = range(1, 8)
+    STYLES = {
+        TEXT: ('文本', '#000000', False),
+        KEY: ('属性名', '#0050a0', False),
+        STRING: ('字符串', '#a31515', False),
+        NUMBER: ('数字', '#098658', False),
+        KEYWORD: ('关键字', '#0000ff', True),
+        OPERATOR: ('标点', '#505050', False),
+        COMMENT: ('注释', '#008000', False),
+    }
+    IN_COMMENT = 1
+    PATTERN = re.compile(
+        rb'(?P<COMMENT>//.*|/\*.*?(?:\*/|$))'
+        rb'|(?P<KEY>"(?:[^"\\\r\n]|\\.)*"(?=\s*:))'
+        rb'|(?P<STRING>"(?:[^"\\\r\n]|\\.)*"?)'
+        rb'|(?P<NUMBER>-?\d+(?:\.\d+)?(?:[eE][+-]?\d+)?)'
+        rb'|(?P<KEYWORD>\b(?:true|false|null)\b)'
+        rb'|(?P<OPERATOR>[{}\[\],:])')
+
+    def styleLine(self, data, state):
+        tokens = []
+        pos = 0
+        if state == self.IN_COMMENT:
+            end = data.find(b'*/')
+            if end == -1:
+                return [(len(data), self.COMMENT)], self.IN_COMMENT
+            pos = end + 2
+            tokens.append((pos, self.COMMENT))
+        state = 0
+        for match in self.PATTERN.finditer(data, pos):
+            tokens.append((match.start() - pos, self.TEXT))
+            tokens.append((match.end() - match.start(), getattr(self, match.lastgroup)))
+            pos = match.end()
+            if match.group().startswith(b'/*') and not match.group().endswith(b'*/'):
+                state = self.IN_COMMENT
+        tokens.append((len(data) - pos, self.TEXT))
+        return tokens, state
+
+
+class CsvLexer(IncrementalLexer):
+    """CSV/TSV：按列号循环使用一组颜色（彩虹列），分隔符单独着色
+
+    分隔符按第一行中逗号、制表符、分号、竖线的个数判断。引号中的字段可以
+    跨行，行状态记录是否在引号中以及该字段的列号。制表符分隔时按视口中
+    各列的最大宽度设置每行的制表位，使各列对齐；宽度只按视口附近的行计算。
+    """
+    LANGUAGE = 'CSV'
+    TEXT, DELIMITER = 1, 2
+    RAINBOW = ['#000000', '#c00000', '#0060c0', '#008000', '#a000a0',
+               '#b06000', '#008080', '#6040c0']
+    COLUMNS = range(3, 3 + len(RAINBOW))
+    STYLES = {
+        TEXT: ('文本', '#000000', False),
+        DELIMITER: ('分隔符', '#a0a0a0', True),
+    }
+    STYLES.update((style, (f'第 {i + 1} 类列', color, False))
+                  for i, (style, color) in enumerate(zip(COLUMNS, RAINBOW)))
+    DELIMITERS = b',\t;|'
+    # 对齐时列与列之间的空白（字符宽度的倍数）
+    ALIGN_PADDING = 2
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.delimiter = ord(',')
+        self.aligned = None  # 上次设置制表位时的 (行范围, 各列宽度, 字符宽度)
+        if isinstance(parent, QsciScintilla):
+            parent.SCN_ZOOM.connect(self.alignColumns)
+
+    def detectDelimiter(self, data):
+        counts = [(data.count(bytes([d])), d) for d in self.DELIMITERS]
+        count, delimiter = max(counts)
+        self.delimiter = delimiter if count else ord(',')
+
+    def styleLines(self, first, last):
+        if first == 0:
+            self.detectDelimiter(self.editor().bytes(
+                0, self.editor().SendScintilla(QsciScintilla.SCI_GETLINEENDPOSITION, 0)).data())
+        return super().styleLines(first, last)
+
+    def styleLine(self, data, state):
+        delimiter = self.delimiter
+        quote = ord('"')
+        in_quote = state & 1
+        column = state >> 1
+        tokens = []
+        start = pos = 0
+        size = len(data)
+        columns = self.COLUMNS
+        while pos < size:
+            if in_quote:
+                i = data.find(b'"', pos)
+                if i == -1:
+                    pos = size
+                elif data[i + 1:i + 2] == b'"':
+                    pos = i + 2
+                else:
+                    in_quote = 0
+                    pos = i + 1
+                continue
+            if pos == start and data[pos] == quote:
+                # 只有字段开头的引号表示引号字段
+                in_quote = 1
+                pos += 1
+                continue
+            d = data.find(delimiter, pos)
+            if d == -1:
+                break
+            tokens.append((d - start, columns[column % len(columns)]))
+            tokens.append((1, self.DELIMITER))
+            column += 1
+            start = pos = d + 1
+        tokens.append((size - start, columns[column % len(columns)]))
+        return tokens, (column << 1 | 1) if in_quote else 0
+
+    def handleUpdateUI(self, updated):
+        super().handleUpdateUI(updated)
+        if self.editor() is not None and updated & (QsciScintilla.SC_UPDATE_CONTENT
+                                                    | QsciScintilla.SC_UPDATE_V_SCROLL):
+            self.alignColumns()
+
+    def alignColumns(self):
+        """制表符分隔时按视口附近各列的最大宽度设置制表位"""
+        editor = self.editor()
+        if editor is None or self.delimiter != ord('\t'):
+            return
+        send = editor.SendScintilla
+        first, last = self.visibleLines()
+        last = min(last, send(QsciScintilla.SCI_GETLINECOUNT) - 1)
+        rows = [editor.text(line).rstrip('\r\n').split('\t') for line in range(first, last + 1)]
+        widths = []
+        for cells in rows:
+            for i, cell in enumerate(cells[:-1]):
+                width = _display_width(cell)
+                if i == len(widths):
+                    widths.append(width)
+                elif width > widths[i]:
+                    widths[i] = width
+        char_width = send(QsciScintilla.SCI_TEXTWIDTH, self.COLUMNS[0], b'0')
+        key = (first, last, widths, char_width)
+        if key == self.aligned:
+            return
+        self.aligned = key
+        stops = []
+        x = 0
+        for width in widths:
+            x += (width + self.ALIGN_PADDING) * char_width
+            stops.append(x)
+        for line in range(first, last + 1):
+            send(QsciScintilla.SCI_CLEARTABSTOPS, line)
+            for x in stops:
+                send(QsciScintilla.SCI_ADDTABSTOP, line, x)
+
+
+def _display_width(text):
+    """按等宽字体估计的显示宽度，全角字符占两格"""
+    if text.isascii():
+        return len(text)
+    return sum(2 if unicodedata.east_asian_width(c) in 'WF' else 1 for c in text)
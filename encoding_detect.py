@@ -0,0 +1,197 @@
+"""编码与换行符检测
+
+只看文件开头一段有限大小的样本来判断编码和换行符，文件其余部分由
+加载器在一次读取中用增量解码器顺带校验，不再整文件反复扫描和解码。
+"""
+import codecs
+
+# 用于判断编码的样本大小
+SAMPLE_SIZE = 64 * 1024
+
+# 显示名称 -> (Python 编解码器名称, BOM)
+ENCODINGS = {
+    'UTF-8': ('utf-8', b''),
+    'UTF-8 BOM': ('utf-8', codecs.BOM_UTF8),
+    'UTF-16 LE': ('utf-16-le', codecs.BOM_UTF16_LE),
+    'UTF-16 BE': ('utf-16-be', codecs.BOM_UTF16_BE),
+    'GBK': ('gbk', b''),
+    'GB18030': ('gb18030', b''),
+    'ISO-8859-1': ('latin-1', b''),
+    'Big5': ('big5', b''),
+    'Shift_JIS': ('shift_jis', b''),
+    'EUC-JP': ('euc_jp', b''),
+    'EUC-KR': ('euc_kr', b''),
+    'Windows-1252': ('cp1252', b''),
+    'Windows-1251': ('cp1251', b''),
+    'KOI8-R': ('koi8_r', b''),
+}
+
+# 样本中控制字符（不含常见的空白、退格和转义）超过该比例时视为二进制文件
+BINARY_CONTROL_RATIO = 0.1
+# 统计控制字符时删除的字节：可打印字符、高位字节和文本中常见的控制字符
+_NOT_CONTROL = bytes(b for b in range(256) if b >= 0x20 and b != 0x7f) + b'\t\n\r\f\v\x08\x1b'
+
+# 换行符显示名称 -> 换行符
+LINE_ENDINGS = {
+    'Windows (CRLF)': '\r\n',
+    'Unix (LF)': '\n',
+    'Mac (CR)': '\r',
+}
+DEFAULT_LINE_ENDING = 'Windows (CRLF)'
+
+# 解码失败时依次尝试的后备编码，后备编码的置信度记为 FALLBACK_CONFIDENCE
+FALLBACK_CONFIDENCE = 0.5
+FALLBACKS = {
+    'UTF-8': ['GBK', 'GB18030', 'ISO-8859-1'],
+    'GBK': ['GB18030', 'ISO-8859-1'],
+    'GB18030': ['ISO-8859-1'],
+    'UTF-16 LE': ['ISO-8859-1'],
+    'UTF-16 BE': ['ISO-8859-1'],
+}
+
+
+def codec_for(encoding):
+    """编码显示名称对应的 Python 编解码器名称"""
+    return ENCODINGS.get(encoding, (encoding, b''))[0]
+
+
+def bom_for(encoding):
+    """编码对应的 BOM，没有 BOM 时返回空字节串"""
+    return ENCODINGS.get(encoding, (encoding, b''))[1]
+
+
+def fallback_encodings(encoding):
+    """encoding 解码失败后依次尝试的编码"""
+    return FALLBACKS.get(encoding, [])
+
+
+class DetectionResult:
+    """检测结果"""
+    def __init__(self, encoding, confidence, line_ending, mixed_line_endings, counts,
+                 binary=False):
+        self.encoding = encoding          # 编码显示名称，见 ENCODINGS
+        self.confidence = confidence      # 0.0 - 1.0
+        self.line_ending = line_ending    # 换行符显示名称，见 LINE_ENDINGS
+        self.mixed_line_endings = mixed_line_endings
+        self.counts = counts              # (CRLF 数, LF 数, CR 数)
+        self.binary = binary              # 是否像二进制文件，见 looks_binary()
+
+    @property
+    def codec(self):
+        return codec_for(self.encoding)
+
+    @property
+    def bom(self):
+        return bom_for(self.encoding)
+
+    def __repr__(self):
+        return (f'DetectionResult({self.encoding!r}, {self.confidence:.2f}, '
+                f'{self.line_ending!r}, mixed={self.mixed_line_endings}, binary={self.binary})')
+
+
+def _decodes(sample, codec, complete):
+    """样本能否用 codec 解码；样本不完整时允许末尾的多字节字符被截断"""
+    try:
+        codecs.getincrementaldecoder(codec)().decode(sample, complete)
+        return True
+    except UnicodeDecodeError:
+        return False
+
+
+def _guess_utf16(sample):
+    """根据零字节的分布猜测无 BOM 的 UTF-16"""
+    if len(sample) < 4:
+        return None
+    even = sample[0::2]
+    odd = sample[1::2]
+    even_zeros = even.count(0) / len(even)
+    odd_zeros = odd.count(0) / len(odd)
+    if odd_zeros > 0.3 and even_zeros < 0.05:
+        return 'UTF-16 LE'
+    if even_zeros > 0.3 and odd_zeros < 0.05:
+        return 'UTF-16 BE'
+    return None
+
+
+def detect_encoding(sample, complete=False):
+    """判断样本的编码，返回 (编码显示名称, 置信度)
+
+    complete 为 True 表示样本就是整个文件。
+    """
+    if sample.startswith(codecs.BOM_UTF8):
+        return 'UTF-8 BOM', 1.0
+    if sample.startswith(codecs.BOM_UTF16_LE):
+        return 'UTF-16 LE', 1.0
+    if sample.startswith(codecs.BOM_UTF16_BE):
+        return 'UTF-16 BE', 1.0
+
+    utf16 = _guess_utf16(sample)
+    if utf16 and _decodes(sample, codec_for(utf16), complete):
+        return utf16, 0.8
+
+    if _decodes(sample, 'utf-8', complete):
+        # 纯 ASCII 与任何 ASCII 兼容编码都一致，置信度较低
+        return 'UTF-8', 0.99 if not sample.isascii() else 0.5
+
+    for encoding in ('GBK', 'GB18030'):
+        if _decodes(sample, codec_for(encoding), complete):
+            text = codecs.getincrementaldecoder(codec_for(encoding))(
+                errors='ignore').decode(sample)
+            non_ascii = [c for c in text if ord(c) > 0x7f]
+            cjk = sum(1 for c in non_ascii if '一' <= c <= '鿿')
+            ratio = cjk / len(non_ascii) if non_ascii else 0
+            return encoding, 0.5 + 0.45 * ratio
+
+    return 'ISO-8859-1', 0.2
+
+
+def looks_binary(sample, encoding):
+    """样本是否像二进制文件：含有零字节，或控制字符过多
+
+    UTF-16 文本本身含有大量零字节，不做判断。
+    """
+    if not sample or encoding.startswith('UTF-16'):
+        return False
+    if b'\0' in sample:
+        return True
+    controls = len(sample.translate(None, _NOT_CONTROL))
+    return controls > len(sample) * BINARY_CONTROL_RATIO
+
+
+def count_line_endings(text):
+    """统计文本中 CRLF、单独 LF、单独 CR 的个数"""
+    crlf = text.count('\r\n')
+    return crlf, text.count('\n') - crlf, text.count('\r') - crlf
+
+
+def line_separator(counts):
+    """按换行符统计选择切分行时使用的字符，用于估计行长
+
+    只有单独的 CR 时按 \r 切分，否则按 \n 切分（CRLF 行多算的一个 \r 不影响估计）。
+    """
+    crlf, lf, cr = counts
+    return '\r' if cr and not (crlf or lf) else '\n'
+
+
+def line_ending_from_counts(counts):
+    """根据统计结果返回 (主要换行符名称, 是否混合)"""
+    crlf, lf, cr = counts
+    if not (crlf or lf or cr):
+        return DEFAULT_LINE_ENDING, False
+    mixed = sum(1 for n in counts if n) > 1
+    # 数量相同时按 CRLF、LF、CR 的顺序优先
+    best = max(zip(counts, (0, -1, -2), LINE_ENDINGS))
+    return best[2], mixed
+
+
+def detect(sample, complete=False):
+    """检测样本的编码和换行符"""
+    sample = sample[:SAMPLE_SIZE] if not complete else sample
+    encoding, confidence = detect_encoding(sample, complete)
+    bom = bom_for(encoding)
+    text = codecs.getincrementaldecoder(codec_for(encoding))(errors='replace').decode(
+        sample[len(bom):], complete)
+    counts = count_line_endings(text.rstrip('\r') if not complete else text)
+    line_ending, mixed = line_ending_from_counts(counts)
+    return DetectionResult(encoding, confidence, line_ending, mixed, counts,
+                           looks_binary(sample[:SAMPLE_SIZE], encoding))
@@ -0,0 +1,172 @@
+"""跟随文件末尾（tail -f）
+
+监视正在被其他程序写入的文件（例如日志），只读取上次位置之后新追加的
+字节，用标签的编码增量解码后追加到编辑器末尾，不重新加载整个文件。
+文件变小或被替换（日志轮转）时从头重新读取。QFileSystemWatcher 在网络
+驱动器等位置可能收不到通知，因此同时定时检查文件大小。
+"""
+import codecs
+import os
+from contextlib import contextmanager
+
+from PyQt5.QtCore import QObject, QTimer, QFileSystemWatcher, pyqtSignal
+from PyQt5.Qsci import QsciScintilla
+
+import encoding_detect
+
+# 定时检查的间隔（毫秒），文件监视收不到通知时也能发现新内容
+POLL_INTERVAL = 1000
+# 收到修改通知后等待多久再读取（毫秒），合并频繁的小写入
+COALESCE_DELAY = 100
+# 每次最多读取的字节数，剩余部分在下一轮事件循环中继续读
+MAX_READ = 4 * 1024 * 1024
+
+
+class FileFollower(QObject):
+    """把文件新追加的内容追加到编辑器"""
+    appended = pyqtSignal(int)  # 本次追加的字符数
+    truncated = pyqtSignal()    # 文件被截断或替换，已从头重新读取
+
+    def __init__(self, editor, filepath, encoding, offset, parent=None):
+        super().__init__(parent)
+        self.editor = editor
+        self.filepath = filepath
+        self.encoding = encoding
+        self.offset = offset            # 已读取到的文件位置
+        self.auto_scroll = True
+        self.max_lines = 0              # 保留的最多行数，0 表示不限制
+        self.trimmed = False            # 是否已丢弃过开头的行（此时文档不再是完整文件）
+        self._decoder = self.newDecoder()
+        self._identity = self.fileIdentity()
+
+        self.watcher = QFileSystemWatcher(self)
+        self.watcher.fileChanged.connect(self.scheduleCheck)
+        self.watcher.directoryChanged.connect(self.scheduleCheck)
+        self._check_timer = QTimer(self)
+        self._check_timer.setSingleShot(True)
+        self._check_timer.setInterval(COALESCE_DELAY)
+        self._check_timer.timeout.connect(self.check)
+        self._poll_timer = QTimer(self)
+        self._poll_timer.setInterval(POLL_INTERVAL)
+        self._poll_timer.timeout.connect(self.check)
+
+    def newDecoder(self):
+        return codecs.getincrementaldecoder(
+            encoding_detect.codec_for(self.encoding))(errors='replace')
+
+    def fileIdentity(self):
+        """用于发现文件被替换（轮转）的标识"""
+        try:
+            st = os.stat(self.filepath)
+        except OSError:
+            return None
+        return (st.st_dev, st.st_ino)
+
+    def start(self):
+        self.watchPaths()
+        self._poll_timer.start()
+        self.check()
+
+    def stop(self):
+        self._poll_timer.stop()
+        self._check_timer.stop()
+        paths = self.watcher.files() + self.watcher.directories()
+        if paths:
+            self.watcher.removePaths(paths)
+
+    def watchPaths(self):
+        """监视文件和所在目录（文件被删除重建后要重新加入监视）"""
+        if os.path.exists(self.filepath) and self.filepath not in self.watcher.files():
+            self.watcher.addPath(self.filepath)
+        directory = os.path.dirname(self.filepath)
+        if directory and directory not in self.watcher.directories():
+            self.watcher.addPath(directory)
+
+    def scheduleCheck(self):
+        if not self._check_timer.isActive():
+            self._check_timer.start()
+
+    def check(self):
+        """检查文件是否有新内容、被截断或被替换"""
+        try:
+            size = os.path.getsize(self.filepath)
+        except OSError:
+            # 轮转过程中文件可能暂时不存在
+            return
+        identity = self.fileIdentity()
+        if identity != self._identity or size < self.offset:
+            self._identity = identity
+            self.restart()
+            self.watchPaths()
+            return
+        if size > self.offset:
+            self.readAppended()
+
+    @contextmanager
+    def writable(self):
+        """跟随期间编辑器是只读的，追加内容时临时允许修改"""
+        read_only = self.editor.isReadOnly()
+        self.editor.setReadOnly(False)
+        try:
+            yield
+        finally:
+            self.editor.setReadOnly(read_only)
+
+    def restart(self):
+        """文件被截断或替换，清空后从头读取"""
+        self.offset = 0
+        self.trimmed = False
+        self._decoder = self.newDecoder()
+        with self.writable():
+            self.editor.clearLoadedText()
+        self.truncated.emit()
+        self.readAppended()
+
+    def readAppended(self):
+        try:
+            with open(self.filepath, 'rb') as f:
+                f.seek(self.offset)
+                data = f.read(MAX_READ)
+        except OSError:
+            return
+        if not data:
+            return
+        if self.offset == 0:
+            bom = encoding_detect.bom_for(self.encoding)
+            if bom and data.startswith(bom):
+                data = data[len(bom):]
+                self.offset += len(bom)
+        self.offset += len(data)
+        text = self._decoder.decode(data)
+        if text:
+            # 换行符保持原样，分两次追加的 \r 和 \n 在 Scintilla 中仍是一个 CRLF
+            self.append(text)
+        if len(data) == MAX_READ:
+            # 还有未读内容，让界面先处理其他事件
+            self.scheduleCheck()
+
+    def append(self, text):
+        editor = self.editor
+        send = editor.SendScintilla
+        length = send(QsciScintilla.SCI_GETLENGTH)
+        # 只有光标在末尾时才自动滚动，用户正在往上翻看时不打扰
+        at_end = send(QsciScintilla.SCI_GETCURRENTPOS) == length
+        with self.writable():
+            editor.appendLoadedText(text)
+            if self.max_lines and editor.lines() > self.max_lines:
+                self.trimLines()
+        if self.auto_scroll and at_end:
+            send(QsciScintilla.SCI_DOCUMENTEND)
+        self.appended.emit(len(text))
+
+    def trimLines(self):
+        """删除开头多出的行，只保留最后 max_lines 行"""
+        editor = self.editor
+        send = editor.SendScintilla
+        end = send(QsciScintilla.SCI_POSITIONFROMLINE, editor.lines() - self.max_lines)
+        editor.appending_loaded_text = True
+        send(QsciScintilla.SCI_SETUNDOCOLLECTION, 0)
+        send(QsciScintilla.SCI_DELETERANGE, 0, end)
+        send(QsciScintilla.SCI_SETUNDOCOLLECTION, 1)
+        editor.appending_loaded_text = False
+        self.trimmed = True
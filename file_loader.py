@@ -0,0 +1,227 @@
+"""后台分块加载文件
+
+在工作线程中按固定大小分块读取并解码文件，每解码完一块就通过信号
+交给界面线程追加到编辑器，界面在加载大文件时不会卡住。压缩文件（见
+compressed_files）在同一个线程中边读边解压。
+"""
+import codecs
+import hashlib
+import os
+import threading
+
+from PyQt5.QtCore import QThread, pyqtSignal
+from PyQt5.QtWidgets import QWidget, QHBoxLayout, QLabel, QProgressBar, QPushButton
+
+import compressed_files
+import encoding_detect
+
+# 每次读取的字节数
+CHUNK_SIZE = 4 * 1024 * 1024
+# 已发出但界面尚未处理的块数上限，防止界面跟不上时内存无限增长
+MAX_PENDING_CHUNKS = 4
+
+
+def new_digest():
+    """文件内容摘要，用于判断磁盘上的文件是否真的被修改过"""
+    return hashlib.blake2b(digest_size=16)
+
+
+class DigestingFile:
+    """包装二进制文件对象，读写的字节同时计入摘要
+
+    压缩文件的摘要按磁盘上的（压缩后的）字节计算，与 change_watch 一致。
+    """
+    def __init__(self, f, digest):
+        self.f = f
+        self.digest = digest
+
+    def read(self, size=-1):
+        data = self.f.read(size)
+        self.digest.update(data)
+        return data
+
+    def write(self, data):
+        self.digest.update(data)
+        return self.f.write(data)
+
+    def flush(self):
+        self.f.flush()
+
+    def tell(self):
+        return self.f.tell()
+
+
+class FileLoader(QThread):
+    """在后台线程中分块读取、解码文件
+
+    编码和换行符由 encoding_detect 根据第一块的开头判断，其余内容在同一次
+    读取中用增量解码器校验；只有校验失败时才会换用后备编码从头重读。
+    给出 encoding（例如元数据缓存中记录的）时跳过检测，直接按它解码；
+    strict 为 True 时（用户指定的编码）不尝试后备编码。
+
+    文件看起来不是文本，或者所有候选编码都无法解码时发出 binaryDetected，
+    由界面改用十六进制查看器打开。
+    """
+    chunkLoaded = pyqtSignal(str)           # 解码后的文本块，换行符保持原样
+    progressChanged = pyqtSignal(int, int)  # 已读取字节数，总字节数
+    encodingDetected = pyqtSignal(str, float)  # 编码显示名称，置信度
+    lineEndingDetected = pyqtSignal(str, bool)  # 主要换行符，是否混合
+    restarted = pyqtSignal()                # 编码判断有误，从头重新加载
+    loadFinished = pyqtSignal(bool)         # 参数为是否被取消
+    loadFailed = pyqtSignal(str)
+    binaryDetected = pyqtSignal(str)        # 不能作为文本打开的原因
+
+    def __init__(self, filepath, parent=None, encoding=None, confidence=1.0, strict=False):
+        super().__init__(parent)
+        self.filepath = filepath
+        self.known_encoding = encoding
+        self.known_confidence = confidence
+        self.strict = strict
+        self.encoding = None
+        self.line_ending = None
+        self.longest_line = 0  # 最长行的字符数，供选择性能档位
+        self.bytes_read = 0    # 加载完成时读到的文件位置（跟随文件末尾时从这里继续）
+        self.digest = None     # 加载完成时文件内容的摘要（十六进制字符串）
+        self.compression = None  # 压缩文件的格式（compressed_files.Compression）
+        self._digest = None
+        self._cancelled = False
+        self._pending = threading.Semaphore(MAX_PENDING_CHUNKS)
+
+    def cancel(self):
+        """请求取消加载"""
+        self._cancelled = True
+        # 唤醒可能正在等待界面处理的工作线程
+        self._pending.release()
+
+    def chunkConsumed(self):
+        """界面线程处理完一个块后调用"""
+        self._pending.release()
+
+    def run(self):
+        try:
+            with open(self.filepath, 'rb') as raw:
+                self.compression = compressed_files.detect_header(raw.read(compressed_files.HEADER_SIZE))
+                f = self._open(raw)
+                first = f.read(CHUNK_SIZE)
+                if self.known_encoding:
+                    encoding, confidence = self.known_encoding, self.known_confidence
+                else:
+                    result = encoding_detect.detect(first, complete=len(first) < encoding_detect.SAMPLE_SIZE)
+                    if result.binary:
+                        self.binaryDetected.emit('文件不是文本文件')
+                        return
+                    encoding, confidence = result.encoding, result.confidence
+                    self.lineEndingDetected.emit(result.line_ending, result.mixed_line_endings)
+                candidates = [(encoding, confidence)]
+                if not self.strict:
+                    candidates += [(e, encoding_detect.FALLBACK_CONFIDENCE)
+                                   for e in encoding_detect.fallback_encodings(encoding)]
+                self.encodingDetected.emit(encoding, confidence)
+                for i, (encoding, confidence) in enumerate(candidates):
+                    if i > 0:
+                        self.restarted.emit()
+                        self.encodingDetected.emit(encoding, confidence)
+                        f = self._open(raw)
+                        first = f.read(CHUNK_SIZE)
+                    try:
+                        self._load(raw, f, first, encoding)
+                        break
+                    except UnicodeDecodeError:
+                        if self._cancelled:
+                            break
+                else:
+                    if self.strict:
+                        self.binaryDetected.emit(f'文件内容不是有效的 {encoding} 编码')
+                    else:
+                        self.binaryDetected.emit('无法识别文件编码')
+                    return
+        except compressed_files.ERRORS as e:
+            self.loadFailed.emit(f'解压失败：{e}' if self.compression else str(e))
+            return
+        self.loadFinished.emit(self._cancelled)
+
+    def _open(self, raw):
+        """从头读取文件，返回读取内容（压缩文件为解压后的内容）的文件对象"""
+        raw.seek(0)
+        self._digest = new_digest()
+        source = DigestingFile(raw, self._digest)
+        return self.compression.reader(source) if self.compression else source
+
+    def _load(self, raw, f, first, encoding):
+        """从已读出的第一块开始按给定编码分块加载，raw 为磁盘上的文件（用于进度）
+
+        换行符保持原样交给编辑器，同时统计各类换行符的数量，结束时报告主要
+        类型。遇到解码错误时抛出 UnicodeDecodeError。
+        """
+        self.encoding = encoding
+        decoder = codecs.getincrementaldecoder(encoding_detect.codec_for(encoding))()
+        bom = encoding_detect.bom_for(encoding)
+        if bom and first.startswith(bom):
+            first = first[len(bom):]
+        total = os.fstat(raw.fileno()).st_size
+        counts = [0, 0, 0]
+        longest = carry = 0  # carry 为跨块的未结束行已有的长度
+        held = ''  # 被分块截断、尚未确定是否属于 \r\n 的末尾 \r
+        read = 0
+        data = first
+        while not self._cancelled:
+            final = not data
+            text = held + decoder.decode(data, final)
+            held = ''
+            read = raw.tell()
+
+            if not final and text.endswith('\r'):
+                held = '\r'
+                text = text[:-1]
+            chunk_counts = encoding_detect.count_line_endings(text)
+            for i, n in enumerate(chunk_counts):
+                counts[i] += n
+            separator = encoding_detect.line_separator(chunk_counts)
+            last = text.rfind(separator)
+            if last == -1:
+                carry += len(text)
+            else:
+                first = text.find(separator)
+                longest = max(longest, carry + first,
+                              max(map(len, text[first + 1:last].split(separator))))
+                carry = len(text) - last - 1
+
+            if text:
+                self._pending.acquire()
+                if self._cancelled:
+                    break
+                self.chunkLoaded.emit(text)
+            self.progressChanged.emit(read, total)
+            if final:
+                self.bytes_read = read
+                self.digest = self._digest.hexdigest()
+                self.longest_line = max(longest, carry)
+                self.line_ending, mixed = encoding_detect.line_ending_from_counts(counts)
+                self.lineEndingDetected.emit(self.line_ending, mixed)
+                break
+            data = f.read(CHUNK_SIZE)
+
+
+class LoadProgressWidget(QWidget):
+    """状态栏中的进度条和取消按钮（加载、索引、保存共用）"""
+    def __init__(self, text, loader, parent=None):
+        super().__init__(parent)
+        layout = QHBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+
+        self.label = QLabel(text)
+        self.progressBar = QProgressBar()
+        self.progressBar.setRange(0, 100)
+        self.progressBar.setMaximumWidth(160)
+        self.cancelButton = QPushButton('取消')
+        self.cancelButton.clicked.connect(loader.cancel)
+
+        layout.addWidget(self.label)
+        layout.addWidget(self.progressBar)
+        layout.addWidget(self.cancelButton)
+
+        loader.progressChanged.connect(self.updateProgress)
+
+    def updateProgress(self, read, total):
+        """更新进度百分比"""
+        self.progressBar.setValue(read * 100 // total if total else 100)
@@ -0,0 +1,117 @@
+"""文件元数据缓存
+
+记录最近打开过的文件检测出的编码、换行符、语言、行数和最长行，以路径、
+大小和修改时间为键。文件没有变化时再次打开（包括恢复上次的会话）直接
+使用缓存的结果，跳过编码和换行符检测；打开前就能按行数选好性能档位，
+尚未加载的标签在状态栏中也能显示编码和换行符。
+"""
+import json
+import os
+
+from PyQt5.QtCore import QObject, QSettings, QTimer
+
+import settings_store
+
+# 最多记录的文件数，超出时丢弃最久未使用的
+MAX_ENTRIES = 1000
+# 最后一次修改后等待多久写入（毫秒）
+SAVE_DELAY = 2000
+CACHE_FILE = 'metadata.json'
+
+_cache = None
+
+
+def cache_path():
+    """缓存文件的路径，与设置文件放在一起"""
+    settings = QSettings(QSettings.IniFormat, QSettings.UserScope,
+                         settings_store.ORGANIZATION, 'metadata')
+    return os.path.join(os.path.dirname(settings.fileName()), CACHE_FILE)
+
+
+def get_cache():
+    """获取共享的元数据缓存"""
+    global _cache
+    if _cache is None:
+        _cache = MetadataCache(cache_path())
+    return _cache
+
+
+def flush():
+    """立即写入尚未保存的缓存"""
+    if _cache is not None:
+        _cache.flush()
+
+
+def _key(path):
+    return os.path.normcase(os.path.abspath(path))
+
+
+class MetadataCache(QObject):
+    """路径 -> 元数据，文件大小或修改时间变化后对应的记录失效"""
+    def __init__(self, path, parent=None):
+        super().__init__(parent)
+        self.path = path
+        self._entries = None  # 第一次使用时才读取
+        self._dirty = False
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(SAVE_DELAY)
+        self._timer.timeout.connect(self.flush)
+
+    def entries(self):
+        if self._entries is None:
+            try:
+                with open(self.path, encoding='utf-8') as f:
+                    self._entries = json.load(f)
+            except (OSError, ValueError):
+                self._entries = {}
+        return self._entries
+
+    def get(self, path):
+        """文件没有变化时返回缓存的元数据（字典），否则返回 None"""
+        entry = self.entries().get(_key(path))
+        if entry is None:
+            return None
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        if entry['size'] != st.st_size or entry['mtime_ns'] != st.st_mtime_ns:
+            return None
+        return dict(entry)
+
+    def put(self, path, **info):
+        """记录文件当前状态下的元数据"""
+        try:
+            st = os.stat(path)
+        except OSError:
+            return
+        entries = self.entries()
+        key = _key(path)
+        entries.pop(key, None)
+        entries[key] = dict(info, size=st.st_size, mtime_ns=st.st_mtime_ns)
+        if len(entries) > MAX_ENTRIES:
+            # 字典按写入顺序排列，最前面的是最久未使用的
+            for old in list(entries)[:len(entries) - MAX_ENTRIES]:
+                del entries[old]
+        self._dirty = True
+        self._timer.start()
+
+    def clear(self):
+        self._entries = {}
+        self._dirty = True
+        self._timer.start()
+
+    def flush(self):
+        self._timer.stop()
+        if not self._dirty:
+            return
+        self._dirty = False
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            temp = self.path + '.tmp'
+            with open(temp, 'w', encoding='utf-8') as f:
+                json.dump(self._entries, f, ensure_ascii=False)
+            os.replace(temp, self.path)
+        except OSError:
+            pass
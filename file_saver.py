@@ -0,0 +1,122 @@
+"""后台流式保存文件
+
+保存时先从 Scintilla 的内部缓冲区一次性复制出 UTF-8 字节快照（一次
+memcpy，不经过 Python 字符串），之后在工作线程中写入同目录下的临时文件，
+最后原子地替换目标文件。缓冲区中的换行符就是文件的换行符，保存时不再
+转换；文档编码为 UTF-8 时快照原样写入，其他编码分块解码后重新编码。
+压缩文件按原来的格式和压缩级别边写边压缩。
+"""
+import codecs
+import ctypes
+import os
+import shutil
+import tempfile
+
+from PyQt5.QtCore import QThread, pyqtSignal
+from PyQt5.Qsci import QsciScintilla
+
+import compressed_files
+import encoding_detect
+from file_loader import DigestingFile, new_digest
+
+# 每次处理的字节数
+CHUNK_SIZE = 4 * 1024 * 1024
+
+# 进程的 umask，新建文件按它设置权限（只能通过设置再恢复读取，在导入时读一次）
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+def snapshot_bytes(editor):
+    """复制编辑器当前内容的 UTF-8 字节"""
+    length = editor.SendScintilla(QsciScintilla.SCI_GETLENGTH)
+    if length == 0:
+        return b''
+    pointer = editor.SendScintilla(QsciScintilla.SCI_GETCHARACTERPOINTER)
+    return ctypes.string_at(pointer, length)
+
+
+class FileSaver(QThread):
+    """在后台线程中把文本快照写入文件"""
+    progressChanged = pyqtSignal(int, int)  # 已处理字节数，总字节数
+    saveFinished = pyqtSignal(str)          # 保存的文件路径
+    saveFailed = pyqtSignal(str)
+
+    def __init__(self, data, filepath, encoding, parent=None, compression=None):
+        super().__init__(parent)
+        self.data = data
+        self.filepath = filepath
+        self.encoding = encoding
+        self.compression = compression  # compressed_files.Compression，None 表示不压缩
+        self.digest = None  # 写入磁盘的内容的摘要
+
+    def cancel(self):
+        """保存一旦开始就不能取消，为了与加载器接口一致保留此方法"""
+
+    def run(self):
+        # 符号链接保存到它指向的文件，替换时不会把链接换成普通文件
+        target = os.path.realpath(self.filepath)
+        tmp_path = None
+        try:
+            fd, tmp_path = tempfile.mkstemp(prefix='.' + os.path.basename(target) + '.',
+                                            suffix='.tmp', dir=os.path.dirname(target))
+            with os.fdopen(fd, 'wb') as f:
+                digest = new_digest()
+                sink = DigestingFile(f, digest)
+                if self.compression is not None:
+                    name = compressed_files.original_name(self.filepath)
+                    with self.compression.writer(sink, name) as out:
+                        self._write(out)
+                else:
+                    self._write(sink)
+                self.digest = digest.hexdigest()
+                f.flush()
+                os.fsync(f.fileno())
+            if os.path.exists(target):
+                shutil.copymode(target, tmp_path)
+            else:
+                # mkstemp 创建的文件只有所有者可读写，新文件改用 umask 决定的默认权限
+                os.chmod(tmp_path, 0o666 & ~_UMASK)
+            os.replace(tmp_path, target)
+        except UnicodeEncodeError as e:
+            self._remove(tmp_path)
+            self.saveFailed.emit(f'当前编码 {self.encoding} 无法表示字符 {e.object[e.start:e.end]!r}')
+            return
+        except compressed_files.ERRORS as e:
+            # 包括目录不存在、没有写权限等 OSError
+            self._remove(tmp_path)
+            self.saveFailed.emit(str(e))
+            return
+        finally:
+            self.data = None
+        self.saveFinished.emit(self.filepath)
+
+    def _write(self, f):
+        """逐块把快照（需要时转换编码后）写入文件"""
+        codec = encoding_detect.codec_for(self.encoding)
+        write = f.write
+        write(encoding_detect.bom_for(self.encoding))
+
+        data = memoryview(self.data)
+        total = len(data)
+        if codecs.lookup(codec).name == 'utf-8':
+            for pos in range(0, total, CHUNK_SIZE):
+                write(data[pos:pos + CHUNK_SIZE])
+                self.progressChanged.emit(min(pos + CHUNK_SIZE, total), total)
+        else:
+            decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+            encoder = codecs.getincrementalencoder(codec)()
+            for pos in range(0, total, CHUNK_SIZE):
+                final = pos + CHUNK_SIZE >= total
+                write(encoder.encode(decoder.decode(data[pos:pos + CHUNK_SIZE], final), final))
+                self.progressChanged.emit(min(pos + CHUNK_SIZE, total), total)
+            write(encoder.encode('', True))
+
+    @staticmethod
+    def _remove(path):
+        if path is None:
+            return
+        try:
+            os.remove(path)
+        except OSError:
+            pass
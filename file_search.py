@@ -0,0 +1,146 @@
+"""在文件中查找（工作进程部分）
+
+这里的函数在进程池的工作进程中运行，不依赖 Qt。编码判断与编辑器加载
+文件时相同（encoding_detect），GBK、UTF-16 等编码的文件也能正确匹配；
+换行符按编辑器的方式统一处理，报告的行号与打开文件后看到的一致。
+"""
+import fnmatch
+import os
+import re
+
+import encoding_detect
+
+# 默认跳过的目录和文件
+DEFAULT_EXCLUDES = ('.git', '.svn', '.hg', 'node_modules', '__pycache__', '.venv', 'venv',
+                    '*.pyc', '*.exe', '*.dll', '*.so', '*.zip', '*.gz', '*.7z',
+                    '*.png', '*.jpg', '*.gif', '*.ico', '*.pdf')
+# 默认跳过超过该大小（MB）的文件
+DEFAULT_MAX_SIZE_MB = 20
+# 每个文件最多报告的匹配数
+MAX_MATCHES_PER_FILE = 1000
+# 结果中每行最多保留的字符数
+MAX_LINE_LENGTH = 300
+
+_NEWLINES = re.compile(r'\r\n|\r|\n')
+
+
+def parse_patterns(text):
+    """把 "*.py; *.txt" 这样的文本拆成模式列表"""
+    return [p.strip() for p in re.split(r'[;,]', text) if p.strip()]
+
+
+def matches_any(name, patterns):
+    return any(fnmatch.fnmatch(name, p) for p in patterns)
+
+
+def walk_files(root, includes, excludes, max_size):
+    """遍历 root 下需要搜索的文件，产生 (路径, 大小)
+
+    用 os.scandir 逐个目录迭代，不预先收集整个目录树，第一个结果可以
+    尽早送去搜索。无法访问的目录直接跳过。
+    """
+    stack = [root]
+    while stack:
+        directory = stack.pop()
+        try:
+            entries = list(os.scandir(directory))
+        except OSError:
+            continue
+        subdirs = []
+        for entry in entries:
+            if matches_any(entry.name, excludes):
+                continue
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(entry.path)
+                elif entry.is_file():
+                    if includes and not matches_any(entry.name, includes):
+                        continue
+                    size = entry.stat().st_size
+                    if size <= max_size:
+                        yield entry.path, size
+            except OSError:
+                continue
+        # 按名称顺序深度优先，结果顺序稳定
+        stack.extend(sorted(subdirs, reverse=True))
+
+
+def compile_pattern(pattern, regex, case_sensitive):
+    """编译查找内容，语法错误时抛出 re.error"""
+    if not regex:
+        pattern = re.escape(pattern)
+    flags = re.MULTILINE
+    if not case_sensitive:
+        flags |= re.IGNORECASE
+    return re.compile(pattern, flags)
+
+
+def decode(data):
+    """按编辑器加载文件的方式判断编码并解码，二进制文件返回 (None, None)"""
+    sample = data[:encoding_detect.SAMPLE_SIZE]
+    encoding, _ = encoding_detect.detect_encoding(sample, complete=len(data) <= len(sample))
+    if b'\0' in sample and not encoding.startswith('UTF-16'):
+        return None, None
+    for candidate in [encoding] + encoding_detect.fallback_encodings(encoding):
+        bom = encoding_detect.bom_for(candidate)
+        body = data[len(bom):] if bom and data.startswith(bom) else data
+        try:
+            return body.decode(encoding_detect.codec_for(candidate)), candidate
+        except UnicodeDecodeError:
+            continue
+    return None, None
+
+
+def search_text(text, regex):
+    """在文本中查找，返回 (匹配总数, [(行号, 列, 行内容), ...])，行号从 0 开始"""
+    if '\r' in text:
+        text = _NEWLINES.sub('\n', text)
+    if regex.search(text) is None:
+        return 0, []
+    results = []
+    total = 0
+    line = 0
+    counted_to = 0
+    for match in regex.finditer(text):
+        total += 1
+        if len(results) >= MAX_MATCHES_PER_FILE:
+            continue
+        start = match.start()
+        line += text.count('\n', counted_to, start)
+        counted_to = start
+        line_start = text.rfind('\n', 0, start) + 1
+        line_end = text.find('\n', start)
+        if line_end < 0:
+            line_end = len(text)
+        column = start - line_start
+        if line_end - line_start > MAX_LINE_LENGTH:
+            # 只保留匹配附近的内容
+            left = max(line_start, start - MAX_LINE_LENGTH // 3)
+            content = text[left:left + MAX_LINE_LENGTH]
+        else:
+            content = text[line_start:line_end]
+        results.append((line, column, content))
+    return total, results
+
+
+def search_files(paths, pattern, regex, case_sensitive):
+    """搜索一批文件（在工作进程中运行）
+
+    返回 (已搜索的文件数, [(路径, 编码, 匹配总数, 结果列表), ...])，
+    只包含有匹配的文件。
+    """
+    compiled = compile_pattern(pattern, regex, case_sensitive)
+    found = []
+    for path in paths:
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            continue
+        text, encoding = decode(data)
+        if text is None:
+            continue
+        total, results = search_text(text, compiled)
+        if total:
+            found.append((path, encoding, total, results))
+    return len(paths), found
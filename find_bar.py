@@ -0,0 +1,516 @@
+"""查找和替换
+
+查找直接使用 Scintilla 的目标搜索（SCI_SEARCHINTARGET），不把文档复制成
+Python 字符串。匹配计数和高亮由 MatchCounter 在事件循环中分批进行：每批
+只搜索一段按行对齐的范围并限定时间，200 MB 的文档用正则搜索也不会卡住
+界面，计数过程中随时可以取消。全部替换作为一个撤销步骤完成，替换期间
+暂停修改通知，结束后只通知一次。
+"""
+import re
+import time
+from array import array
+
+from PyQt5.QtCore import QObject, QTimer, Qt, pyqtSignal
+from PyQt5.QtGui import QColor, QKeySequence
+from PyQt5.QtWidgets import (QWidget, QHBoxLayout, QGridLayout, QLineEdit, QCheckBox,
+                             QPushButton, QToolButton, QLabel, QShortcut)
+from PyQt5.Qsci import QsciScintilla
+
+import perf_trace
+
+# 高亮所有匹配使用的指示器编号（容器指示器从 8 开始）
+MATCH_INDICATOR = 8
+# 每批最多搜索的字节数（向后对齐到行尾）和时间（秒）
+SLICE_BYTES = 1024 * 1024
+SLICE_SECONDS = 0.01
+# 最多高亮多少个匹配，超过后只计数
+MAX_HIGHLIGHTS = 100000
+# 文档修改后多久重新计数（毫秒）
+RECOUNT_DELAY = 300
+# Python re 支持、而查找使用的 ECMAScript 正则表达式（std::regex）不支持的 (? 写法，
+# 按 (? 之后的字符区分；ECMAScript 只有 (?:、(?=、(?!
+_UNSUPPORTED_GROUPS = {
+    '<': '后行断言 (?<=…)、(?<!…)',
+    'P': '命名组 (?P<…>)',
+    '#': '注释 (?#…)',
+    '(': '条件匹配 (?(…)…)',
+    '>': '原子组 (?>…)',
+}
+
+
+def search_flags(case_sensitive, whole_word, regex):
+    flags = 0
+    if case_sensitive:
+        flags |= QsciScintilla.SCFIND_MATCHCASE
+    if whole_word:
+        flags |= QsciScintilla.SCFIND_WHOLEWORD
+    if regex:
+        flags |= QsciScintilla.SCFIND_REGEXP | QsciScintilla.SCFIND_CXX11REGEX
+    return flags
+
+
+def validate_pattern(pattern):
+    """正则表达式语法错误时返回说明，正确时返回 None
+
+    Scintilla 对无效表达式只返回"未找到"，无法用它检查。大部分语法 Python re
+    和 ECMAScript 相同，先用 re 检查，再拒绝只有 re 支持的写法，否则这些
+    表达式能通过检查但什么也找不到。
+    """
+    try:
+        re.compile(pattern)
+    except re.error as e:
+        return str(e)
+    return _ecmascript_error(pattern)
+
+
+def _ecmascript_error(pattern):
+    """re 能编译的 pattern 中有 ECMAScript 不支持的写法时返回说明"""
+    size = len(pattern)
+    in_class = False
+    i = 0
+    while i < size:
+        ch = pattern[i]
+        if ch == '\\':
+            if not in_class and pattern[i + 1:i + 2] in ('A', 'Z'):
+                return f'不支持 \\{pattern[i + 1]}（查找使用 ECMAScript 正则表达式）'
+            i += 2
+            continue
+        if in_class:
+            in_class = ch != ']'
+        elif ch == '[':
+            # 与 re 一样，紧跟在 [ 或 [^ 之后的 ] 是普通字符
+            i += 1
+            if pattern[i:i + 1] == '^':
+                i += 1
+            if pattern[i:i + 1] == ']':
+                i += 1
+            in_class = True
+            continue
+        elif ch == '(' and pattern[i + 1:i + 2] == '?':
+            kind = pattern[i + 2:i + 3]
+            if kind not in (':', '=', '!'):
+                what = _UNSUPPORTED_GROUPS.get(kind, '内联标志 (?i) 等')
+                return f'不支持{what}（查找使用 ECMAScript 正则表达式）'
+            i += 3
+            continue
+        elif ch in '*+?}' and pattern[i + 1:i + 2] == '+':
+            return '不支持占有量词 *+、++ 等（查找使用 ECMAScript 正则表达式）'
+        i += 1
+    return None
+
+
+def search_range(editor, needle, flags, start, end):
+    """在 [start, end) 中搜索 needle（UTF-8 字节），返回匹配的 (开始, 结束) 或 None
+
+    end 小于 start 时向后搜索。
+    """
+    send = editor.SendScintilla
+    send(QsciScintilla.SCI_SETSEARCHFLAGS, flags)
+    send(QsciScintilla.SCI_SETTARGETSTART, start)
+    send(QsciScintilla.SCI_SETTARGETEND, end)
+    if send(QsciScintilla.SCI_SEARCHINTARGET, len(needle), needle) < 0:
+        return None
+    return send(QsciScintilla.SCI_GETTARGETSTART), send(QsciScintilla.SCI_GETTARGETEND)
+
+
+def setup_indicator(editor):
+    send = editor.SendScintilla
+    send(QsciScintilla.SCI_INDICSETSTYLE, MATCH_INDICATOR, QsciScintilla.INDIC_ROUNDBOX)
+    send(QsciScintilla.SCI_INDICSETFORE, MATCH_INDICATOR, QColor('#f0c000'))
+    send(QsciScintilla.SCI_INDICSETALPHA, MATCH_INDICATOR, 100)
+    send(QsciScintilla.SCI_INDICSETUNDER, MATCH_INDICATOR, True)
+
+
+def clear_highlights(editor):
+    send = editor.SendScintilla
+    send(QsciScintilla.SCI_SETINDICATORCURRENT, MATCH_INDICATOR)
+    send(QsciScintilla.SCI_INDICATORCLEARRANGE, 0, send(QsciScintilla.SCI_GETLENGTH))
+
+
+class MatchCounter(QObject):
+    """分批统计并高亮所有匹配"""
+    progressChanged = pyqtSignal(int, bool)  # 已找到的匹配数，是否已完成
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.editor = None
+        self.starts = array('Q')  # 按位置排列的匹配开始位置
+        self.running = False
+        self.finished = False
+        self._timer = QTimer(self)
+        self._timer.setInterval(0)
+        self._timer.timeout.connect(self.scanSlice)
+
+    def start(self, editor, needle, flags):
+        """从头开始计数"""
+        self.cancel()
+        if self.editor is not None and self.editor is not editor:
+            clear_highlights(self.editor)
+        self.editor = editor
+        self.needle = needle
+        self.flags = flags
+        self.starts = array('Q')
+        self.position = 0
+        self.finished = False
+        setup_indicator(editor)
+        clear_highlights(editor)
+        self.running = True
+        self._timer.start()
+
+    def cancel(self):
+        """停止计数，已找到的匹配和高亮保留"""
+        self._timer.stop()
+        self.running = False
+
+    def clear(self):
+        """停止计数并清除高亮"""
+        self.cancel()
+        if self.editor is not None:
+            clear_highlights(self.editor)
+        self.editor = None
+        self.starts = array('Q')
+        self.finished = False
+
+    def scanSlice(self):
+        editor = self.editor
+        send = editor.SendScintilla
+        length = send(QsciScintilla.SCI_GETLENGTH)
+        deadline = time.perf_counter() + SLICE_SECONDS
+        send(QsciScintilla.SCI_SETINDICATORCURRENT, MATCH_INDICATOR)
+        with perf_trace.span('find.slice'):
+            while self.position < length and time.perf_counter() < deadline:
+                # 搜索范围对齐到行尾，Scintilla 的正则不会跨行匹配
+                line = send(QsciScintilla.SCI_LINEFROMPOSITION,
+                            min(self.position + SLICE_BYTES, length))
+                end = send(QsciScintilla.SCI_GETLINEENDPOSITION, line)
+                if end <= self.position:
+                    end = length
+                while self.position < end and time.perf_counter() < deadline:
+                    match = search_range(editor, self.needle, self.flags, self.position, end)
+                    if match is None:
+                        self.position = end
+                        break
+                    start, match_end = match
+                    self.starts.append(start)
+                    if len(self.starts) <= MAX_HIGHLIGHTS and match_end > start:
+                        send(QsciScintilla.SCI_INDICATORFILLRANGE, start, match_end - start)
+                    if match_end > start:
+                        self.position = match_end
+                    else:
+                        # 空匹配，向前移动一个字符以免原地重复
+                        self.position = send(QsciScintilla.SCI_POSITIONAFTER, match_end)
+                        if self.position <= match_end:
+                            self.position = length
+        if self.position >= length:
+            self._timer.stop()
+            self.running = False
+            self.finished = True
+        self.progressChanged.emit(len(self.starts), self.finished)
+
+    def indexOf(self, position):
+        """位置 position 处的匹配是第几个（从 1 开始），不是已知匹配时返回 0"""
+        lo, hi = 0, len(self.starts)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.starts[mid] < position:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < len(self.starts) and self.starts[lo] == position:
+            return lo + 1
+        return 0
+
+
+class FindBar(QWidget):
+    """编辑区下方的查找/替换栏"""
+    def __init__(self, window, parent=None):
+        super().__init__(parent)
+        self.window = window
+        self.editor = None
+        self.counter = MatchCounter(self)
+        self.counter.progressChanged.connect(self.updateCount)
+        self.recount_timer = QTimer(self)
+        self.recount_timer.setSingleShot(True)
+        self.recount_timer.setInterval(RECOUNT_DELAY)
+        self.recount_timer.timeout.connect(self.restartCount)
+
+        layout = QGridLayout(self)
+        layout.setContentsMargins(4, 2, 4, 2)
+        self.findEdit = QLineEdit(self)
+        self.findEdit.setPlaceholderText('查找')
+        self.findEdit.textChanged.connect(self.restartCount)
+        self.findEdit.returnPressed.connect(self.findNext)
+        self.replaceEdit = QLineEdit(self)
+        self.replaceEdit.setPlaceholderText('替换为')
+        self.replaceEdit.returnPressed.connect(self.replaceCurrent)
+
+        self.caseBox = QCheckBox('区分大小写', self)
+        self.wordBox = QCheckBox('全字匹配', self)
+        self.regexBox = QCheckBox('正则表达式', self)
+        for box in (self.caseBox, self.wordBox, self.regexBox):
+            box.toggled.connect(self.restartCount)
+
+        prevButton = QPushButton('上一个', self)
+        prevButton.clicked.connect(self.findPrevious)
+        nextButton = QPushButton('下一个', self)
+        nextButton.clicked.connect(self.findNext)
+        self.replaceButton = QPushButton('替换', self)
+        self.replaceButton.clicked.connect(self.replaceCurrent)
+        self.replaceAllButton = QPushButton('全部替换', self)
+        self.replaceAllButton.clicked.connect(self.replaceAll)
+
+        self.countLabel = QLabel(self)
+        self.stopButton = QToolButton(self)
+        self.stopButton.setText('停止')
+        self.stopButton.setAutoRaise(True)
+        self.stopButton.clicked.connect(self.stopCount)
+        self.stopButton.hide()
+        closeButton = QToolButton(self)
+        closeButton.setText('×')
+        closeButton.setAutoRaise(True)
+        closeButton.clicked.connect(self.closeBar)
+
+        options = QHBoxLayout()
+        options.addWidget(self.caseBox)
+        options.addWidget(self.wordBox)
+        options.addWidget(self.regexBox)
+        options.addStretch(1)
+        options.addWidget(self.countLabel)
+        options.addWidget(self.stopButton)
+
+        layout.addWidget(self.findEdit, 0, 0)
+        layout.addWidget(prevButton, 0, 1)
+        layout.addWidget(nextButton, 0, 2)
+        layout.addLayout(options, 0, 3)
+        layout.addWidget(closeButton, 0, 4)
+        layout.addWidget(self.replaceEdit, 1, 0)
+        layout.addWidget(self.replaceButton, 1, 1)
+        layout.addWidget(self.replaceAllButton, 1, 2)
+        layout.setColumnStretch(0, 1)
+
+        shortcut = QShortcut(QKeySequence(Qt.Key_Escape), self)
+        shortcut.setContext(Qt.WidgetWithChildrenShortcut)
+        shortcut.activated.connect(self.closeBar)
+        self.hide()
+
+    def showBar(self, replace=False):
+        """显示查找栏（replace 为 True 时同时显示替换行），选中的文本作为查找内容"""
+        editor = self.window.currentEditor()
+        if not self.isSearchable(editor):
+            self.window.statusBar.showMessage('当前标签不支持查找', 2000)
+            return
+        selected = editor.selectedText()
+        if selected and '\n' not in selected and '\r' not in selected:
+            self.findEdit.blockSignals(True)
+            self.findEdit.setText(selected)
+            self.findEdit.blockSignals(False)
+        for widget in (self.replaceEdit, self.replaceButton, self.replaceAllButton):
+            widget.setVisible(replace)
+        self.show()
+        self.setEditor(editor)
+        self.findEdit.setFocus()
+        self.findEdit.selectAll()
+
+    def closeBar(self):
+        self.setEditor(None)
+        self.hide()
+        editor = self.window.currentEditor()
+        if editor is not None:
+            editor.setFocus()
+
+    def isSearchable(self, editor):
+        return isinstance(editor, QsciScintilla)
+
+    def setEditor(self, editor):
+        """切换到另一个编辑器（切换标签时调用），重新计数"""
+        if editor is not None and not self.isSearchable(editor):
+            editor = None
+        if editor is self.editor:
+            self.restartCount()
+            return
+        try:
+            if self.editor is not None:
+                self.editor.textChanged.disconnect(self.handleTextChanged)
+            self.counter.clear()
+        except RuntimeError:
+            # 原编辑器已被销毁
+            self.counter.editor = None
+            self.counter.clear()
+        self.editor = editor
+        if editor is not None:
+            editor.textChanged.connect(self.handleTextChanged)
+            self.restartCount()
+        else:
+            self.countLabel.clear()
+
+    def handleTextChanged(self):
+        """文档修改后已有的计数失效，稍后重新计数"""
+        if self.counter.running or self.counter.finished:
+            self.counter.cancel()
+            self.counter.finished = False
+        self.recount_timer.start()
+
+    def needle(self):
+        return self.findEdit.text().encode('utf-8')
+
+    def flags(self):
+        return search_flags(self.caseBox.isChecked(), self.wordBox.isChecked(),
+                            self.regexBox.isChecked())
+
+    def patternError(self):
+        if self.regexBox.isChecked():
+            return validate_pattern(self.findEdit.text())
+        return None
+
+    def restartCount(self):
+        self.recount_timer.stop()
+        if self.editor is None or not self.isVisible():
+            return
+        if not self.findEdit.text():
+            self.counter.clear()
+            self.countLabel.clear()
+            self.stopButton.hide()
+            return
+        error = self.patternError()
+        if error:
+            self.counter.clear()
+            self.countLabel.setText(f'正则表达式无效：{error}')
+            self.stopButton.hide()
+            return
+        self.counter.start(self.editor, self.needle(), self.flags())
+        self.stopButton.show()
+        self.updateCount(0, False)
+
+    def stopCount(self):
+        self.counter.cancel()
+        self.updateCount(len(self.counter.starts), False)
+
+    def updateCount(self, count, finished):
+        """显示 "第 N 个，共 M 个"，计数未完成时 M 后面加上 "+" """
+        if finished or not self.counter.running:
+            self.stopButton.hide()
+        total = f'{count}' if finished else f'{count}+'
+        current = 0
+        if self.editor is not None and self.editor.hasSelectedText():
+            current = self.counter.indexOf(
+                self.editor.SendScintilla(QsciScintilla.SCI_GETSELECTIONSTART))
+        if count == 0 and finished:
+            self.countLabel.setText('无匹配')
+        elif current:
+            self.countLabel.setText(f'第 {current} 个，共 {total} 个')
+        else:
+            self.countLabel.setText(f'共 {total} 个')
+
+    def find(self, forward=True):
+        """从光标处向前或向后查找，到达文档末尾时回绕"""
+        editor = self.editor
+        if editor is None or not self.findEdit.text() or self.patternError():
+            return False
+        send = editor.SendScintilla
+        needle, flags = self.needle(), self.flags()
+        length = send(QsciScintilla.SCI_GETLENGTH)
+        if forward:
+            start = send(QsciScintilla.SCI_GETSELECTIONEND)
+            match = (search_range(editor, needle, flags, start, length)
+                     or search_range(editor, needle, flags, 0, start))
+        else:
+            start = send(QsciScintilla.SCI_GETSELECTIONSTART)
+            match = (search_range(editor, needle, flags, start, 0)
+                     or search_range(editor, needle, flags, length, start))
+        if match is None:
+            self.window.statusBar.showMessage(f'找不到 "{self.findEdit.text()}"', 2000)
+            return False
+        send(QsciScintilla.SCI_ENSUREVISIBLEENFORCEPOLICY,
+             send(QsciScintilla.SCI_LINEFROMPOSITION, match[0]))
+        send(QsciScintilla.SCI_SETSEL, match[0], match[1])
+        self.updateCount(len(self.counter.starts), self.counter.finished)
+        return True
+
+    def findNext(self):
+        if not self.isVisible():
+            self.showBar()
+        self.find(forward=True)
+
+    def findPrevious(self):
+        if not self.isVisible():
+            self.showBar()
+        self.find(forward=False)
+
+    def selectionMatches(self):
+        """当前选中的内容是否正好是一个匹配"""
+        send = self.editor.SendScintilla
+        start = send(QsciScintilla.SCI_GETSELECTIONSTART)
+        end = send(QsciScintilla.SCI_GETSELECTIONEND)
+        match = search_range(self.editor, self.needle(), self.flags(), start, end)
+        return match == (start, end)
+
+    def replaceTarget(self, text):
+        """替换当前目标范围，返回替换后的长度；正则模式下支持 \\1 等反向引用"""
+        message = (QsciScintilla.SCI_REPLACETARGETRE if self.regexBox.isChecked()
+                   else QsciScintilla.SCI_REPLACETARGET)
+        return self.editor.SendScintilla(message, len(text), text)
+
+    def replaceCurrent(self):
+        """替换当前选中的匹配并查找下一个"""
+        editor = self.editor
+        if editor is None or editor.isReadOnly() or not self.findEdit.text():
+            return
+        if editor.hasSelectedText() and self.selectionMatches():
+            # selectionMatches 已把目标范围设为当前选择
+            replaced = self.replaceTarget(self.replaceEdit.text().encode('utf-8'))
+            start = editor.SendScintilla(QsciScintilla.SCI_GETTARGETSTART)
+            editor.SendScintilla(QsciScintilla.SCI_SETSEL, start + replaced, start + replaced)
+        self.find(forward=True)
+
+    def replaceAll(self):
+        """全部替换，作为一个撤销步骤"""
+        editor = self.editor
+        if editor is None or editor.isReadOnly() or not self.findEdit.text():
+            return
+        if self.patternError():
+            return
+        self.counter.cancel()
+        send = editor.SendScintilla
+        needle, flags = self.needle(), self.flags()
+        replacement = self.replaceEdit.text().encode('utf-8')
+        count = 0
+        with perf_trace.span('find.replaceAll'):
+            # 替换期间不发送修改通知，结束后统一通知一次（保存点通知不受影响，
+            # 修改标记照常更新）
+            mask = send(QsciScintilla.SCI_GETMODEVENTMASK)
+            send(QsciScintilla.SCI_SETMODEVENTMASK, 0)
+            # 自动换行时每处替换都会重新排版，替换完成后再统一换行
+            wrap = send(QsciScintilla.SCI_GETWRAPMODE)
+            send(QsciScintilla.SCI_SETWRAPMODE, QsciScintilla.SC_WRAP_NONE)
+            send(QsciScintilla.SCI_BEGINUNDOACTION)
+            try:
+                position = 0
+                while True:
+                    match = search_range(editor, needle, flags, position,
+                                         send(QsciScintilla.SCI_GETLENGTH))
+                    if match is None:
+                        break
+                    start, end = match
+                    replaced = self.replaceTarget(replacement)
+                    count += 1
+                    position = start + replaced
+                    if end == start:
+                        # 空匹配后跳过一个字符
+                        after = send(QsciScintilla.SCI_POSITIONAFTER, position)
+                        if after <= position:
+                            break
+                        position = after
+            finally:
+                send(QsciScintilla.SCI_ENDUNDOACTION)
+                send(QsciScintilla.SCI_SETWRAPMODE, wrap)
+                send(QsciScintilla.SCI_SETMODEVENTMASK, mask)
+        if count:
+            editor.textChanged.emit()
+            # 替换期间没有修改通知，热退出日志需要改写快照
+            journal = getattr(editor, 'journal', None)
+            if journal is not None:
+                journal.resync()
+            if getattr(editor, 'symbols', None) is not None:
+                editor.symbols.resync()
+        self.window.statusBar.showMessage(f'已替换 {count} 处', 3000)
+        self.restartCount()
@@ -0,0 +1,322 @@
+"""在文件中查找（界面部分）
+
+FileSearch 在后台线程中遍历目录，把文件分批交给进程池（file_search 中的
+工作函数）并行搜索，结果按批通过信号送回界面。FindInFilesPanel 是停靠
+面板，结果陆续加入树中，双击结果在编辑器中打开文件并跳到匹配的行。
+"""
+import concurrent.futures
+import multiprocessing
+import os
+import re
+import time
+
+from PyQt5.QtCore import QThread, Qt, pyqtSignal
+from PyQt5.QtWidgets import (QDockWidget, QWidget, QVBoxLayout, QHBoxLayout, QFormLayout,
+                             QLineEdit, QPushButton, QToolButton, QCheckBox, QSpinBox,
+                             QLabel, QTreeWidget, QTreeWidgetItem, QFileDialog)
+
+import file_search
+import settings_store
+
+# 每个任务包含的文件数和字节数上限，文件很多时减少进程间通信的次数
+BATCH_FILES = 64
+BATCH_BYTES = 8 * 1024 * 1024
+# 同时提交给进程池的任务数上限，遍历目录的速度不会把任务队列撑得过大
+MAX_IN_FLIGHT_PER_WORKER = 4
+# 结果送回界面的最短间隔（秒）
+EMIT_INTERVAL = 0.1
+# 树中最多显示的匹配行数，超出的只计数
+MAX_SHOWN_LINES = 20000
+
+_pool = None
+_pool_workers = 0
+
+
+def get_pool():
+    """共用的进程池，第一次查找时创建
+
+    使用 spawn 方式创建工作进程，不复制界面进程（及其线程）的状态。
+    """
+    global _pool, _pool_workers
+    if _pool is None:
+        _pool_workers = min(8, os.cpu_count() or 1)
+        _pool = concurrent.futures.ProcessPoolExecutor(
+            max_workers=_pool_workers, mp_context=multiprocessing.get_context('spawn'))
+    return _pool
+
+
+def shutdown_pool():
+    """退出时关闭进程池"""
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+class FileSearch(QThread):
+    """在后台遍历目录并用进程池并行搜索"""
+    resultsFound = pyqtSignal(list)         # [(路径, 编码, 匹配总数, [(行, 列, 内容), ...]), ...]
+    progressChanged = pyqtSignal(int, int)  # 已搜索的文件数，有匹配的文件数
+    searchFinished = pyqtSignal(bool)       # 参数为是否被取消
+    searchFailed = pyqtSignal(str)
+
+    def __init__(self, root, pattern, regex=False, case_sensitive=False, includes=(),
+                 excludes=file_search.DEFAULT_EXCLUDES,
+                 max_size=file_search.DEFAULT_MAX_SIZE_MB * 1024 * 1024, parent=None):
+        super().__init__(parent)
+        self.root = root
+        self.pattern = pattern
+        self.regex = regex
+        self.case_sensitive = case_sensitive
+        self.includes = list(includes)
+        self.excludes = list(excludes)
+        self.max_size = max_size
+        self.searched = 0
+        self.matched_files = 0
+        self._cancelled = False
+
+    def cancel(self):
+        """请求取消；已经在工作进程中运行的批次会跑完，但结果被丢弃"""
+        self._cancelled = True
+
+    def run(self):
+        try:
+            pool = get_pool()
+            self._pending = set()
+            self._found = []
+            self._last_emit = time.monotonic()
+            limit = _pool_workers * MAX_IN_FLIGHT_PER_WORKER
+            batch, batch_bytes = [], 0
+            for path, size in file_search.walk_files(self.root, self.includes,
+                                                     self.excludes, self.max_size):
+                if self._cancelled:
+                    break
+                batch.append(path)
+                batch_bytes += size
+                if len(batch) >= BATCH_FILES or batch_bytes >= BATCH_BYTES:
+                    self._submit(pool, batch)
+                    batch, batch_bytes = [], 0
+                    while len(self._pending) >= limit and not self._cancelled:
+                        self._collect()
+            if batch and not self._cancelled:
+                self._submit(pool, batch)
+            while self._pending and not self._cancelled:
+                self._collect()
+        except Exception as e:
+            if isinstance(e, concurrent.futures.process.BrokenProcessPool):
+                # 工作进程异常退出后进程池不能再用，下次查找时重新创建
+                shutdown_pool()
+            self.searchFailed.emit(str(e))
+            return
+        finally:
+            for future in getattr(self, '_pending', ()):
+                future.cancel()
+        self._emit()
+        self.searchFinished.emit(self._cancelled)
+
+    def _submit(self, pool, batch):
+        self._pending.add(pool.submit(file_search.search_files, batch, self.pattern,
+                                      self.regex, self.case_sensitive))
+
+    def _collect(self):
+        """等待至少一个批次完成（最多 0.1 秒），收集结果并按间隔发送"""
+        done, self._pending = concurrent.futures.wait(
+            self._pending, timeout=0.1, return_when=concurrent.futures.FIRST_COMPLETED)
+        for future in done:
+            if future.cancelled():
+                continue
+            searched, found = future.result()
+            self.searched += searched
+            self.matched_files += len(found)
+            self._found.extend(found)
+        if time.monotonic() - self._last_emit >= EMIT_INTERVAL:
+            self._emit()
+
+    def _emit(self):
+        self._last_emit = time.monotonic()
+        if self._found:
+            found, self._found = self._found, []
+            self.resultsFound.emit(found)
+        self.progressChanged.emit(self.searched, self.matched_files)
+
+
+class FindInFilesPanel(QDockWidget):
+    """在文件中查找的停靠面板"""
+    def __init__(self, window):
+        super().__init__('在文件中查找', window)
+        self.window = window
+        self.setObjectName('findInFiles')
+        self.settings = settings_store.get_store('FindInFiles')
+        self.search = None
+        self.shown_lines = 0
+        self.total_matches = 0
+
+        content = QWidget(self)
+        layout = QVBoxLayout(content)
+        form = QFormLayout()
+
+        self.patternEdit = QLineEdit(content)
+        self.patternEdit.returnPressed.connect(self.startSearch)
+        form.addRow('查找:', self.patternEdit)
+
+        dirLayout = QHBoxLayout()
+        self.dirEdit = QLineEdit(self.settings.strValue('directory', os.getcwd()), content)
+        self.dirEdit.returnPressed.connect(self.startSearch)
+        browseButton = QToolButton(content)
+        browseButton.setText('...')
+        browseButton.clicked.connect(self.browse)
+        dirLayout.addWidget(self.dirEdit, 1)
+        dirLayout.addWidget(browseButton)
+        form.addRow('目录:', dirLayout)
+
+        self.includeEdit = QLineEdit(self.settings.strValue('include', ''), content)
+        self.includeEdit.setPlaceholderText('所有文件，例如 *.py; *.log')
+        form.addRow('包含:', self.includeEdit)
+        self.excludeEdit = QLineEdit(
+            self.settings.strValue('exclude', '; '.join(file_search.DEFAULT_EXCLUDES)), content)
+        form.addRow('排除:', self.excludeEdit)
+        layout.addLayout(form)
+
+        options = QHBoxLayout()
+        self.caseBox = QCheckBox('区分大小写', content)
+        self.regexBox = QCheckBox('正则表达式', content)
+        self.sizeSpin = QSpinBox(content)
+        self.sizeSpin.setRange(1, 4096)
+        self.sizeSpin.setSuffix(' MB')
+        self.sizeSpin.setPrefix('跳过大于 ')
+        self.sizeSpin.setValue(self.settings.intValue('maxSizeMB', file_search.DEFAULT_MAX_SIZE_MB))
+        self.searchButton = QPushButton('查找', content)
+        self.searchButton.clicked.connect(self.toggleSearch)
+        options.addWidget(self.caseBox)
+        options.addWidget(self.regexBox)
+        options.addWidget(self.sizeSpin)
+        options.addStretch(1)
+        options.addWidget(self.searchButton)
+        layout.addLayout(options)
+
+        self.statusLabel = QLabel(content)
+        layout.addWidget(self.statusLabel)
+        self.tree = QTreeWidget(content)
+        self.tree.setHeaderHidden(True)
+        self.tree.setUniformRowHeights(True)
+        self.tree.itemActivated.connect(self.openResult)
+        layout.addWidget(self.tree, 1)
+        self.setWidget(content)
+
+    def showPanel(self):
+        self.show()
+        self.raise_()
+        editor = self.window.currentEditor()
+        if editor is not None and hasattr(editor, 'hasSelectedText') and editor.hasSelectedText():
+            selected = editor.selectedText()
+            if '\n' not in selected:
+                self.patternEdit.setText(selected)
+        self.patternEdit.setFocus()
+        self.patternEdit.selectAll()
+
+    def browse(self):
+        directory = QFileDialog.getExistingDirectory(self, '选择目录', self.dirEdit.text())
+        if directory:
+            self.dirEdit.setText(directory)
+
+    def toggleSearch(self):
+        if self.search is not None:
+            self.cancelSearch()
+        else:
+            self.startSearch()
+
+    def startSearch(self):
+        pattern = self.patternEdit.text()
+        root = self.dirEdit.text().strip()
+        if not pattern:
+            return
+        if not os.path.isdir(root):
+            self.statusLabel.setText('目录不存在')
+            return
+        try:
+            file_search.compile_pattern(pattern, self.regexBox.isChecked(),
+                                        self.caseBox.isChecked())
+        except re.error as e:
+            self.statusLabel.setText(f'正则表达式无效：{str(e)}')
+            return
+        self.cancelSearch()
+        self.settings.setValue('directory', root)
+        self.settings.setValue('include', self.includeEdit.text())
+        self.settings.setValue('exclude', self.excludeEdit.text())
+        self.settings.setValue('maxSizeMB', self.sizeSpin.value())
+
+        self.tree.clear()
+        self.root = root
+        self.shown_lines = 0
+        self.total_matches = 0
+        self.started = time.monotonic()
+        search = FileSearch(root, pattern, self.regexBox.isChecked(), self.caseBox.isChecked(),
+                            file_search.parse_patterns(self.includeEdit.text()),
+                            file_search.parse_patterns(self.excludeEdit.text()),
+                            self.sizeSpin.value() * 1024 * 1024, self)
+        search.resultsFound.connect(self.addResults)
+        search.progressChanged.connect(self.showProgress)
+        search.searchFinished.connect(lambda cancelled: self.handleFinished(search, cancelled))
+        search.searchFailed.connect(lambda message: self.handleFailed(search, message))
+        self.search = search
+        self.searchButton.setText('停止')
+        self.statusLabel.setText('正在查找...')
+        search.start()
+
+    def cancelSearch(self):
+        if self.search is not None:
+            self.search.cancel()
+            # 取消后不再接收这次查找的结果
+            self.search.resultsFound.disconnect(self.addResults)
+            self.search.progressChanged.disconnect(self.showProgress)
+            self.statusLabel.setText(self.statusLabel.text() + '（已停止）')
+            self.search = None
+            self.searchButton.setText('查找')
+
+    def handleFinished(self, search, cancelled):
+        search.deleteLater()
+        if search is not self.search:
+            return
+        self.search = None
+        self.searchButton.setText('查找')
+        self.showProgress(search.searched, search.matched_files)
+        elapsed = time.monotonic() - self.started
+        self.statusLabel.setText(self.statusLabel.text() + f'，用时 {elapsed:.1f} 秒')
+
+    def handleFailed(self, search, message):
+        search.deleteLater()
+        if search is self.search:
+            self.search = None
+            self.searchButton.setText('查找')
+            self.statusLabel.setText(f'查找失败：{message}')
+
+    def showProgress(self, searched, matched_files):
+        text = f'已搜索 {searched} 个文件，{matched_files} 个文件中共 {self.total_matches} 处匹配'
+        if self.total_matches > self.shown_lines:
+            text += f'（只显示前 {self.shown_lines} 处）'
+        self.statusLabel.setText(text)
+
+    def addResults(self, found):
+        """把一批结果加入树中"""
+        self.tree.setUpdatesEnabled(False)
+        for path, encoding, total, results in found:
+            self.total_matches += total
+            if self.shown_lines >= MAX_SHOWN_LINES:
+                continue
+            fileItem = QTreeWidgetItem([f'{os.path.relpath(path, self.root)}  ({total})'])
+            fileItem.setToolTip(0, f'{path}\n编码：{encoding}')
+            fileItem.setData(0, Qt.UserRole, (path, 0, 0))
+            children = []
+            for line, column, content in results[:MAX_SHOWN_LINES - self.shown_lines]:
+                child = QTreeWidgetItem([f'{line + 1}: {content.strip()}'])
+                child.setData(0, Qt.UserRole, (path, line, column))
+                children.append(child)
+            self.shown_lines += len(children)
+            fileItem.addChildren(children)
+            self.tree.addTopLevelItem(fileItem)
+            fileItem.setExpanded(True)
+        self.tree.setUpdatesEnabled(True)
+
+    def openResult(self, item):
+        path, line, column = item.data(0, Qt.UserRole)
+        self.window.showLocation(path, line, column)
@@ -0,0 +1,510 @@
+"""十六进制查看器
+
+不是文本（含有零字节或大量控制字符）或无法按任何编码解码的文件，以十六进制
+和 ASCII 对照的方式只读显示。文件通过 mmap 映射，每次绘制只读取视口中可见的
+几十行，几 GB 的文件也能立即打开，内存占用与可见行数成正比，与文件大小无关。
+查找字节串在后台线程中分块进行，查找大文件时界面不会卡住。
+"""
+import mmap
+import os
+
+from PyQt5.QtCore import Qt, QThread, QRect, pyqtSignal
+from PyQt5.QtGui import QFont, QColor, QPainter, QFontMetrics, QKeySequence
+from PyQt5.QtWidgets import (QWidget, QHBoxLayout, QVBoxLayout, QScrollBar, QLineEdit,
+                             QCheckBox, QPushButton, QLabel, QApplication, QShortcut)
+
+# 状态栏中显示的"编码"
+BINARY_ENCODING = '二进制'
+# 每行显示的字节数
+BYTES_PER_ROW = 16
+# 查找时每次扫描的字节数
+SEARCH_BLOCK_SIZE = 16 * 1024 * 1024
+# 滚动条的最大值，行数更多时一个刻度对应多行（QScrollBar 的值是 32 位整数）
+MAX_SCROLL_VALUE = 1 << 30
+# 一次最多复制的字节数
+MAX_COPY_BYTES = 1024 * 1024
+# ASCII 列中不可打印的字节显示为 '.'
+ASCII_TABLE = bytes(b if 0x20 <= b < 0x7f else ord('.') for b in range(256))
+
+
+def parse_hex(text):
+    """把 'DE AD be ef' 或 'deadbeef' 形式的十六进制串转换为字节，格式错误时抛出 ValueError"""
+    return bytes.fromhex(text)
+
+
+def parse_offset(text):
+    """解析字节偏移：0x 开头按十六进制，否则按十进制；格式错误时抛出 ValueError"""
+    text = text.strip().replace('_', '')
+    if text[:2].lower() == '0x':
+        return int(text[2:], 16)
+    return int(text, 10)
+
+
+class ByteSearch(QThread):
+    """在后台分块查找字节串，到达文件末尾（向前查找时为开头）后从另一端继续
+
+    向后查找从 start 开始（包括 start），向前查找只找起始位置在 start 之前的匹配。
+    """
+    searchFinished = pyqtSignal(object, bool)     # 匹配的起始偏移（未找到时为 None），是否绕回
+    progressChanged = pyqtSignal(object, object)  # 已扫描字节数，总字节数
+
+    def __init__(self, buffer, pattern, start, backward=False, parent=None):
+        super().__init__(parent)
+        self.buffer = buffer
+        self.pattern = pattern
+        self.start_offset = start
+        self.backward = backward
+        self._cancelled = False
+
+    def cancel(self):
+        """请求停止查找"""
+        self._cancelled = True
+
+    def run(self):
+        size = len(self.buffer)
+        start = self.start_offset
+        # 跨越 start 的匹配只在第一段中查找
+        overlap = min(start + len(self.pattern) - 1, size)
+        if self.backward:
+            ranges = [(0, overlap), (start, size)]
+        else:
+            ranges = [(start, size), (0, overlap)]
+        scanned = 0
+        for wrapped, (begin, end) in enumerate(ranges):
+            found = self.searchRange(begin, end, scanned, size)
+            if self._cancelled:
+                return
+            if found is not None:
+                self.searchFinished.emit(found, bool(wrapped))
+                return
+            scanned += end - begin
+        self.searchFinished.emit(None, False)
+
+    def searchRange(self, begin, end, scanned, total):
+        """在 [begin, end) 中按块查找，返回匹配的起始偏移或 None"""
+        buffer, pattern = self.buffer, self.pattern
+        width = len(pattern) - 1  # 相邻两块重叠的字节数，跨越块边界的匹配也能找到
+        if self.backward:
+            limit = end
+            while limit - begin > width and not self._cancelled:
+                block_start = max(begin, limit - SEARCH_BLOCK_SIZE)
+                i = buffer.rfind(pattern, block_start, limit)
+                if i != -1:
+                    return i
+                self.release(block_start, limit)
+                self.progressChanged.emit(scanned + end - block_start, total)
+                limit = block_start + width
+                if block_start == begin:
+                    break
+        else:
+            pos = begin
+            while pos < end and not self._cancelled:
+                block_end = min(end, pos + SEARCH_BLOCK_SIZE)
+                i = buffer.find(pattern, pos, min(end, block_end + width))
+                if i != -1:
+                    return i
+                self.release(pos, block_end)
+                self.progressChanged.emit(scanned + block_end - begin, total)
+                pos = block_end
+        return None
+
+    def release(self, begin, end):
+        """提示系统可以丢弃扫描过的页面，查找整个大文件时常驻内存不会随之增长"""
+        if hasattr(self.buffer, 'madvise') and hasattr(mmap, 'MADV_DONTNEED'):
+            begin -= begin % mmap.PAGESIZE
+            self.buffer.madvise(mmap.MADV_DONTNEED, begin, end - begin)
+
+
+class HexCanvas(QWidget):
+    """十六进制和 ASCII 对照视图，只绘制可见的行
+
+    cursor 为光标所在字节的偏移；anchor 与 cursor 不同时，[anchor, cursor)
+    （或反过来）为选中的字节。
+    """
+    cursorMoved = pyqtSignal()
+    scrolled = pyqtSignal()
+
+    def __init__(self, buffer, parent=None):
+        super().__init__(parent)
+        self.buffer = buffer
+        self.size = len(buffer)
+        self.rows = max(1, (self.size + BYTES_PER_ROW - 1) // BYTES_PER_ROW)
+        self.top_row = 0
+        self.cursor = 0
+        self.anchor = 0
+        self.ascii_side = False  # 最后一次点击的是 ASCII 列，复制时复制文本而不是十六进制
+        # 偏移列的宽度（字符数）
+        self.offset_digits = max(8, len(f'{self.size:X}'))
+
+        font = QFont('Consolas', 12)
+        font.setStyleHint(QFont.Monospace)
+        self.setFont(font)
+        self.setFocusPolicy(Qt.StrongFocus)
+        self.setCursor(Qt.IBeamCursor)
+        self.setAutoFillBackground(True)
+
+    # ---- 布局 ----
+
+    def charWidth(self):
+        return QFontMetrics(self.font()).horizontalAdvance('0')
+
+    def rowHeight(self):
+        return QFontMetrics(self.font()).height()
+
+    def hexColumn(self, i):
+        """一行中第 i 个字节的十六进制在第几个字符处，前后两半之间多空一格"""
+        return self.offset_digits + 2 + 3 * i + (1 if i >= BYTES_PER_ROW // 2 else 0)
+
+    def asciiColumn(self, i):
+        return self.offset_digits + 2 + 3 * BYTES_PER_ROW + 2 + i
+
+    def visibleRows(self):
+        return max(1, self.height() // self.rowHeight())
+
+    def maxTopRow(self):
+        return max(0, self.rows - self.visibleRows())
+
+    def byteAt(self, pos):
+        """窗口坐标处的 (字节偏移, 是否在 ASCII 列)"""
+        width = self.charWidth()
+        row = self.top_row + max(0, pos.y()) // self.rowHeight()
+        column = pos.x() // width
+        ascii_side = column >= self.asciiColumn(0) - 1
+        if ascii_side:
+            i = column - self.asciiColumn(0)
+        else:
+            i = (column - self.offset_digits - 2 - (1 if column >= self.hexColumn(BYTES_PER_ROW // 2) else 0)) // 3
+        i = max(0, min(BYTES_PER_ROW - 1, i))
+        return self.clampOffset(row * BYTES_PER_ROW + i), ascii_side
+
+    def clampOffset(self, offset):
+        return max(0, min(offset, self.size - 1)) if self.size else 0
+
+    def selection(self):
+        """选中的字节范围 (开始, 结束)，没有选择时两者相等"""
+        return min(self.anchor, self.cursor), max(self.anchor, self.cursor)
+
+    # ---- 滚动和光标 ----
+
+    def setTopRow(self, row):
+        row = max(0, min(row, self.maxTopRow()))
+        if row != self.top_row:
+            self.top_row = row
+            self.update()
+            self.scrolled.emit()
+
+    def ensureVisible(self, offset):
+        """offset 所在的行不在视口中时滚动过去，尽量放在视口中间"""
+        row = offset // BYTES_PER_ROW
+        visible = self.visibleRows()
+        if not self.top_row <= row < self.top_row + visible:
+            self.setTopRow(row - visible // 2)
+
+    def moveCursor(self, offset, extend=False):
+        """移动光标；extend 为 True 时扩展选择，选择的末端可以在最后一个字节之后"""
+        if extend:
+            self.cursor = max(0, min(offset, self.size))
+        else:
+            self.cursor = self.anchor = self.clampOffset(offset)
+        self.ensureVisible(self.cursor)
+        self.update()
+        self.cursorMoved.emit()
+
+    def select(self, start, end):
+        """选中 [start, end) 并滚动过去"""
+        self.anchor = start
+        self.cursor = min(end, self.size)
+        self.ensureVisible(start)
+        self.update()
+        self.cursorMoved.emit()
+
+    def selectedBytes(self):
+        start, end = self.selection()
+        if start == end:
+            end = min(start + 1, self.size)
+        return self.buffer[start:min(end, start + MAX_COPY_BYTES)]
+
+    def copy(self):
+        data = self.selectedBytes()
+        if self.ascii_side:
+            text = data.translate(ASCII_TABLE).decode('ascii')
+        else:
+            text = data.hex(' ').upper()
+        QApplication.clipboard().setText(text)
+
+    # ---- 绘制 ----
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        metrics = QFontMetrics(self.font())
+        width, height = self.charWidth(), self.rowHeight()
+        first = self.top_row
+        last = min(self.rows, first + self.visibleRows() + 1)
+        start, end = self.selection()
+        if start == end and self.size:
+            end = start + 1  # 没有选择时高亮光标所在的字节
+            selection_color = QColor('#e8e8e8')
+        else:
+            selection_color = QColor('#add6ff')
+        half = BYTES_PER_ROW // 2
+        for row in range(first, last):
+            y = (row - first) * height
+            row_start = row * BYTES_PER_ROW
+            data = self.buffer[row_start:row_start + BYTES_PER_ROW]
+            # 选中的字节
+            lo, hi = max(start, row_start), min(end, row_start + len(data))
+            if lo < hi:
+                i, j = lo - row_start, hi - row_start - 1
+                x1, x2 = self.hexColumn(i), self.hexColumn(j) + 2
+                painter.fillRect(QRect(x1 * width, y, (x2 - x1) * width, height), selection_color)
+                x1, x2 = self.asciiColumn(i), self.asciiColumn(j) + 1
+                painter.fillRect(QRect(x1 * width, y, (x2 - x1) * width, height), selection_color)
+            baseline = y + metrics.ascent()
+            painter.setPen(QColor('#808080'))
+            painter.drawText(0, baseline, f'{row_start:0{self.offset_digits}X}')
+            painter.setPen(self.palette().text().color())
+            hex_text = data[:half].hex(' ').upper()
+            if len(data) > half:
+                hex_text += '  ' + data[half:].hex(' ').upper()
+            painter.drawText(self.hexColumn(0) * width, baseline, hex_text)
+            painter.drawText(self.asciiColumn(0) * width, baseline,
+                             data.translate(ASCII_TABLE).decode('ascii'))
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self.setTopRow(self.top_row)
+        self.scrolled.emit()
+
+    # ---- 鼠标和键盘 ----
+
+    def mousePressEvent(self, event):
+        if event.button() == Qt.LeftButton:
+            offset, self.ascii_side = self.byteAt(event.pos())
+            self.moveCursor(offset, extend=bool(event.modifiers() & Qt.ShiftModifier))
+
+    def mouseMoveEvent(self, event):
+        if event.buttons() & Qt.LeftButton:
+            offset, _ = self.byteAt(event.pos())
+            # 拖动时选中范围包括鼠标下的字节
+            self.moveCursor(offset + 1 if offset >= self.anchor else offset, extend=True)
+
+    def wheelEvent(self, event):
+        steps = event.angleDelta().y() // 120
+        self.setTopRow(self.top_row - steps * 3)
+
+    def keyPressEvent(self, event):
+        if event.matches(QKeySequence.Copy):
+            self.copy()
+            return
+        if event.matches(QKeySequence.SelectAll):
+            self.select(0, self.size)
+            return
+        key = event.key()
+        extend = bool(event.modifiers() & Qt.ShiftModifier)
+        ctrl = bool(event.modifiers() & Qt.ControlModifier)
+        page = self.visibleRows() * BYTES_PER_ROW
+        row_start = self.cursor - self.cursor % BYTES_PER_ROW
+        moves = {
+            Qt.Key_Left: self.cursor - 1,
+            Qt.Key_Right: self.cursor + 1,
+            Qt.Key_Up: self.cursor - BYTES_PER_ROW,
+            Qt.Key_Down: self.cursor + BYTES_PER_ROW,
+            Qt.Key_PageUp: self.cursor - page,
+            Qt.Key_PageDown: self.cursor + page,
+            Qt.Key_Home: 0 if ctrl else row_start,
+            Qt.Key_End: self.size if ctrl else row_start + BYTES_PER_ROW - 1,
+        }
+        if key not in moves:
+            super().keyPressEvent(event)
+            return
+        if key in (Qt.Key_PageUp, Qt.Key_PageDown):
+            self.setTopRow(self.top_row + (1 if key == Qt.Key_PageDown else -1) * self.visibleRows())
+        self.moveCursor(moves[key], extend)
+
+
+class HexViewer(QWidget):
+    """二进制文件的只读十六进制查看器，接口与 HugeFileViewer 一致"""
+    def __init__(self, filepath, parent=None):
+        super().__init__(parent)
+        self.filepath = filepath
+        self.modified = False
+        self.saver = None
+        self.loader = None
+        self.reloader = None
+        self.profile = None  # 查看器没有性能档位
+        self.profile_override = None
+        self.last_active = 0.0
+        self.follower = None
+        self.journal = None
+        self.encoding = BINARY_ENCODING
+        self.encoding_confidence = 1.0
+        self.line_ending = ''  # 没有换行符，状态栏中不显示
+        self.mixed_line_endings = False
+        self.reason = ''       # 没有作为文本打开的原因
+        self.search = None     # 正在进行的 ByteSearch
+
+        self._file = open(filepath, 'rb')
+        if os.fstat(self._file.fileno()).st_size:
+            self.buffer = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            self.buffer = b''  # 空文件不能映射
+
+        self.canvas = HexCanvas(self.buffer)
+        self.canvas.cursorMoved.connect(self.updateOffsetLabel)
+        self.canvas.scrolled.connect(self.syncScrollBar)
+        self.row_scale = max(1, -(-self.canvas.rows // MAX_SCROLL_VALUE))
+        self.scrollBar = QScrollBar(Qt.Vertical)
+        self.scrollBar.valueChanged.connect(self.handleScrollBar)
+        self._syncing = False
+
+        self.offsetLabel = QLabel()
+        self.searchEdit = QLineEdit()
+        self.searchEdit.setPlaceholderText('查找（F3 下一个，Shift+F3 上一个）')
+        self.searchEdit.returnPressed.connect(self.findNext)
+        self.hexBox = QCheckBox('十六进制')
+        self.hexBox.setChecked(True)
+        self.hexBox.setToolTip('按十六进制字节查找，如 "DE AD BE EF"；不选时按 UTF-8 文本查找')
+        previousButton = QPushButton('上一个')
+        previousButton.clicked.connect(self.findPrevious)
+        nextButton = QPushButton('下一个')
+        nextButton.clicked.connect(self.findNext)
+        self.searchLabel = QLabel()
+
+        view = QHBoxLayout()
+        view.setContentsMargins(0, 0, 0, 0)
+        view.setSpacing(0)
+        view.addWidget(self.canvas)
+        view.addWidget(self.scrollBar)
+        bar = QHBoxLayout()
+        bar.setContentsMargins(4, 2, 4, 2)
+        bar.addWidget(self.offsetLabel)
+        bar.addStretch()
+        bar.addWidget(self.searchEdit, 1)
+        bar.addWidget(self.hexBox)
+        bar.addWidget(previousButton)
+        bar.addWidget(nextButton)
+        bar.addWidget(self.searchLabel)
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.setSpacing(0)
+        layout.addLayout(view, 1)
+        layout.addLayout(bar)
+        self.setFocusProxy(self.canvas)
+
+        shortcut = QShortcut(QKeySequence(Qt.Key_Escape), self.searchEdit)
+        shortcut.setContext(Qt.WidgetShortcut)
+        shortcut.activated.connect(self.closeSearch)
+
+        self.syncScrollBar()
+        self.updateOffsetLabel()
+
+    def isReadOnly(self):
+        return True
+
+    def closeFile(self):
+        """停止查找并释放映射"""
+        self.cancelSearch()
+        if isinstance(self.buffer, mmap.mmap):
+            self.buffer.close()
+        self.canvas.buffer = self.buffer = b''
+        self._file.close()
+
+    # ---- 滚动 ----
+
+    def syncScrollBar(self):
+        """画布滚动或改变大小后同步滚动条"""
+        self._syncing = True
+        self.scrollBar.setRange(0, self.canvas.maxTopRow() // self.row_scale)
+        self.scrollBar.setPageStep(max(1, self.canvas.visibleRows() // self.row_scale))
+        self.scrollBar.setValue(self.canvas.top_row // self.row_scale)
+        self._syncing = False
+
+    def handleScrollBar(self, value):
+        if not self._syncing:
+            self.canvas.setTopRow(value * self.row_scale)
+
+    def goToOffset(self, offset):
+        """把光标移到字节偏移 offset"""
+        self.canvas.moveCursor(offset)
+        self.canvas.setFocus()
+
+    def cursorOffset(self):
+        return self.canvas.cursor
+
+    def updateOffsetLabel(self):
+        start, end = self.canvas.selection()
+        text = f'偏移 0x{self.canvas.cursor:X} ({self.canvas.cursor:,})'
+        if end > start:
+            text += f'，已选 {end - start:,} 字节'
+        self.offsetLabel.setText(f'{text} / {self.canvas.size:,} 字节')
+
+    # ---- 查找 ----
+
+    def showSearch(self):
+        self.searchEdit.setFocus()
+        self.searchEdit.selectAll()
+
+    def closeSearch(self):
+        self.cancelSearch()
+        self.searchLabel.clear()
+        self.canvas.setFocus()
+
+    def pattern(self):
+        """查找框中的内容对应的字节串，格式错误时在查找框旁说明并返回 None"""
+        text = self.searchEdit.text()
+        if self.hexBox.isChecked():
+            try:
+                pattern = parse_hex(text)
+            except ValueError:
+                self.searchLabel.setText('十六进制格式错误')
+                return None
+        else:
+            pattern = text.encode('utf-8')
+        if not pattern:
+            self.searchLabel.clear()
+            return None
+        return pattern
+
+    def findNext(self):
+        self.startSearch(backward=False)
+
+    def findPrevious(self):
+        self.startSearch(backward=True)
+
+    def startSearch(self, backward):
+        pattern = self.pattern()
+        if pattern is None:
+            return
+        self.cancelSearch()
+        start, end = self.canvas.selection()
+        # 向后查找从当前选择的下一个字节开始，重复查找时逐个前进
+        begin = start + 1 if end > start and not backward else start
+        search = ByteSearch(self.buffer, pattern, begin, backward, self)
+        self.search = search
+        search.progressChanged.connect(self.handleSearchProgress)
+        search.searchFinished.connect(
+            lambda offset, wrapped: self.handleSearchFinished(search, len(pattern), offset, wrapped))
+        self.searchLabel.setText('正在查找…')
+        search.start()
+
+    def cancelSearch(self):
+        if self.search is not None:
+            self.search.cancel()
+            self.search.wait()
+            self.search.deleteLater()
+            self.search = None
+
+    def handleSearchProgress(self, scanned, total):
+        if total:
+            self.searchLabel.setText(f'正在查找… {scanned * 100 // total}%')
+
+    def handleSearchFinished(self, search, length, offset, wrapped):
+        if search is not self.search:
+            return
+        self.search = None
+        search.deleteLater()
+        if offset is None:
+            self.searchLabel.setText('未找到')
+            return
+        self.searchLabel.setText('已绕回继续查找' if wrapped else '')
+        self.canvas.select(offset, offset + length)
@@ -0,0 +1,640 @@
+"""热退出与崩溃恢复
+
+每个标签的修改以 Scintilla 的修改通知为单位（插入哪些字节、删除多少
+字节）追加写入该标签的日志文件，写入量与修改量成正比，与文档大小无关。
+日志相对于一个"基准"：
+  - empty：空白的未命名文档
+  - file：磁盘上摘要为 digest 的文件（加载、保存、重新加载后）
+  - snapshot：某个时刻的整个文档内容
+日志超过文档大小的一定比例时在后台写一次快照并换用新的日志（压缩），
+恢复时读取基准、依次重放日志即可。
+
+所有标签的顺序、路径、光标等写在 session.json 中。下次启动时恢复所有
+标签：未修改的文件只放占位标签，有未保存修改的标签按基准和日志重建，
+并保持修改状态。
+"""
+import ctypes
+import json
+import os
+import struct
+import uuid
+import zlib
+
+from PyQt5.QtCore import QObject, QThread, QTimer, QSettings, pyqtSignal
+from PyQt5.Qsci import QsciScintilla
+
+import compressed_files
+import settings_store
+from file_saver import snapshot_bytes
+
+# 日志记录：类型、位置、长度，后跟插入的字节和整条记录的 CRC32
+RECORD = struct.Struct('<BQQ')
+CRC = struct.Struct('<I')
+INSERT, DELETE = 1, 2
+_TEXT_CHANGES = QsciScintilla.SC_MOD_INSERTTEXT | QsciScintilla.SC_MOD_DELETETEXT
+# 修改后等待多久写入日志（毫秒），连续输入合并成一次写入
+FLUSH_DELAY = 300
+# 定期写入会话文件（光标位置等）的间隔（毫秒），内容没变时不写
+SESSION_INTERVAL = 5000
+# 日志超过 max(该值, 文档大小的一半) 时压缩为快照
+COMPACT_MIN_BYTES = 1024 * 1024
+
+SESSION_FILE = 'session.json'
+
+
+def recovery_dir():
+    """恢复数据的目录，与设置文件放在一起"""
+    settings = QSettings(QSettings.IniFormat, QSettings.UserScope,
+                         settings_store.ORGANIZATION, 'recovery')
+    return os.path.join(os.path.dirname(settings.fileName()), 'recovery')
+
+
+def write_atomic(path, data):
+    """先写临时文件再替换，崩溃时不会留下写了一半的文件"""
+    temp = path + '.tmp'
+    with open(temp, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp, path)
+
+
+def encode_record(op, position, data=b'', length=0):
+    header = RECORD.pack(op, position, len(data) if op == INSERT else length)
+    body = header + data
+    return body + CRC.pack(zlib.crc32(body))
+
+
+def read_records(path):
+    """读出日志中的记录 [(类型, 位置, 数据或长度), ...] 和有效部分的字节数
+
+    崩溃时最后一条记录可能只写了一半，遇到不完整或校验失败的记录就停止。
+    """
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+    except OSError:
+        return [], 0
+    records = []
+    pos = 0
+    while pos + RECORD.size <= len(data):
+        op, position, length = RECORD.unpack_from(data, pos)
+        payload = length if op == INSERT else 0
+        end = pos + RECORD.size + payload
+        if op not in (INSERT, DELETE) or end + CRC.size > len(data):
+            break
+        if CRC.unpack_from(data, end)[0] != zlib.crc32(data[pos:end]):
+            break
+        if op == INSERT:
+            records.append((op, position, data[pos + RECORD.size:end]))
+        else:
+            records.append((op, position, length))
+        pos = end + CRC.size
+    return records, pos
+
+
+def replay(editor, records):
+    """把日志记录应用到编辑器"""
+    send = editor.SendScintilla
+    for op, position, value in records:
+        if op == INSERT:
+            # SCI_INSERTTEXT 遇到 NUL 字节会截断，按长度替换空的目标范围
+            send(QsciScintilla.SCI_SETTARGETRANGE, position, position)
+            send(QsciScintilla.SCI_REPLACETARGET, len(value), value)
+        else:
+            send(QsciScintilla.SCI_DELETERANGE, position, value)
+
+
+def keep_modified(editor):
+    """恢复为已修改、但文本与 Scintilla 的保存点相同的标签（上次退出前转换了
+    编码，或从快照恢复的内容）记为有待保存的编码，撤销到保存点时仍是已修改"""
+    if editor.modified and not editor.SendScintilla(QsciScintilla.SCI_GETMODIFY):
+        editor.pending_encoding = editor.encoding
+
+
+class SnapshotWriter(QThread):
+    """在后台把文档内容写成快照文件"""
+    snapshotWritten = pyqtSignal(bool)  # 是否成功
+
+    def __init__(self, path, data, parent=None):
+        super().__init__(parent)
+        self.path = path
+        self.data = data
+
+    def run(self):
+        try:
+            write_atomic(self.path, self.data)
+        except OSError:
+            self.snapshotWritten.emit(False)
+            return
+        finally:
+            self.data = None
+        self.snapshotWritten.emit(True)
+
+
+class EditJournal(QObject):
+    """单个编辑器的修改日志
+
+    base 描述日志第 generation 代的起点；压缩或重设基准时代数加一，
+    换用新的日志文件。后台快照写完之前旧的基准和日志仍然有效，恢复时
+    从基准那一代开始依次重放之后各代的日志。
+    """
+    def __init__(self, manager, editor, entry=None):
+        super().__init__(editor)
+        self.manager = manager
+        self.editor = editor
+        self.id = entry['id'] if entry else uuid.uuid4().hex
+        self.base = entry['base'] if entry else None  # None 表示尚无有效基准
+        self.generation = entry['generation'] if entry else 0
+        self.stale = False      # 有未记录的修改（跟随文件追加等），下次修改时改写快照
+        self.paused = False     # 重放日志时不记录
+        self.log_size = 0
+        self._log = None
+        self._pending = []      # 尚未写入的记录 [类型, 位置, 数据或长度]
+        self._writer = None
+        self._flush_timer = QTimer(self)
+        self._flush_timer.setSingleShot(True)
+        self._flush_timer.setInterval(FLUSH_DELAY)
+        self._flush_timer.timeout.connect(self.flush)
+        editor.SCN_MODIFIED.connect(self.handleModified)
+
+    def path(self, generation, suffix):
+        return os.path.join(self.manager.directory, f'{self.id}-{generation}.{suffix}')
+
+    def generations(self, suffix):
+        """目录中属于该标签的某类文件的代数，从小到大"""
+        try:
+            names = os.listdir(self.manager.directory)
+        except OSError:
+            return []
+        prefix, ending = self.id + '-', '.' + suffix
+        found = []
+        for name in names:
+            if name.startswith(prefix) and name.endswith(ending):
+                generation = name[len(prefix):-len(ending)]
+                if generation.isdigit():
+                    found.append(int(generation))
+        return sorted(found)
+
+    def logFiles(self):
+        """基准那一代及之后各代的日志（压缩进行中或快照写入失败时不止一份）"""
+        return [self.path(generation, 'log') for generation in self.generations('log')
+                if generation >= self.base['generation']]
+
+    def isEmpty(self):
+        """基准之后没有任何修改"""
+        return not self._pending and self.log_size == 0 and self._writer is None
+
+    def handleModified(self, position, modification_type, text, length, *args):
+        if not modification_type & _TEXT_CHANGES:
+            return
+        editor = self.editor
+        if self.paused or editor.loader is not None:
+            return
+        if editor.appending_loaded_text:
+            # 跟随文件追加的内容不记录，之后的修改需要以快照为基准
+            self.stale = True
+            return
+        if self.stale or self.base is None and self._writer is None:
+            # 快照包含本次修改
+            self.compact()
+            return
+        if modification_type & QsciScintilla.SC_MOD_INSERTTEXT:
+            self.recordInsert(position, length, text)
+        else:
+            self.recordDelete(position, length)
+        if not self._flush_timer.isActive():
+            self._flush_timer.start()
+
+    def recordInsert(self, position, length, text):
+        if text is not None and len(text) == length:
+            data = text
+        else:
+            # 信号参数遇到 NUL 字节会截断，从缓冲区复制
+            pointer = self.editor.SendScintilla(QsciScintilla.SCI_GETRANGEPOINTER, position, length)
+            data = ctypes.string_at(pointer, length)
+        last = self._pending[-1] if self._pending else None
+        if last and last[0] == INSERT and last[1] + len(last[2]) == position:
+            # 连续输入合并为一条记录
+            last[2] += data
+        else:
+            self._pending.append([INSERT, position, data])
+
+    def recordDelete(self, position, length):
+        last = self._pending[-1] if self._pending else None
+        if last and last[0] == DELETE and position + length == last[1]:
+            # 连续退格
+            last[1] = position
+            last[2] += length
+        elif last and last[0] == DELETE and position == last[1]:
+            # 连续向后删除
+            last[2] += length
+        else:
+            self._pending.append([DELETE, position, length])
+
+    def openLog(self):
+        if self._log is None:
+            os.makedirs(self.manager.directory, exist_ok=True)
+            self._log = open(self.path(self.generation, 'log'), 'ab')
+            self.log_size = self._log.tell()
+        return self._log
+
+    def flush(self):
+        """把待写的记录追加到日志文件，日志过大时压缩"""
+        if not self.writePending():
+            return
+        # 第一次修改后标签要带上日志信息写入会话
+        self.manager.scheduleSave()
+        if self._writer is None and self.log_size > max(
+                COMPACT_MIN_BYTES, self.editor.SendScintilla(QsciScintilla.SCI_GETLENGTH) // 2):
+            self.compact()
+
+    def writePending(self):
+        self._flush_timer.stop()
+        if not self._pending:
+            return False
+        pending, self._pending = self._pending, []
+        data = b''.join(encode_record(op, position, value) if op == INSERT
+                        else encode_record(op, position, length=value)
+                        for op, position, value in pending)
+        try:
+            log = self.openLog()
+            log.write(data)
+            log.flush()
+            os.fsync(log.fileno())
+        except OSError:
+            return False
+        self.log_size += len(data)
+        return True
+
+    def startGeneration(self):
+        """换用新一代的日志"""
+        self._pending = []
+        self._flush_timer.stop()
+        if self._log is not None:
+            self._log.close()
+            self._log = None
+        self.generation += 1
+        self.log_size = 0
+
+    def compact(self):
+        """在后台把当前内容写成快照，之后的修改记入新一代日志"""
+        self.writePending()
+        self.startGeneration()
+        self.stale = False
+        generation = self.generation
+        os.makedirs(self.manager.directory, exist_ok=True)
+        writer = SnapshotWriter(self.path(generation, 'snap'), snapshot_bytes(self.editor), self)
+        self._writer = writer
+
+        def on_written(ok):
+            writer.deleteLater()
+            if self._writer is not writer:
+                # 写入期间又重设了基准，这份快照已经过时
+                try:
+                    os.remove(writer.path)
+                except OSError:
+                    pass
+                return
+            self._writer = None
+            if ok:
+                # 失败时旧的基准和各代日志仍然连续有效
+                self.setBase({'kind': 'snapshot', 'generation': generation})
+
+        writer.snapshotWritten.connect(on_written)
+        writer.start()
+
+    def resetToFile(self, digest):
+        """文档内容与磁盘文件一致（加载、保存后），以文件为新的基准"""
+        self.startGeneration()
+        self.stale = False
+        self._writer = None
+        if digest is None:
+            self.setBase(None)
+        else:
+            self.setBase({'kind': 'file', 'digest': digest, 'generation': self.generation})
+
+    def resetToEmpty(self):
+        """新建的空白文档，没有旧文件要删除，也不必立即写会话"""
+        self.base = {'kind': 'empty', 'generation': self.generation}
+
+    def resync(self):
+        """修改通知被关闭过（如全部替换），日志已不完整，立即改写快照"""
+        if self.base is not None and not self.editor.isReadOnly():
+            self.compact()
+
+    def setBase(self, base):
+        """记下新的基准并写入会话文件，然后删除不再需要的旧文件
+
+        旧文件可能仍被会话文件引用，要先写入会话再删除；没有旧文件时（如刚
+        打开的文件）只安排稍后写入，一次打开很多文件时不必每个都同步写一次。
+        """
+        self.base = base
+        old = self.oldFiles(keep=base['generation'] if base else self.generation)
+        if not old:
+            self.manager.scheduleSave()
+            return
+        self.manager.saveSession()
+        for path in old:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def oldFiles(self, keep=None):
+        """早于第 keep 代的文件的路径，keep 为 None 时返回全部"""
+        directory = self.manager.directory
+        try:
+            names = os.listdir(directory)
+        except OSError:
+            return []
+        prefix = self.id + '-'
+        paths = []
+        for name in names:
+            if not name.startswith(prefix):
+                continue
+            generation = name[len(prefix):].split('.', 1)[0]
+            if keep is None or generation.isdigit() and int(generation) < keep:
+                paths.append(os.path.join(directory, name))
+        return paths
+
+    def removeFiles(self, keep=None):
+        """删除早于第 keep 代的文件，keep 为 None 时全部删除"""
+        for path in self.oldFiles(keep):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def close(self, remove=True):
+        """标签关闭：停止记录，remove 为 True 时删除日志和快照"""
+        self._flush_timer.stop()
+        try:
+            self.editor.SCN_MODIFIED.disconnect(self.handleModified)
+        except TypeError:
+            pass
+        if self._writer is not None:
+            self._writer.wait()
+        if self._log is not None:
+            self._log.close()
+            self._log = None
+        if remove:
+            self.removeFiles()
+
+    def entry(self):
+        """会话文件中的记录，基准无效时返回 None（只能按路径重新打开）"""
+        if self.base is None or self.stale:
+            return None
+        return {'id': self.id, 'base': self.base, 'generation': self.generation}
+
+
+class RecoveryManager(QObject):
+    """管理所有标签的修改日志和会话文件"""
+    def __init__(self, window, editor_class):
+        super().__init__(window)
+        self.window = window
+        self.editor_class = editor_class  # 恢复未命名标签时创建编辑器
+        self.directory = recovery_dir()
+        self._last_session = None
+        self._session_timer = QTimer(self)
+        self._session_timer.setInterval(SESSION_INTERVAL)
+        self._session_timer.timeout.connect(self.saveSession)
+        self._save_timer = QTimer(self)
+        self._save_timer.setSingleShot(True)
+        self._save_timer.setInterval(FLUSH_DELAY)
+        self._save_timer.timeout.connect(self.saveSession)
+
+    def start(self):
+        self._session_timer.start()
+
+    def track(self, editor):
+        """开始记录 editor 的修改；新建的空白文档以空内容为基准"""
+        if editor.journal is None:
+            editor.journal = EditJournal(self, editor)
+            if editor.filepath is None and editor.length() == 0:
+                editor.journal.resetToEmpty()
+        self.scheduleSave()
+
+    def discard(self, editor):
+        """标签关闭或休眠，删除其日志"""
+        journal = getattr(editor, 'journal', None)
+        if journal is not None:
+            editor.journal = None
+            journal.close()
+        self.scheduleSave()
+
+    def fileLoaded(self, editor, digest):
+        """文件加载完成：恢复中的标签重放日志，否则以文件为基准"""
+        journal = editor.journal
+        if journal is None:
+            return
+        pending = editor.pending_recovery
+        editor.pending_recovery = None
+        if pending is not None:
+            if pending['base'].get('digest') == digest:
+                self.replayLogs(editor)
+                # 文件按磁盘上的编码读入，保存时沿用上次会话中（可能转换过）的编码和换行符
+                editor.encoding = pending.get('encoding', editor.encoding)
+                editor.line_ending = pending.get('line_ending', editor.line_ending)
+                editor.setModified(pending.get('modified', False))
+                editor.modified = pending.get('modified', False)
+                keep_modified(editor)
+                return
+            self.window.statusBar.showMessage(
+                f'{os.path.basename(editor.filepath)} 在上次退出后已被修改，未保存的修改无法恢复', 5000)
+        journal.resetToFile(digest)
+
+    def replayLogs(self, editor):
+        """按日志重放上次退出前的修改，并接着最后一份日志继续记录"""
+        journal = editor.journal
+        logs = journal.logFiles()
+        journal.paused = True
+        editor.SendScintilla(QsciScintilla.SCI_SETUNDOCOLLECTION, 0)
+        try:
+            for path in logs:
+                records, valid = read_records(path)
+                replay(editor, records)
+                if path == logs[-1]:
+                    # 截掉崩溃时写了一半的记录，之后的记录接在后面
+                    with open(path, 'r+b') as f:
+                        f.truncate(valid)
+        finally:
+            editor.SendScintilla(QsciScintilla.SCI_SETUNDOCOLLECTION, 1)
+            journal.paused = False
+        editor.SendScintilla(QsciScintilla.SCI_EMPTYUNDOBUFFER)
+        journal.generation = max([journal.generation] + journal.generations('log'))
+        journal.openLog()
+
+    def flushAll(self):
+        for index in range(self.window.tabs.count()):
+            journal = getattr(self.window.tabs.widget(index), 'journal', None)
+            if journal is not None:
+                journal.flush()
+
+    def scheduleSave(self):
+        if not self._save_timer.isActive():
+            self._save_timer.start()
+
+    def sessionData(self):
+        tabs = []
+        window = self.window
+        for index in range(window.tabs.count()):
+            widget = window.tabs.widget(index)
+            journal = getattr(widget, 'journal', None)
+            entry = journal.entry() if journal is not None else None
+            if widget.filepath is None and (entry is None or entry['base']['kind'] == 'empty'
+                                            and journal.isEmpty()):
+                # 空白的未命名标签不需要恢复
+                continue
+            tab = {'filepath': widget.filepath, 'title': widget.title}
+            if hasattr(widget, 'viewState'):
+                tab['view'] = widget.viewState()
+            elif getattr(widget, 'view_state', None) is not None:
+                tab['view'] = widget.view_state
+            if entry is not None and (widget.modified or widget.filepath is None):
+                entry.update(modified=widget.modified, encoding=widget.encoding,
+                             line_ending=widget.line_ending)
+                tab['journal'] = entry
+            elif getattr(widget, 'pending_recovery', None) is not None:
+                # 还在加载，沿用上次的恢复信息
+                tab['journal'] = dict(widget.pending_recovery, id=journal.id)
+            tabs.append(tab)
+        current = window.tabs.currentIndex()
+        return {'tabs': tabs, 'current': current}
+
+    def saveSession(self):
+        """会话内容有变化时写入 session.json"""
+        self._save_timer.stop()
+        data = json.dumps(self.sessionData(), ensure_ascii=False)
+        if data == self._last_session:
+            return
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            write_atomic(os.path.join(self.directory, SESSION_FILE), data.encode('utf-8'))
+        except OSError:
+            return
+        self._last_session = data
+
+    def shutdown(self):
+        """退出前写入所有日志和会话"""
+        self.flushAll()
+        for index in range(self.window.tabs.count()):
+            journal = getattr(self.window.tabs.widget(index), 'journal', None)
+            if journal is not None and journal._writer is not None:
+                journal._writer.wait()
+        self.saveSession()
+
+    def loadSession(self):
+        try:
+            with open(os.path.join(self.directory, SESSION_FILE), encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def restore(self):
+        """恢复上次退出（或崩溃）时的所有标签，返回恢复的标签数"""
+        session = self.loadSession()
+        if not session:
+            return 0
+        window = self.window
+        restored = 0
+        ids = set()
+        # 逐个添加时不切换标签，全部添加后只加载最后的当前标签
+        window.tabs.blockSignals(True)
+        window.tabs.setUpdatesEnabled(False)
+        try:
+            for tab in session.get('tabs', []):
+                restored += self.restoreTab(tab, ids)
+            if restored:
+                window.tabs.setCurrentIndex(
+                    min(max(session.get('current', 0), 0), window.tabs.count() - 1))
+        finally:
+            window.tabs.setUpdatesEnabled(True)
+            window.tabs.blockSignals(False)
+        if window.tabs.count():
+            window.handleCurrentTabChanged(window.tabs.currentIndex())
+        self.removeOrphans(ids)
+        self.scheduleSave()
+        return restored
+
+    def restoreTab(self, tab, ids):
+        """恢复一个标签，成功时返回 1"""
+        window = self.window
+        entry = tab.get('journal')
+        filepath = tab.get('filepath')
+        try:
+            if entry is None:
+                if not filepath or not os.path.isfile(filepath):
+                    return 0
+                window.openFile(filepath, activate=False)
+                widget = window.tabs.widget(window.tabs.count() - 1)
+                if hasattr(widget, 'view_state'):
+                    widget.view_state = tab.get('view')
+                return 1
+            editor = self.restoreEditor(tab, entry)
+        except (OSError, ValueError, KeyError) as e:
+            window.statusBar.showMessage(f'无法恢复标签：{e}', 5000)
+            return 0
+        if editor is None:
+            return 0
+        ids.add(entry['id'])
+        return 1
+
+    def restoreEditor(self, tab, entry):
+        """按基准和日志重建一个有未保存修改的标签"""
+        window = self.window
+        filepath = tab.get('filepath')
+        base = entry['base']
+        if base['kind'] == 'file':
+            if not os.path.isfile(filepath) or window.isHugeFile(filepath):
+                return None
+            editor = window.createFileEditor(filepath)
+            editor.journal = EditJournal(self, editor, entry)
+            editor.pending_recovery = entry
+            if tab.get('view'):
+                editor.pending_view_state = tab['view']
+            window.addEditorTab(editor, tab.get('title') or os.path.basename(filepath), activate=False)
+            window.startLoading(editor, filepath)
+            return editor
+
+        editor = window.createFileEditor(filepath) if filepath else self.editor_class()
+        editor.journal = EditJournal(self, editor, entry)
+        if base['kind'] == 'snapshot':
+            with open(editor.journal.path(base['generation'], 'snap'), 'rb') as f:
+                data = f.read()
+            editor.journal.paused = True
+            editor.SendScintilla(QsciScintilla.SCI_SETUNDOCOLLECTION, 0)
+            editor.SendScintilla(QsciScintilla.SCI_APPENDTEXT, len(data), data)
+            editor.SendScintilla(QsciScintilla.SCI_SETUNDOCOLLECTION, 1)
+            editor.journal.paused = False
+        self.replayLogs(editor)
+        editor.encoding = entry.get('encoding', editor.encoding)
+        editor.line_ending = entry.get('line_ending', editor.line_ending)
+        editor.set_lexer_by_filename(filepath or '')
+        window.addEditorTab(editor, tab.get('title') or '未命名', activate=False)
+        modified = entry.get('modified', True)
+        editor.setModified(modified)
+        editor.modified = modified
+        keep_modified(editor)
+        window.updateTabTitle(window.tabs.indexOf(editor))
+        if tab.get('view'):
+            editor.restoreViewState(tab['view'])
+        if filepath:
+            # 压缩文件保存时按磁盘上的格式重新压缩
+            editor.compression = compressed_files.detect_file(filepath)
+            window.changeWatcher.watch(editor)
+        return editor
+
+    def removeOrphans(self, ids):
+        """删除不属于任何恢复标签的日志和快照"""
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return
+        for name in names:
+            if name == SESSION_FILE or name.split('-', 1)[0] in ids:
+                continue
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                pass
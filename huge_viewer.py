@@ -0,0 +1,248 @@
+"""超大文件只读查看器
+
+文件通过 mmap 映射，后台线程建立行首偏移索引（array 存储），
+界面只解码并显示视口附近的一小段行，内存占用与视口大小成正比，
+与文件大小无关。
+"""
+import mmap
+import os
+from array import array
+
+from PyQt5.QtCore import Qt, QThread, pyqtSignal
+from PyQt5.QtGui import QFont, QColor
+from PyQt5.QtWidgets import QWidget, QHBoxLayout, QScrollBar
+from PyQt5.Qsci import QsciScintilla
+
+import encoding_detect
+
+# 超过该大小（MB）的文件使用只读查看器打开，可在设置中修改
+DEFAULT_THRESHOLD_MB = 256
+# 每次扫描的字节数
+INDEX_BLOCK_SIZE = 16 * 1024 * 1024
+# 编辑器中同时保留的行数
+WINDOW_LINES = 2000
+# 视口距离窗口边缘少于该行数时重新定位窗口
+WINDOW_MARGIN = 400
+# 单行最多解码的字节数，超长行会被截断显示
+MAX_LINE_BYTES = 10000
+
+
+class LineIndexer(QThread):
+    """在后台扫描文件，记录每一行的起始字节偏移"""
+    progressChanged = pyqtSignal(int, int)  # 已扫描字节数，总字节数
+    linesIndexed = pyqtSignal(int)          # 当前已知的行数
+    loadFinished = pyqtSignal(bool)         # 参数为是否被取消
+
+    def __init__(self, buffer, separator, first_offset=0, parent=None):
+        super().__init__(parent)
+        self.buffer = buffer
+        self.separator = separator
+        self.first_offset = first_offset  # 跳过 BOM 后第一行的偏移
+        # offsets[i] 为第 i 行的起始偏移，只在末尾追加，界面线程可以随时读取
+        self.offsets = array('Q', [first_offset])
+        self.done = False
+        self._cancelled = False
+
+    def cancel(self):
+        """请求停止索引"""
+        self._cancelled = True
+
+    def run(self):
+        buffer = self.buffer
+        sep = self.separator
+        size = len(buffer)
+        width = len(sep)
+        start = self.first_offset
+        offsets = self.offsets
+        find = buffer.find
+        pos = start
+        while pos < size and not self._cancelled:
+            end = min(pos + INDEX_BLOCK_SIZE, size)
+            # 允许多字节换行符跨越块边界
+            limit = min(end + width - 1, size)
+            i = find(sep, pos, limit)
+            while i != -1:
+                # UTF-16 中换行符必须落在码元边界上
+                if width == 1 or (i - start) % width == 0:
+                    offsets.append(i + width)
+                i = find(sep, i + 1, limit)
+            pos = end
+            self.progressChanged.emit(pos, size)
+            self.linesIndexed.emit(len(offsets) - 1)
+        if not self._cancelled:
+            self.done = True
+            self.linesIndexed.emit(self.lineCount())
+        self.loadFinished.emit(self._cancelled)
+
+    def lineCount(self):
+        """已确定边界的行数；索引完成后包含最后一行"""
+        return len(self.offsets) if self.done else len(self.offsets) - 1
+
+
+class HugeFileViewer(QWidget):
+    """基于 mmap 的只读大文件查看器，只显示视口附近的行
+
+    给出 encoding 时按该编码显示，不再检测。source 为实际映射的文件（压缩
+    文件解压得到的临时文件），关闭时删除；默认映射 filepath。
+    """
+    def __init__(self, filepath, parent=None, encoding=None, source=None):
+        super().__init__(parent)
+        self.filepath = filepath
+        self.source = source
+        self.modified = False
+        self.saver = None
+        self.reloader = None
+        self.profile = None  # 查看器没有性能档位
+        self.profile_override = None
+        self.last_active = 0.0
+        self.follower = None
+        self.journal = None
+
+        self._file = open(source or filepath, 'rb')
+        self.buffer = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        result = encoding_detect.detect(self.buffer[:encoding_detect.SAMPLE_SIZE])
+        self.binary = result.binary and encoding is None
+        self.encoding = encoding or result.encoding
+        self.encoding_confidence = 1.0 if encoding else result.confidence
+        self.line_ending = result.line_ending
+        self.mixed_line_endings = result.mixed_line_endings
+        self.codec = encoding_detect.codec_for(self.encoding)
+        separator = ('\r' if self.line_ending == 'Mac (CR)' else '\n').encode(self.codec)
+        bom = encoding_detect.bom_for(self.encoding)
+        bom = bom if self.buffer[:len(bom)] == bom else b''
+
+        self.window_start = 0   # 编辑器第 0 行对应的文件行号
+        self.window_lines = 0   # 编辑器中当前显示的行数
+        self._syncing = False
+
+        self.view = QsciScintilla()
+        self.view.setFont(QFont('Consolas', 12))
+        self.view.setReadOnly(True)
+        self.view.setCaretLineVisible(True)
+        self.view.setCaretLineBackgroundColor(QColor("#e8e8e8"))
+        self.view.setMarginType(0, QsciScintilla.TextMargin)
+        self.view.setVerticalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
+        self.view.SCN_UPDATEUI.connect(self.handleViewScrolled)
+
+        self.scrollBar = QScrollBar(Qt.Vertical)
+        self.scrollBar.setRange(0, 0)
+        self.scrollBar.valueChanged.connect(self.scrollToLine)
+
+        layout = QHBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.setSpacing(0)
+        layout.addWidget(self.view)
+        layout.addWidget(self.scrollBar)
+        self.setFocusProxy(self.view)
+
+        self.indexer = LineIndexer(self.buffer, separator, len(bom), self)
+        self.indexer.linesIndexed.connect(self.handleLinesIndexed)
+        self.indexer.loadFinished.connect(self.handleIndexFinished)
+        # 索引进行期间 loader 指向索引线程，与 Editor 的后台加载保持一致
+        self.loader = self.indexer
+
+    def startIndexing(self):
+        """开始在后台建立行索引"""
+        self.indexer.start()
+
+    def isReadOnly(self):
+        return True
+
+    def lineCount(self):
+        return self.indexer.lineCount()
+
+    def closeFile(self):
+        """停止索引并释放映射"""
+        self.indexer.cancel()
+        self.indexer.wait()
+        self.view.clear()
+        self.buffer.close()
+        self._file.close()
+        if self.source is not None:
+            try:
+                os.remove(self.source)
+            except OSError:
+                pass
+
+    def handleLinesIndexed(self, count):
+        """索引有进展时扩大滚动范围，并补全尚未显示的行"""
+        self.scrollBar.setRange(0, max(0, count - 1))
+        self.scrollBar.setPageStep(self.visibleLineCount())
+        if self.window_start + self.window_lines < min(count, self.window_start + WINDOW_LINES):
+            self.renderWindow(self.window_start)
+
+    def handleIndexFinished(self, cancelled):
+        self.loader = None
+
+    def visibleLineCount(self):
+        return max(1, self.view.SendScintilla(QsciScintilla.SCI_LINESONSCREEN))
+
+    def lineText(self, line):
+        """解码单行内容（不含换行符），超长行截断"""
+        offsets = self.indexer.offsets
+        start = offsets[line]
+        end = offsets[line + 1] if line + 1 < len(offsets) else len(self.buffer)
+        truncated = end - start > MAX_LINE_BYTES
+        data = self.buffer[start:start + MAX_LINE_BYTES] if truncated else self.buffer[start:end]
+        text = data.decode(self.codec, errors='replace').rstrip('\r\n')
+        return text + ' …' if truncated else text
+
+    def renderWindow(self, start):
+        """重新解码并显示从 start 开始的一段行，保持光标的绝对位置"""
+        total = self.lineCount()
+        start = max(0, min(start, total - WINDOW_LINES))
+        end = min(total, start + WINDOW_LINES)
+
+        caret_line, caret_index = self.view.getCursorPosition()
+        caret_line += self.window_start
+        first_visible = self.window_start + self.view.firstVisibleLine()
+
+        self._syncing = True
+        self.view.setText('\n'.join(self.lineText(i) for i in range(start, end)))
+        self.window_start = start
+        self.window_lines = end - start
+
+        digits = len(str(end))
+        self.view.setMarginWidth(0, '9' * (digits + 1))
+        for i in range(self.window_lines):
+            self.view.setMarginText(i, str(start + i + 1), 0)
+
+        if start <= caret_line < end:
+            self.view.setCursorPosition(caret_line - start, caret_index)
+        self.view.setFirstVisibleLine(max(0, first_visible - start))
+        self._syncing = False
+
+    def handleViewScrolled(self):
+        """编辑器内部滚动时同步外部滚动条，接近窗口边缘时重新定位窗口"""
+        if self._syncing:
+            return
+        first = self.view.firstVisibleLine()
+        absolute = self.window_start + first
+        near_top = first < WINDOW_MARGIN and self.window_start > 0
+        near_bottom = (first + self.visibleLineCount() > self.window_lines - WINDOW_MARGIN
+                       and self.window_start + self.window_lines < self.lineCount())
+        if near_top or near_bottom:
+            self.renderWindow(absolute - WINDOW_LINES // 2)
+        self._syncing = True
+        self.scrollBar.setValue(absolute)
+        self._syncing = False
+
+    def scrollToLine(self, line):
+        """把文件中第 line 行（从 0 开始）滚动到视口顶部"""
+        if self._syncing:
+            return
+        inside = (self.window_start <= line
+                  and line + self.visibleLineCount() <= self.window_start + self.window_lines)
+        if not inside:
+            self.renderWindow(line - WINDOW_LINES // 2)
+        self._syncing = True
+        self.view.setFirstVisibleLine(line - self.window_start)
+        self._syncing = False
+
+    def goToLine(self, line):
+        """跳转到第 line 行（从 0 开始）并把光标放在行首"""
+        line = max(0, min(line, self.lineCount() - 1))
+        self.scrollToLine(line)
+        self.scrollBar.setValue(line)
+        self.view.setCursorPosition(line - self.window_start, 0)
+        self.view.setFocus()
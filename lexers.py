@@ -0,0 +1,134 @@
+"""语法高亮注册表
+
+按扩展名、shebang 或 vim/emacs 模式行确定语言，再取得该语言的词法分析器。
+词法分析器类在第一次用到时才从 PyQt5.Qsci 中取出，配置好的内置词法分析器
+在同语言的所有标签页之间共用，打开 200 个 Python 文件只会构建一个
+QsciLexerPython。日志、JSON、CSV 使用 custom_lexers 中只给视口附近着色的
+自定义词法分析器，每个标签页单独构建。
+"""
+import importlib
+import os
+import re
+import time
+
+# 语言 -> 注册信息
+_registry = {}
+# 扩展名 -> 语言
+_extensions = {}
+# 解释器名称 / 模式行中的名称 -> 语言
+_aliases = {}
+# 已构建的共享词法分析器
+_shared = {}
+
+# 构建统计，便于比较优化前后的开销
+stats = {'created': 0, 'reused': 0, 'build_seconds': 0.0}
+
+SHEBANG_RE = re.compile(r'^#!\s*(?:\S*/)?(?:env\s+(?:-\S+\s+)*)?([A-Za-z]+)')
+VIM_MODELINE_RE = re.compile(r'\b(?:vi|vim|ex):.*?\b(?:ft|filetype|syntax)=([\w+-]+)')
+EMACS_MODELINE_RE = re.compile(r'-\*-\s*(?:.*?mode:\s*)?([\w+-]+)\s*;?.*?-\*-')
+# 只在文件开头这么多行中查找模式行
+MODELINE_LINES = 5
+
+
+def register_lexer(language, class_name=None, extensions=(), aliases=(), factory=None,
+                   shared=True):
+    """注册一种语言
+
+    class_name 为 PyQt5.Qsci 中的类名，第一次使用时才导入；也可以直接给出
+    factory(parent) 构建函数。shared 为 False 的词法分析器（例如自定义词法
+    分析器，需要绑定到具体的编辑器）每个标签页单独构建。
+    """
+    _registry[language] = {'class_name': class_name, 'factory': factory, 'shared': shared}
+    for ext in extensions:
+        _extensions[ext] = language
+    for alias in (language,) + tuple(aliases):
+        _aliases[alias] = language
+
+
+register_lexer('python', 'QsciLexerPython', ['.py', '.pyw'], ['py', 'python2', 'python3'])
+register_lexer('cpp', 'QsciLexerCPP', ['.c', '.cpp', '.h', '.hpp'], ['c', 'c++'])
+register_lexer('html', 'QsciLexerHTML', ['.html', '.htm'])
+register_lexer('javascript', 'QsciLexerJavaScript', ['.js'], ['js', 'node'])
+register_lexer('css', 'QsciLexerCSS', ['.css'])
+register_lexer('xml', 'QsciLexerXML', ['.xml'])
+register_lexer('sql', 'QsciLexerSQL', ['.sql'])
+register_lexer('bash', 'QsciLexerBash', ['.sh'], ['sh', 'zsh', 'ksh', 'shell-script'])
+register_lexer('ini', 'QsciLexerProperties', ['.ini', '.conf', '.cfg', '.properties'],
+               ['dosini', 'conf', 'properties'])
+
+
+def _custom(class_name):
+    """custom_lexers 中词法分析器的构建函数，第一次使用时才导入该模块"""
+    def factory(parent):
+        return getattr(importlib.import_module('custom_lexers'), class_name)(parent)
+    return factory
+
+
+register_lexer('log', extensions=['.log'], factory=_custom('LogLexer'), shared=False)
+register_lexer('json', extensions=['.json', '.jsonc', '.geojson'], aliases=['jsonc'],
+               factory=_custom('JsonLexer'), shared=False)
+register_lexer('csv', extensions=['.csv', '.tsv', '.tab'], aliases=['tsv'],
+               factory=_custom('CsvLexer'), shared=False)
+
+
+def _alias_language(name):
+    name = name.lower()
+    return _aliases.get(name) or _aliases.get(name.rstrip('0123456789.'))
+
+
+def language_for(filename, text=None):
+    """根据文件名和（可选的）文件开头内容确定语言，无法确定时返回 None"""
+    if filename:
+        language = _extensions.get(os.path.splitext(filename)[1].lower())
+        if language:
+            return language
+    if not text:
+        return None
+    lines = text[:4096].splitlines()[:MODELINE_LINES]
+    if lines:
+        match = SHEBANG_RE.match(lines[0])
+        if match:
+            language = _alias_language(match.group(1))
+            if language:
+                return language
+    for line in lines:
+        match = VIM_MODELINE_RE.search(line) or EMACS_MODELINE_RE.search(line)
+        if match:
+            language = _alias_language(match.group(1))
+            if language:
+                return language
+    return None
+
+
+def _build(language, font, parent):
+    entry = _registry[language]
+    start = time.perf_counter()
+    if entry['factory'] is not None:
+        lexer = entry['factory'](parent)
+    else:
+        lexer_class = getattr(importlib.import_module('PyQt5.Qsci'), entry['class_name'])
+        lexer = lexer_class(parent)
+    # 设置lexer的字体
+    lexer.setFont(font)
+    stats['created'] += 1
+    stats['build_seconds'] += time.perf_counter() - start
+    return lexer
+
+
+def get_lexer(language, font, editor):
+    """取得 language 的词法分析器
+
+    共享的词法分析器没有父对象，不随某个标签页一起销毁；其余的以 editor
+    为父对象。
+    """
+    entry = _registry.get(language)
+    if entry is None:
+        return None
+    if not entry['shared']:
+        return _build(language, font, editor)
+    lexer = _shared.get(language)
+    if lexer is None:
+        lexer = _shared[language] = _build(language, font, None)
+    else:
+        stats['reused'] += 1
+    return lexer
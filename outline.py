@@ -0,0 +1,463 @@
+"""大纲与转到符号（界面部分）
+
+SymbolIndex 为每个打开的文档维护符号分块（symbols 中的分析函数），文档
+修改后等待片刻，在后台线程中只重新分析修改过的行所在的块。分析期间继续
+编辑时，结果按期间的修改调整行号后再使用。OutlinePanel 是按层次显示当前
+文档符号的停靠面板，SymbolPopup 在所有打开的文档中模糊查找符号并跳转。
+
+symbols 导入时要编译各语言的正则表达式，在第一次 track 时才导入，不增加
+启动时间；其余用到它的地方都在有符号之后。
+"""
+import heapq
+
+from PyQt5.QtCore import QObject, QThread, QTimer, Qt, QEvent, pyqtSignal
+from PyQt5.QtWidgets import (QDockWidget, QWidget, QVBoxLayout, QFrame, QLineEdit,
+                             QTreeWidget, QTreeWidgetItem, QListWidget, QListWidgetItem)
+from PyQt5.Qsci import QsciScintilla
+
+import perf_profile
+from file_saver import snapshot_bytes
+
+# 停止输入后等待多久（毫秒）再重新分析
+REPARSE_DELAY = 500
+# 转到符号列表最多显示的结果数
+MAX_RESULTS = 200
+# 当前文档中的符号在转到符号中的加分
+CURRENT_DOCUMENT_BONUS = 15
+
+_TEXT_CHANGES = QsciScintilla.SC_MOD_INSERTTEXT | QsciScintilla.SC_MOD_DELETETEXT
+
+
+class SymbolParser(QThread):
+    """在后台线程中分析一个文档的快照"""
+    parseFinished = pyqtSignal()
+
+    def __init__(self, language, data, chunks, first, last, parent=None):
+        super().__init__(parent)
+        self.language = language
+        self.data = data
+        self.chunks = chunks  # 上次的分块（已按修改调整），None 表示分析整个文档
+        self.first = first
+        self.last = last
+        self.result = None    # 分析得到的分块，被取消时为 None
+        self._cancelled = False
+
+    def cancel(self):
+        self._cancelled = True
+
+    def run(self):
+        import symbols
+        lines = symbols.split_lines(self.data.decode('utf-8', errors='replace'))
+        self.data = None
+        try:
+            self.result = symbols.parse_document(self.language, lines, self.chunks,
+                                                 self.first, self.last,
+                                                 lambda: self._cancelled)
+        except symbols.Cancelled:
+            self.result = None
+        self.parseFinished.emit()
+
+
+class DocumentSymbols(QObject):
+    """一个编辑器的符号分块，跟随修改调整行号并记录需要重新分析的行"""
+    def __init__(self, index, editor):
+        super().__init__(editor)
+        self.index = index
+        self.editor = editor
+        self.language = None
+        self.chunks = None       # None 表示还没有分析过
+        self.dirty = None        # 需要重新分析的行范围 (first, last)
+        self.full = True         # 需要分析整个文档
+        self.edits = None        # 分析期间的修改 [(行, 增加的行数)]，不在分析时为 None
+        self.cached = None       # document_symbols 的结果
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(REPARSE_DELAY)
+        self.timer.timeout.connect(lambda: self.index.schedule(self))
+        editor.SCN_MODIFIED.connect(self.handleModified)
+
+    def detach(self):
+        self.timer.stop()
+        self.editor.SCN_MODIFIED.disconnect(self.handleModified)
+
+    def handleModified(self, position, modification_type, text, length, lines_added, *args):
+        if not modification_type & _TEXT_CHANGES:
+            return
+        if self.editor.loader is not None:
+            # 加载（重新加载）中的文本在加载完成后整体分析
+            self.full = True
+            return
+        import symbols
+        line = self.editor.SendScintilla(QsciScintilla.SCI_LINEFROMPOSITION, position)
+        if lines_added:
+            if self.chunks is not None:
+                self.chunks = symbols.shift_chunks(self.chunks, line, lines_added)
+                self.cached = None
+            if self.edits is not None:
+                self.edits.append((line, lines_added))
+            if self.dirty is not None:
+                self.dirty = (symbols.shift_line(self.dirty[0], line, lines_added),
+                              symbols.shift_line(self.dirty[1], line, lines_added))
+        first, last = symbols.edited_lines(line, lines_added)
+        if self.dirty is None:
+            self.dirty = (first, last)
+        else:
+            self.dirty = (min(self.dirty[0], first), max(self.dirty[1], last))
+        self.timer.start()
+
+    def resync(self):
+        """修改通知被关闭过（全部替换等），下次分析整个文档"""
+        self.full = True
+        self.timer.start()
+
+    def symbols(self):
+        """[(行号, Symbol)]，按行号排序"""
+        if self.cached is None:
+            import symbols
+            self.cached = list(symbols.document_symbols(self.chunks or []))
+        return self.cached
+
+
+class SymbolIndex(QObject):
+    """所有打开的文档的符号索引，同一时间只在一个后台线程中分析一个文档"""
+    symbolsChanged = pyqtSignal(object)  # 符号有变化的编辑器
+
+    def __init__(self, window):
+        super().__init__(window)
+        self.window = window
+        self.queue = []        # 等待分析的 DocumentSymbols
+        self.parser = None
+        self.parsing = None    # 正在分析的 DocumentSymbols
+        # 窗口被删除时先于子对象发出 destroyed，此时停止分析线程，线程不会随窗口被删除
+        window.destroyed.connect(self.shutdown)
+
+    def track(self, editor):
+        """开始为 editor 建立索引；已在索引中时检查语言和内容是否需要重新分析"""
+        import symbols
+        language = getattr(editor, 'language', None)
+        supported = (language in symbols.LANGUAGES and editor.loader is None
+                     and editor.profile != perf_profile.HUGE)
+        entry = getattr(editor, 'symbols', None)
+        if not supported:
+            if entry is not None:
+                self.discard(editor)
+                self.symbolsChanged.emit(editor)
+            return
+        if entry is None:
+            entry = editor.symbols = DocumentSymbols(self, editor)
+        elif entry.language == language and not entry.full:
+            return
+        entry.full = True
+        self.schedule(entry)
+
+    def discard(self, editor):
+        """editor 关闭或被替换时移出索引"""
+        entry = getattr(editor, 'symbols', None)
+        if entry is None:
+            return
+        entry.detach()
+        editor.symbols = None
+        if entry in self.queue:
+            self.queue.remove(entry)
+        if entry is self.parsing:
+            # 编辑器（以及窗口）随后可能被删除，等分析线程结束再继续
+            self.stopParser()
+            self.startNext()
+
+    def schedule(self, entry):
+        """把 entry 加入分析队列，当前标签排在最前"""
+        if entry is self.parsing and entry.dirty is None and not entry.full:
+            return
+        if entry not in self.queue:
+            if entry.editor is self.window.currentEditor():
+                self.queue.insert(0, entry)
+            else:
+                self.queue.append(entry)
+        self.startNext()
+
+    def startNext(self):
+        while self.parser is None and self.queue:
+            entry = self.queue.pop(0)
+            editor = entry.editor
+            if editor.loader is not None:
+                # 加载完成后重新加入
+                continue
+            language = editor.language
+            full = entry.full or entry.chunks is None or language != entry.language
+            first, last = entry.dirty or (0, 0)
+            if not full and entry.dirty is None:
+                continue
+            entry.language = language
+            entry.full = False
+            entry.dirty = None
+            entry.edits = []
+            chunks = None if full else list(entry.chunks)
+            parser = SymbolParser(language, snapshot_bytes(editor), chunks, first, last, self)
+            parser.parseFinished.connect(lambda: self.handleFinished(parser))
+            self.parser = parser
+            self.parsing = entry
+            parser.start()
+
+    def handleFinished(self, parser):
+        import symbols
+        parser.wait()
+        parser.deleteLater()
+        entry = self.parsing
+        self.parser = None
+        self.parsing = None
+        if entry is not None:
+            if parser.result is None or entry.full:
+                # 被取消，或分析期间有没有通知的修改，结果对不上文档
+                entry.full = True
+            else:
+                chunks = parser.result
+                for line, added in entry.edits:
+                    chunks = symbols.shift_chunks(chunks, line, added)
+                entry.chunks = chunks
+                entry.cached = None
+                self.symbolsChanged.emit(entry.editor)
+            entry.edits = None
+        self.startNext()
+
+    def symbols(self, editor):
+        """editor 的 [(行号, Symbol)]，没有索引时为空列表"""
+        entry = getattr(editor, 'symbols', None)
+        return entry.symbols() if entry is not None else []
+
+    def allSymbols(self):
+        """按标签顺序产生 (编辑器, 行号, Symbol)"""
+        tabs = self.window.tabs
+        for i in range(tabs.count()):
+            editor = tabs.widget(i)
+            for line, symbol in self.symbols(editor):
+                yield editor, line, symbol
+
+    def stopParser(self):
+        """取消正在进行的分析并等待线程结束，丢弃结果"""
+        parser = self.parser
+        parser.parseFinished.disconnect()
+        parser.cancel()
+        parser.wait()
+        parser.deleteLater()
+        if self.parsing is not None:
+            self.parsing.edits = None
+            self.parsing.full = True
+        self.parser = None
+        self.parsing = None
+
+    def shutdown(self):
+        """停止分析：退出、关闭窗口或窗口被删除时调用"""
+        self.queue.clear()
+        if self.parser is not None:
+            self.stopParser()
+
+
+def symbol_text(symbol):
+    """符号在列表中的说明：种类和外层名称"""
+    import symbols
+    kind = symbols.KIND_NAMES.get(symbol.kind, symbol.kind)
+    return f'{kind} · {symbol.container}' if symbol.container else kind
+
+
+class OutlinePanel(QDockWidget):
+    """按层次显示当前文档符号的停靠面板，双击跳到定义"""
+    def __init__(self, window):
+        super().__init__('大纲', window)
+        self.window = window
+        self.setObjectName('outline')
+        self.editor = None   # 树中显示的是哪个编辑器的符号
+        self.shape = None    # 树中各符号的 (名称, 种类, 深度)，筛选时为 None
+        self.items = []      # 与 shape 对应的条目
+
+        content = QWidget(self)
+        layout = QVBoxLayout(content)
+        layout.setContentsMargins(2, 2, 2, 2)
+        self.filterEdit = QLineEdit(content)
+        self.filterEdit.setPlaceholderText('筛选符号')
+        self.filterEdit.setClearButtonEnabled(True)
+        self.filterEdit.textChanged.connect(self.refresh)
+        self.filterEdit.returnPressed.connect(self.openFirst)
+        layout.addWidget(self.filterEdit)
+        self.tree = QTreeWidget(content)
+        self.tree.setHeaderHidden(True)
+        self.tree.setUniformRowHeights(True)
+        self.tree.itemActivated.connect(self.openSymbol)
+        layout.addWidget(self.tree, 1)
+        self.setWidget(content)
+
+        window.symbolIndex.symbolsChanged.connect(self.handleSymbolsChanged)
+        window.tabs.currentChanged.connect(self.refresh)
+        self.visibilityChanged.connect(self.refresh)
+
+    def handleSymbolsChanged(self, editor):
+        if editor is self.window.currentEditor():
+            self.refresh()
+
+    def refresh(self):
+        """重建当前文档的符号树；筛选时按匹配程度列出
+
+        符号的名称和层次都没有变化时（大多数编辑只移动了行号）只更新条目中
+        保存的位置，不重建树，展开状态和滚动位置保持不变。
+        """
+        if not self.isVisible():
+            return
+        import symbols
+        editor = self.window.currentEditor()
+        entries = self.window.symbolIndex.symbols(editor)
+        query = self.filterEdit.text().strip().lower()
+        shape = None if query else [(symbol.name, symbol.kind, symbol.depth)
+                                    for _, symbol in entries]
+        if shape is not None and editor is self.editor and shape == self.shape:
+            for item, (line, symbol) in zip(self.items, entries):
+                item.setData(0, Qt.UserRole, (line, symbol.column))
+            return
+        self.editor = editor
+        self.shape = shape
+        self.items = []
+        scroll = self.tree.verticalScrollBar().value()
+        self.tree.setUpdatesEnabled(False)
+        self.tree.clear()
+        if query:
+            scored = []
+            for line, symbol in entries:
+                score = symbols.fuzzy_score(query, symbol.name)
+                if score is not None:
+                    scored.append((-score, line, symbol))
+            scored.sort(key=lambda item: item[:2])
+            self.tree.addTopLevelItems([self.createItem(line, symbol, True)
+                                        for _, line, symbol in scored[:MAX_RESULTS]])
+        else:
+            parents = []  # parents[深度] 为该深度最近的条目
+            top = []
+            for line, symbol in entries:
+                item = self.createItem(line, symbol, False)
+                depth = min(symbol.depth, len(parents))
+                del parents[depth:]
+                if depth:
+                    parents[depth - 1].addChild(item)
+                else:
+                    top.append(item)
+                parents.append(item)
+                self.items.append(item)
+            self.tree.addTopLevelItems(top)
+            self.tree.expandAll()
+            self.tree.verticalScrollBar().setValue(scroll)
+        self.tree.setUpdatesEnabled(True)
+
+    def createItem(self, line, symbol, flat):
+        text = f'{symbol.name}  ({symbol_text(symbol)})' if flat else symbol.name
+        item = QTreeWidgetItem([text])
+        item.setToolTip(0, symbol_text(symbol))
+        item.setData(0, Qt.UserRole, (line, symbol.column))
+        return item
+
+    def showPanel(self):
+        self.show()
+        self.raise_()
+        self.filterEdit.setFocus()
+        self.filterEdit.selectAll()
+
+    def openFirst(self):
+        item = self.tree.topLevelItem(0)
+        if item is not None:
+            self.openSymbol(item)
+
+    def openSymbol(self, item):
+        line, column = item.data(0, Qt.UserRole)
+        if self.editor is not None:
+            self.window.showSymbol(self.editor, line, column)
+
+
+class SymbolPopup(QFrame):
+    """在所有打开的文档中模糊查找符号的弹出框"""
+    def __init__(self, window):
+        super().__init__(window, Qt.Popup)
+        self.window = window
+        self.setFrameShape(QFrame.StyledPanel)
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(4, 4, 4, 4)
+        self.edit = QLineEdit(self)
+        self.edit.setPlaceholderText('输入符号名称，按字母顺序模糊匹配')
+        self.edit.textChanged.connect(self.updateResults)
+        self.edit.installEventFilter(self)
+        layout.addWidget(self.edit)
+        self.list = QListWidget(self)
+        self.list.setUniformItemSizes(True)
+        self.list.itemActivated.connect(self.openItem)
+        layout.addWidget(self.list)
+        window.symbolIndex.symbolsChanged.connect(self.handleSymbolsChanged)
+
+    def popup(self):
+        """在窗口上方居中显示"""
+        editor = self.window.currentEditor()
+        if editor is not None and hasattr(editor, 'hasSelectedText') and editor.hasSelectedText():
+            selected = editor.selectedText()
+            self.edit.setText(selected if '\n' not in selected else '')
+        else:
+            self.edit.clear()
+        width = min(640, max(360, self.window.width() * 2 // 3))
+        height = min(420, max(200, self.window.height() // 2))
+        self.resize(width, height)
+        top_left = self.window.mapToGlobal(self.window.rect().topLeft())
+        self.move(top_left.x() + (self.window.width() - width) // 2, top_left.y() + 60)
+        self.updateResults()
+        self.show()
+        self.edit.setFocus()
+        self.edit.selectAll()
+
+    def handleSymbolsChanged(self, editor):
+        if self.isVisible():
+            self.updateResults()
+
+    def updateResults(self):
+        index = self.window.symbolIndex
+        current = self.window.currentEditor()
+        query = self.edit.text().strip().lower()
+        if query:
+            import symbols
+            matcher = symbols.fuzzy_regex(query).search
+            candidates = []
+            for editor, line, symbol in index.allSymbols():
+                if not matcher(symbol.name):
+                    continue
+                score = symbols.fuzzy_score(query, symbol.name)
+                if score is not None:
+                    if editor is current:
+                        score += CURRENT_DOCUMENT_BONUS
+                    candidates.append((score, -line, editor, line, symbol))
+            results = [item[2:] for item in
+                       heapq.nlargest(MAX_RESULTS, candidates, key=lambda item: item[:2])]
+        else:
+            results = [(current, line, symbol)
+                       for line, symbol in index.symbols(current)[:MAX_RESULTS]]
+        self.list.setUpdatesEnabled(False)
+        self.list.clear()
+        for editor, line, symbol in results:
+            item = QListWidgetItem(f'{symbol.name}    {symbol_text(symbol)} · '
+                                   f'{editor.title}:{line + 1}')
+            item.setData(Qt.UserRole, (editor, line, symbol.column))
+            self.list.addItem(item)
+        self.list.setCurrentRow(0)
+        self.list.setUpdatesEnabled(True)
+
+    def eventFilter(self, obj, event):
+        """输入框中的上下键、翻页键移动列表中的选择，回车跳转，Esc 关闭"""
+        if obj is self.edit and event.type() == QEvent.KeyPress:
+            key = event.key()
+            if key in (Qt.Key_Up, Qt.Key_Down, Qt.Key_PageUp, Qt.Key_PageDown):
+                QListWidget.keyPressEvent(self.list, event)
+                return True
+            if key in (Qt.Key_Return, Qt.Key_Enter):
+                item = self.list.currentItem()
+                if item is not None:
+                    self.openItem(item)
+                return True
+            if key == Qt.Key_Escape:
+                self.hide()
+                return True
+        return super().eventFilter(obj, event)
+
+    def openItem(self, item):
+        editor, line, column = item.data(Qt.UserRole)
+        self.hide()
+        self.window.showSymbol(editor, line, column)
@@ -0,0 +1,165 @@
+"""性能面板
+
+停靠在主窗口的面板，显示每个标签的内存估算、最近一次加载和保存的吞吐量、
+事件循环卡顿以及按键处理耗时的 p50/p99，并可以把记录导出为 Chrome Trace。
+面板打开时才开始记录（除非设置了 TEXTEDITOR_PERF=1）。
+"""
+import time
+
+from PyQt5.QtCore import QObject, QTimer, Qt
+from PyQt5.QtGui import QFont
+from PyQt5.QtWidgets import (QDockWidget, QWidget, QVBoxLayout, QHBoxLayout, QLabel,
+                             QPushButton, QFileDialog, QMessageBox)
+
+import perf_trace
+from tab_hibernation import estimate_memory
+
+# 检查事件循环是否卡顿的间隔（毫秒）
+HEARTBEAT_INTERVAL = 50
+# 心跳迟到超过该时间（秒）算一次卡顿
+STALL_THRESHOLD = 0.1
+# 面板刷新间隔（毫秒）
+REFRESH_INTERVAL = 1000
+# 面板中列出的计时器
+SHOWN_TIMERS = ('openFile', 'saveFile', 'setText', 'handleTextChanged', 'keystroke',
+                'updateTabTitle', 'updateStatusBar', 'saveWindowState', 'ui.flush',
+                'editor.paint')
+
+
+class StallMonitor(QObject):
+    """用定时心跳检测事件循环卡顿：心跳迟到的时间就是界面没有响应的时间"""
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._timer = QTimer(self)
+        self._timer.setInterval(HEARTBEAT_INTERVAL)
+        self._timer.timeout.connect(self.beat)
+        self._last = None
+
+    def start(self):
+        self._last = time.perf_counter()
+        self._timer.start()
+
+    def stop(self):
+        self._timer.stop()
+
+    def beat(self):
+        now = time.perf_counter()
+        expected = self._last + HEARTBEAT_INTERVAL / 1000
+        if now - expected >= STALL_THRESHOLD:
+            perf_trace.record('event loop stall', expected, now - expected, category='stall')
+        self._last = now
+
+
+def format_ms(seconds):
+    return f'{seconds * 1000:.1f}'
+
+
+def format_mb(nbytes):
+    return f'{nbytes / (1024 * 1024):.1f} MB'
+
+
+class PerfHud(QDockWidget):
+    """性能面板"""
+    def __init__(self, window):
+        super().__init__('性能', window)
+        self.window = window
+        self.setObjectName('perfHud')
+        self.stall_monitor = StallMonitor(self)
+
+        content = QWidget(self)
+        layout = QVBoxLayout(content)
+        self.label = QLabel(content)
+        self.label.setFont(QFont('Consolas', 9))
+        self.label.setTextInteractionFlags(Qt.TextSelectableByMouse)
+        self.label.setAlignment(Qt.AlignTop | Qt.AlignLeft)
+        layout.addWidget(self.label, 1)
+
+        buttons = QHBoxLayout()
+        exportButton = QPushButton('导出 Chrome Trace...', content)
+        exportButton.clicked.connect(self.exportTrace)
+        resetButton = QPushButton('清空', content)
+        resetButton.clicked.connect(self.resetStats)
+        buttons.addWidget(exportButton)
+        buttons.addWidget(resetButton)
+        buttons.addStretch(1)
+        layout.addLayout(buttons)
+        self.setWidget(content)
+
+        self.refresh_timer = QTimer(self)
+        self.refresh_timer.setInterval(REFRESH_INTERVAL)
+        self.refresh_timer.timeout.connect(self.refresh)
+        self.visibilityChanged.connect(self.handleVisibilityChanged)
+
+    def handleVisibilityChanged(self, visible):
+        """面板可见时记录并刷新，隐藏后停止（环境变量打开的记录保持不变）"""
+        perf_trace.set_enabled(visible or perf_trace.ENV_ENABLED)
+        if visible:
+            self.stall_monitor.start()
+            self.refresh_timer.start()
+            self.refresh()
+        else:
+            self.stall_monitor.stop()
+            self.refresh_timer.stop()
+
+    def resetStats(self):
+        perf_trace.reset()
+        self.refresh()
+
+    def exportTrace(self):
+        fname, _ = QFileDialog.getSaveFileName(self, '导出 Chrome Trace', 'trace.json',
+                                               'JSON 文件 (*.json);;所有文件 (*)')
+        if not fname:
+            return
+        try:
+            count = perf_trace.export_chrome_trace(fname)
+        except OSError as e:
+            QMessageBox.warning(self, '错误', f'导出失败：{str(e)}')
+            return
+        self.window.statusBar.showMessage(f'已导出 {count} 个事件', 3000)
+
+    def memoryLines(self):
+        lines = []
+        total = 0
+        tabs = self.window.tabs
+        for index in range(tabs.count()):
+            editor = tabs.widget(index)
+            if self.window.isLoadedEditor(editor):
+                size = estimate_memory(editor)
+                total += size
+                lines.append(f'  {tabs.tabText(index)[:24]:<24} {format_mb(size):>10}')
+            else:
+                lines.append(f'  {tabs.tabText(index)[:24]:<24} {"未加载":>10}')
+        lines.insert(0, f'标签内存估算：{format_mb(total)}')
+        return lines
+
+    def refresh(self):
+        lines = self.memoryLines()
+        lines.append('')
+        for kind, name in (('load', '加载'), ('save', '保存')):
+            mbps = perf_trace.throughput(kind)
+            lines.append(f'最近{name}：{"-" if mbps is None else f"{mbps:.1f} MB/s"}')
+
+        stall = perf_trace.timer('event loop stall')
+        if stall:
+            lines.append(f'事件循环卡顿：{stall.count} 次，最长 {format_ms(stall.max)} ms')
+        else:
+            lines.append('事件循环卡顿：0 次')
+
+        keystroke = perf_trace.timer('keystroke')
+        if keystroke:
+            lines.append(f'按键处理：p50 {format_ms(keystroke.percentile(50))} ms'
+                         f'  p99 {format_ms(keystroke.percentile(99))} ms')
+
+        lines.append('')
+        lines.append(f'{"计时器":<20}{"次数":>8}{"总计ms":>10}{"p99 ms":>9}{"最长ms":>9}')
+        for name in SHOWN_TIMERS:
+            stats = perf_trace.timer(name)
+            if stats:
+                lines.append(f'{name:<20}{stats.count:>8}{format_ms(stats.total):>10}'
+                             f'{format_ms(stats.percentile(99)):>9}{format_ms(stats.max):>9}')
+        counters = perf_trace.counters()
+        if counters:
+            lines.append('')
+            for name, value in sorted(counters.items()):
+                lines.append(f'{name:<20}{value:>8}')
+        self.label.setText('\n'.join(lines))
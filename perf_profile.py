@@ -0,0 +1,107 @@
+"""大文档性能档位
+
+根据文件大小、行数和最长行的长度为每个标签页选择一个档位，档位越高关闭
+的昂贵功能越多（自动换行、缩进参考线、括号匹配、当前行高亮、语法高亮）。
+加载时和大段粘贴后会重新评估，状态栏可以一键强制使用完整功能。
+"""
+from PyQt5.QtWidgets import QToolButton, QMenu, QAction
+from PyQt5.Qsci import QsciScintilla
+
+FULL = 'full'
+LARGE = 'large'
+HUGE = 'huge'
+
+PROFILE_NAMES = {
+    FULL: '完整',
+    LARGE: '大文件',
+    HUGE: '超大文件',
+}
+
+# (字节数, 行数, 最长行字符数)，任意一项达到即进入该档位
+LARGE_LIMITS = (8 * 1024 * 1024, 200000, 5000)
+HUGE_LIMITS = (64 * 1024 * 1024, 2000000, 100000)
+
+# 文本长度变化超过该字节数时重新评估档位（例如大段粘贴）
+REEVALUATE_BYTES = 1024 * 1024
+# 粘贴后最多逐行检查多少行的长度
+MAX_SCANNED_LINES = 100000
+
+
+def choose_profile(size, lines=0, longest_line=0):
+    """根据文档规模选择档位"""
+    metrics = (size, lines, longest_line)
+    if any(m >= limit for m, limit in zip(metrics, HUGE_LIMITS)):
+        return HUGE
+    if any(m >= limit for m, limit in zip(metrics, LARGE_LIMITS)):
+        return LARGE
+    return FULL
+
+
+def longest_line_in(editor, first_line, last_line):
+    """first_line 到 last_line 之间最长行的字节数，行数过多时只检查末尾部分"""
+    first_line = max(first_line, last_line - MAX_SCANNED_LINES)
+    line_length = editor.SendScintilla
+    return max((line_length(QsciScintilla.SCI_LINELENGTH, line)
+                for line in range(first_line, last_line + 1)), default=0)
+
+
+def apply_profile(editor, profile):
+    """按档位开关编辑器的昂贵功能"""
+    full = profile == FULL
+    editor.setWrapMode(QsciScintilla.WrapWord if full else QsciScintilla.WrapNone)
+    editor.setIndentationGuides(full)
+    editor.setBraceMatching(QsciScintilla.SloppyBraceMatch if profile != HUGE
+                            else QsciScintilla.NoBraceMatch)
+    editor.setCaretLineVisible(profile != HUGE)
+    # 大文件只同步着色可见部分，其余在空闲时完成
+    editor.SendScintilla(QsciScintilla.SCI_SETIDLESTYLING,
+                         QsciScintilla.SC_IDLESTYLING_NONE if full
+                         else QsciScintilla.SC_IDLESTYLING_ALL)
+    if profile == HUGE:
+        if editor.lexer() is not None:
+            editor.setLexer(None)
+            editor.setFont(editor.font)
+    elif editor.lexer() is None and editor.filepath:
+        editor.set_lexer_by_filename(editor.filepath)
+
+
+class ProfileButton(QToolButton):
+    """状态栏中的档位按钮：单击在"自动"和"完整"之间切换，菜单中可选择任意档位"""
+    def __init__(self, window, parent=None):
+        super().__init__(parent)
+        self.window = window
+        self.setAutoRaise(True)
+        self.setPopupMode(QToolButton.MenuButtonPopup)
+        self.clicked.connect(self.toggleOverride)
+
+        menu = QMenu(self)
+        auto_action = QAction('自动', self)
+        auto_action.triggered.connect(lambda: self.setOverride(None))
+        menu.addAction(auto_action)
+        for profile, name in PROFILE_NAMES.items():
+            action = QAction(name, self)
+            action.triggered.connect(lambda checked, p=profile: self.setOverride(p))
+            menu.addAction(action)
+        self.setMenu(menu)
+
+    def showProfile(self, editor):
+        """显示 editor 当前的档位"""
+        if editor.profile_override is not None:
+            self.setText(f'性能: {PROFILE_NAMES[editor.profile]} (手动)')
+        else:
+            self.setText(f'性能: {PROFILE_NAMES[editor.profile]}')
+        self.setToolTip('单击在自动档位和完整功能之间切换')
+
+    def toggleOverride(self):
+        editor = self.window.currentEditor()
+        if editor is None or editor.profile is None:
+            return
+        self.setOverride(None if editor.profile_override is not None else FULL)
+
+    def setOverride(self, profile):
+        editor = self.window.currentEditor()
+        if editor is None or editor.profile is None:
+            return
+        editor.profile_override = profile
+        editor.evaluateProfile()
+        self.window.updateStatusBar()
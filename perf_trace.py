@@ -0,0 +1,199 @@
+"""热点路径的计时和计数
+
+用 @timed(name) 装饰要测量的函数，或者用 with span(name): 包住一段代码。
+关闭时（默认）装饰器只多一次全局变量判断，span() 返回一个共享的空对象。
+打开后记录每次调用的耗时，按名称汇总次数、总耗时和分位数，并保留最近的
+事件，可以导出为 Chrome Trace（chrome://tracing 或 Perfetto）格式的 JSON。
+
+设置环境变量 TEXTEDITOR_PERF=1 时启动即开始记录，否则在性能面板打开时记录。
+"""
+import functools
+import json
+import os
+import threading
+import time
+from collections import deque
+
+ENV_VAR = 'TEXTEDITOR_PERF'
+ENV_ENABLED = os.environ.get(ENV_VAR) == '1'
+
+# 保留的最近事件数（导出 Chrome Trace 用）
+MAX_EVENTS = 200000
+# 每个计时器保留的最近样本数（计算分位数用）
+MAX_SAMPLES = 2000
+
+_enabled = ENV_ENABLED
+_origin = time.perf_counter()
+_events = deque(maxlen=MAX_EVENTS)  # (名称, 类别, 开始秒, 持续秒, 线程, 参数)
+_timers = {}
+_counters = {}
+_throughput = {}  # 类别 -> (字节数, 秒)
+
+
+class TimerStats:
+    """一个计时器的汇总"""
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.samples = deque(maxlen=MAX_SAMPLES)
+
+    def add(self, duration):
+        self.count += 1
+        self.total += duration
+        if duration > self.max:
+            self.max = duration
+        self.samples.append(duration)
+
+    def percentile(self, p):
+        """最近样本的 p 分位数（秒），没有样本时为 0"""
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+
+def enabled():
+    return _enabled
+
+
+def set_enabled(flag):
+    global _enabled
+    _enabled = bool(flag)
+
+
+def reset():
+    """清空所有记录"""
+    _events.clear()
+    _timers.clear()
+    _counters.clear()
+    _throughput.clear()
+
+
+def record(name, start, duration, category='timer', args=None):
+    """记录一次耗时，start 和 duration 以 time.perf_counter() 的秒为单位"""
+    if not _enabled:
+        return
+    stats = _timers.get(name)
+    if stats is None:
+        stats = _timers[name] = TimerStats()
+    stats.add(duration)
+    _events.append((name, category, start, duration, threading.get_ident(), args))
+
+
+def count(name, n=1):
+    """计数器加 n"""
+    if not _enabled:
+        return
+    value = _counters.get(name, 0) + n
+    _counters[name] = value
+    _events.append((name, 'counter', time.perf_counter(), None, threading.get_ident(), value))
+
+
+def record_throughput(kind, nbytes, seconds):
+    """记录最近一次加载或保存的数据量和耗时"""
+    if not _enabled or seconds <= 0:
+        return
+    _throughput[kind] = (nbytes, seconds)
+
+
+def throughput(kind):
+    """最近一次的吞吐量（MB/s），没有记录时为 None"""
+    if kind not in _throughput:
+        return None
+    nbytes, seconds = _throughput[kind]
+    return nbytes / (1024 * 1024) / seconds
+
+
+def timer(name):
+    return _timers.get(name)
+
+
+def timers():
+    return dict(_timers)
+
+
+def counters():
+    return dict(_counters)
+
+
+def events(category=None):
+    return [e for e in _events if category is None or e[1] == category]
+
+
+class _Span:
+    def __init__(self, name, args):
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        record(self.name, self.start, time.perf_counter() - self.start, args=self.args)
+        return False
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def span(name, **args):
+    """计时一段代码：with span('name'): ..."""
+    if not _enabled:
+        return _NULL_SPAN
+    return _Span(name, args or None)
+
+
+def timed(name):
+    """计时装饰器
+
+    注意：被装饰的方法不能直接连接到带参数的信号（例如 QAction.triggered），
+    PyQt 会把信号参数传给包装函数，应改用 lambda 连接。
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                record(name, start, time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+def chrome_trace():
+    """把记录的事件转换为 Chrome Trace Event 格式"""
+    pid = os.getpid()
+    trace = []
+    for name, category, start, duration, tid, args in list(_events):
+        ts = (start - _origin) * 1e6
+        if category == 'counter':
+            trace.append({'name': name, 'ph': 'C', 'ts': ts, 'pid': pid, 'tid': tid,
+                          'args': {name: args}})
+            continue
+        event = {'name': name, 'cat': category, 'ph': 'X', 'ts': ts,
+                 'dur': duration * 1e6, 'pid': pid, 'tid': tid}
+        if args:
+            event['args'] = args
+        trace.append(event)
+    return {'traceEvents': trace, 'displayTimeUnit': 'ms'}
+
+
+def export_chrome_trace(path):
+    """导出为 JSON 文件，返回事件数"""
+    data = chrome_trace()
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+    return len(data['traceEvents'])
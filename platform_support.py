@@ -0,0 +1,150 @@
+"""平台相关功能（Windows 注册表右键菜单、全局热键、任务栏图标）
+
+只有在 Windows 上才会导入 winreg 和 ctypes.wintypes；其他平台上这些功能
+都是空操作，编辑器本身可以在 Linux 上（包括无界面环境）正常导入和运行。
+"""
+import os
+import sys
+
+from PyQt5.QtCore import QAbstractNativeEventFilter
+
+IS_WINDOWS = sys.platform == 'win32'
+
+# Windows 热键常量
+MOD_ALT = 0x0001
+MOD_CONTROL = 0x0002
+MOD_SHIFT = 0x0004
+MOD_WIN = 0x0008
+WM_HOTKEY = 0x0312
+
+CONTEXT_MENU_KEY = "*\\shell\\TextEditor"
+
+
+class GlobalHotkeyFilter(QAbstractNativeEventFilter):
+    """全局热键事件过滤器"""
+    def __init__(self, callback):
+        super().__init__()
+        self.callback = callback
+
+    def nativeEventFilter(self, eventType, message):
+        if eventType == "windows_generic_MSG":
+            from ctypes import wintypes
+            msg = wintypes.MSG.from_address(message.__int__())
+            if msg.message == WM_HOTKEY:
+                self.callback()
+                return True, 0
+        return False, 0
+
+
+def is_admin():
+    """检查是否具有管理员权限"""
+    if not IS_WINDOWS:
+        return False
+    try:
+        import ctypes
+        return ctypes.windll.shell32.IsUserAnAdmin()
+    except:
+        return False
+
+
+def set_app_user_model_id(app_id):
+    """设置 AppUserModelID 以确保任务栏图标正确显示（Windows 7及以上）"""
+    if not IS_WINDOWS:
+        return
+    try:
+        import ctypes
+        ctypes.windll.shell32.SetCurrentProcessExplicitAppUserModelID(app_id)
+    except:
+        pass
+
+
+def register_hotkey(hwnd, hotkey_id, modifiers, vk_code):
+    """注册全局热键，返回是否成功"""
+    if not IS_WINDOWS:
+        return False
+    import ctypes
+    # 先尝试注销可能存在的旧热键
+    ctypes.windll.user32.UnregisterHotKey(hwnd, hotkey_id)
+    return bool(ctypes.windll.user32.RegisterHotKey(hwnd, hotkey_id, modifiers, vk_code))
+
+
+def unregister_hotkey(hwnd, hotkey_id):
+    """注销全局热键"""
+    if not IS_WINDOWS:
+        return
+    try:
+        import ctypes
+        ctypes.windll.user32.UnregisterHotKey(hwnd, hotkey_id)
+    except:
+        # 忽略注销失败的错误
+        pass
+
+
+def _context_menu_command():
+    """右键菜单要执行的命令"""
+    exe_path = sys.executable if getattr(sys, 'frozen', False) else sys.argv[0]
+    return f'"{exe_path}" "%1"'  # 添加引号以处理路径中的空格
+
+
+def context_menu_installed():
+    """右键菜单是否已经注册且命令指向当前程序"""
+    if not IS_WINDOWS:
+        return False
+    import winreg
+    try:
+        with winreg.OpenKey(winreg.HKEY_CLASSES_ROOT, CONTEXT_MENU_KEY + "\\command") as key:
+            return winreg.QueryValue(key, "") == _context_menu_command()
+    except OSError:
+        return False
+
+
+def add_context_menu(icon_path=None):
+    """添加右键菜单"""
+    if not IS_WINDOWS:
+        return False
+    import winreg
+    try:
+        # 为所有文件添加右键菜单
+        key = winreg.CreateKey(winreg.HKEY_CLASSES_ROOT, CONTEXT_MENU_KEY)
+
+        # 设置默认值
+        winreg.SetValue(key, "", winreg.REG_SZ, "TextEditor Context menu")
+
+        # 设置显示的文本
+        winreg.SetValueEx(key, "MUIVerb", 0, winreg.REG_SZ, "使用文本编辑器打开(&T)")
+
+        # 设置图标
+        if getattr(sys, 'frozen', False):
+            # 如果是打包后的exe，使用exe本身作为图标源
+            winreg.SetValueEx(key, "Icon", 0, winreg.REG_SZ, f'"{sys.executable}",0')
+        elif icon_path and os.path.exists(icon_path):
+            # 开发环境下使用icon.ico
+            abs_icon_path = os.path.abspath(icon_path)
+            abs_icon_path = abs_icon_path.replace('/', '\\')
+            winreg.SetValueEx(key, "Icon", 0, winreg.REG_SZ, f'"{abs_icon_path}",0')
+
+        # 创建command子键
+        key_command = winreg.CreateKey(key, "command")
+        winreg.SetValue(key_command, "", winreg.REG_SZ, _context_menu_command())
+
+        # 关闭键
+        winreg.CloseKey(key_command)
+        winreg.CloseKey(key)
+        return True
+    except Exception as e:
+        print(f"添加右键菜单失败: {str(e)}")
+        return False
+
+
+def remove_context_menu():
+    """移除右键菜单"""
+    if not IS_WINDOWS:
+        return False
+    import winreg
+    try:
+        # 直接删除主键即可，子键会自动删除
+        winreg.DeleteKey(winreg.HKEY_CLASSES_ROOT, CONTEXT_MENU_KEY)
+        return True
+    except Exception as e:
+        print(f"移除右键菜单失败: {str(e)}")
+        return False
@@ -0,0 +1,100 @@
+"""共享设置缓存
+
+所有窗口和编辑器共用同一份内存中的设置，读取直接命中缓存；写入只更新
+缓存并标记为待写，在空闲一段时间后合并写入 QSettings。拖动窗口时不会
+每个事件都写一次磁盘（或注册表）。
+"""
+from PyQt5.QtCore import QObject, QSettings, QTimer
+
+ORGANIZATION = 'TextEditor'
+# 最后一次修改后等待多久写入（毫秒）
+FLUSH_DELAY = 1000
+
+_MISSING = object()
+_stores = {}
+
+
+def get_store(application):
+    """获取 application 对应的共享设置缓存"""
+    store = _stores.get(application)
+    if store is None:
+        store = _stores[application] = SettingsStore(ORGANIZATION, application)
+    return store
+
+
+def flush_all():
+    """立即写入所有待写的设置"""
+    for store in _stores.values():
+        store.flush()
+
+
+def _convert(value, type):
+    """按 QSettings.value(type=...) 的习惯转换类型"""
+    if type is None or isinstance(value, type):
+        return value
+    if type is bool:
+        if isinstance(value, str):
+            return value.lower() in ('true', '1')
+        return bool(value)
+    return type(value)
+
+
+class SettingsStore(QObject):
+    """带延迟写入的设置缓存，接口与 QSettings 的 value/setValue 一致"""
+    def __init__(self, organization, application, parent=None):
+        super().__init__(parent)
+        self._settings = QSettings(organization, application)
+        self._cache = {}
+        self._dirty = set()
+        self.flush_count = 0  # 实际写入 QSettings 的次数
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(FLUSH_DELAY)
+        self._timer.timeout.connect(self.flush)
+
+    def value(self, key, default=None, type=None):
+        """读取设置，优先使用缓存"""
+        value = self._cache.get(key, _MISSING)
+        if value is _MISSING:
+            value = self._settings.value(key)
+            self._cache[key] = value
+        if value is None:
+            return default
+        try:
+            return _convert(value, type)
+        except (TypeError, ValueError):
+            return default
+
+    def intValue(self, key, default=0):
+        return self.value(key, default, type=int)
+
+    def boolValue(self, key, default=False):
+        return self.value(key, default, type=bool)
+
+    def strValue(self, key, default=''):
+        return self.value(key, default, type=str)
+
+    def setValue(self, key, value):
+        """修改设置，稍后统一写入"""
+        if self._cache.get(key, _MISSING) == value:
+            return
+        self._cache[key] = value
+        self._dirty.add(key)
+        self._timer.start()
+
+    def remove(self, key):
+        """删除设置"""
+        self._cache[key] = None
+        self._dirty.discard(key)
+        self._settings.remove(key)
+
+    def flush(self):
+        """把待写的设置写入 QSettings"""
+        self._timer.stop()
+        if not self._dirty:
+            return
+        for key in self._dirty:
+            self._settings.setValue(key, self._cache[key])
+        self._dirty.clear()
+        self._settings.sync()
+        self.flush_count += 1
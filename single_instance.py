@@ -0,0 +1,114 @@
+"""单实例运行
+
+第一个启动的进程监听一个本地套接字（Windows 上是命名管道）。之后再启动
+（例如从资源管理器右键菜单打开文件）时，先尝试连接这个套接字，把要打开的
+文件路径交给已运行的实例后立即退出，不再创建窗口、托盘图标和全局热键。
+"""
+import getpass
+import json
+
+from PyQt5.QtCore import QObject, QTimer, pyqtSignal
+from PyQt5.QtNetwork import QLocalServer, QLocalSocket
+
+# 连接已运行实例的超时（毫秒）
+CONNECT_TIMEOUT = 200
+# 收到文件后等待多久再统一打开，同时选中多个文件时资源管理器会为每个文件各启动一个进程
+BATCH_DELAY = 100
+
+
+def server_name():
+    """按用户区分的套接字名称，避免不同用户的实例互相连接"""
+    try:
+        user = getpass.getuser()
+    except Exception:
+        user = 'default'
+    return f'TextEditor-{user}'
+
+
+def send_to_running_instance(paths):
+    """把文件路径交给已运行的实例，没有已运行的实例时返回 False"""
+    socket = QLocalSocket()
+    socket.connectToServer(server_name())
+    if not socket.waitForConnected(CONNECT_TIMEOUT):
+        return False
+    message = json.dumps({'files': list(paths)}, ensure_ascii=False) + '\n'
+    socket.write(message.encode('utf-8'))
+    socket.waitForBytesWritten(CONNECT_TIMEOUT)
+    socket.disconnectFromServer()
+    if socket.state() != QLocalSocket.UnconnectedState:
+        socket.waitForDisconnected(CONNECT_TIMEOUT)
+    return True
+
+
+class InstanceServer(QObject):
+    """接收其他进程转发过来的文件路径"""
+    filesReceived = pyqtSignal(list)  # 一批要打开的文件，可能为空（只需显示窗口）
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.server = QLocalServer(self)
+        self.server.newConnection.connect(self.handleNewConnection)
+        self._buffers = {}  # 连接 -> 尚未读完的一行
+        self._pending = []
+        self._received = False
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(BATCH_DELAY)
+        self._timer.timeout.connect(self.flush)
+
+    def listen(self):
+        """开始监听；上次异常退出留下的套接字会先被清除
+
+        名称被占用时先试着连接：只有确认没有进程在监听（服务器不存在或
+        连接被拒绝）才清除。已运行的实例只是响应慢时保留它的名称，本进程
+        不监听，返回 False。
+        """
+        name = server_name()
+        if self.server.listen(name):
+            return True
+        socket = QLocalSocket()
+        socket.connectToServer(name)
+        if socket.waitForConnected(CONNECT_TIMEOUT):
+            socket.disconnectFromServer()
+            return False
+        if socket.error() not in (QLocalSocket.ServerNotFoundError,
+                                  QLocalSocket.ConnectionRefusedError):
+            return False
+        QLocalServer.removeServer(name)
+        return self.server.listen(name)
+
+    def handleNewConnection(self):
+        while self.server.hasPendingConnections():
+            socket = self.server.nextPendingConnection()
+            self._buffers[socket] = b''
+            socket.readyRead.connect(lambda s=socket: self.readSocket(s))
+            socket.disconnected.connect(lambda s=socket: self.readSocket(s, closing=True))
+
+    def readSocket(self, socket, closing=False):
+        """按行读取消息，每行是一个 JSON 对象"""
+        data = self._buffers.get(socket, b'') + bytes(socket.readAll())
+        *lines, rest = data.split(b'\n')
+        for line in lines:
+            self.handleMessage(line)
+        self._buffers[socket] = rest
+        if closing:
+            if rest.strip():
+                self.handleMessage(rest)
+            self._buffers.pop(socket, None)
+            socket.deleteLater()
+
+    def handleMessage(self, line):
+        try:
+            message = json.loads(line.decode('utf-8'))
+        except ValueError:
+            return
+        self._pending.extend(message.get('files', []))
+        self._received = True
+        self._timer.start()
+
+    def flush(self):
+        """把这段时间收到的文件作为一批交出去"""
+        files, self._pending = self._pending, []
+        if self._received:
+            self._received = False
+            self.filesReceived.emit(files)
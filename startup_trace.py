@@ -0,0 +1,55 @@
+"""启动耗时跟踪
+
+设置环境变量 TEXTEDITOR_STARTUP_TRACE 后，记录启动过程中各阶段距进程开始
+的时间，用于发现冷启动变慢的问题。值为 1 时输出到标准错误，其他值当作
+日志文件路径（追加写入）。未设置时 mark() 不做任何事情。
+"""
+import os
+import sys
+import time
+
+ENV_VAR = 'TEXTEDITOR_STARTUP_TRACE'
+
+_target = os.environ.get(ENV_VAR)
+_start = time.perf_counter()
+_marks = []
+
+
+def enabled():
+    return bool(_target)
+
+
+def mark(phase):
+    """记录一个阶段完成的时间"""
+    if not _target:
+        return
+    elapsed = (time.perf_counter() - _start) * 1000
+    _marks.append((phase, elapsed))
+    line = f'[startup] {elapsed:8.1f} ms  {phase}\n'
+    if _target == '1':
+        sys.stderr.write(line)
+    else:
+        with open(_target, 'a', encoding='utf-8') as f:
+            f.write(line)
+
+
+def marks():
+    """已记录的 (阶段, 毫秒) 列表"""
+    return list(_marks)
+
+
+def mark_first_paint(widget):
+    """在 widget 第一次绘制时记录 "first paint\""""
+    if not _target:
+        return
+    from PyQt5.QtCore import QObject, QEvent
+
+    class FirstPaintFilter(QObject):
+        def eventFilter(self, obj, event):
+            if event.type() == QEvent.Paint:
+                obj.removeEventFilter(self)
+                mark('first paint')
+            return False
+
+    widget._first_paint_filter = FirstPaintFilter(widget)
+    widget.installEventFilter(widget._first_paint_filter)
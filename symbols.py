@@ -0,0 +1,644 @@
+"""符号索引（分析部分）
+
+这里的函数在后台线程中运行，不依赖 Qt。Python 用 ast 分析，其他语言用
+只识别定义的轻量扫描器（C/C++、JavaScript、CSS 按花括号配对，HTML/XML、
+SQL、Shell、INI 用正则表达式）。
+
+Python 文档按顶层语句切成若干分块分别分析，较大的类再按成员切分。每块的
+符号行号相对于块的开头，编辑后只需调整各块的起始行；重新分析时只分析
+修改过的行所在的块。ast.parse 分析期间一直持有 GIL，分块后每次只持有
+几毫秒，50000 行的文件在后台分析时界面也不会卡住。其他语言的扫描器足够快，
+每次重新扫描整个文档。ast 在第一次分析 Python 文档时才导入。
+"""
+import bisect
+import re
+
+# 行数超过该值的顶层类按成员分块
+MAX_SEGMENT_LINES = 300
+# 分块解析失败时（例如跨块的多行字符串）最多向后合并的块数
+MAX_MERGED_SEGMENTS = 4
+# 符号名最多保留的字符数（CSS 选择器等可能很长）
+MAX_NAME_LENGTH = 80
+
+KIND_NAMES = {
+    'class': '类',
+    'function': '函数',
+    'method': '方法',
+    'variable': '变量',
+    'struct': '结构体',
+    'union': '联合体',
+    'enum': '枚举',
+    'namespace': '命名空间',
+    'macro': '宏',
+    'selector': '选择器',
+    'heading': '标题',
+    'id': 'ID',
+    'section': '节',
+    'table': '表',
+    'view': '视图',
+    'procedure': '存储过程',
+    'index': '索引',
+    'trigger': '触发器',
+    'sequence': '序列',
+    'type': '类型',
+}
+
+_NOT_NEWLINE = re.compile(r'[^\n]')
+
+
+class Symbol:
+    """一个定义：名称、种类（见 KIND_NAMES）、所在行列、嵌套深度和外层名称"""
+    def __init__(self, name, kind, line, column=0, depth=0, container=''):
+        self.name = name
+        self.kind = kind
+        self.line = line          # 在分块中为相对于块开头的行号
+        self.column = column      # 名称在行中的字符位置
+        self.depth = depth
+        self.container = container  # 外层定义的名称，用 . 连接
+
+    def __repr__(self):
+        return f'Symbol({self.name!r}, {self.kind!r}, {self.line})'
+
+
+class Chunk:
+    """文档中连续的一段行及其中的符号，所有分块首尾相接覆盖整个文档
+
+    indent、container、in_class 记录这段代码所在的层次，重新分析时按同样的
+    层次处理；header 表示按成员分块的类的类头。approximate 表示解析失败，
+    符号是用正则表达式找出的。
+    """
+    def __init__(self, start, count, symbols, indent='', container=(), in_class=False,
+                 header=False, approximate=False):
+        self.start = start
+        self.count = count
+        self.symbols = symbols
+        self.indent = indent
+        self.container = container
+        self.in_class = in_class
+        self.header = header
+        self.approximate = approximate
+
+    @property
+    def end(self):
+        return self.start + self.count
+
+    def copy(self):
+        return Chunk(self.start, self.count, self.symbols, self.indent, self.container,
+                     self.in_class, self.header, self.approximate)
+
+    def __repr__(self):
+        return f'Chunk({self.start}, {self.count}, {len(self.symbols)} symbols)'
+
+
+class Cancelled(Exception):
+    """分析被取消"""
+
+
+class _Restructure(Exception):
+    """局部重新分析时代码的层次发生了变化，需要分析整个文档"""
+
+
+def split_lines(text):
+    """按编辑器的方式（\\r\\n、\\r、\\n）分行"""
+    if '\r' in text:
+        # str.replace 比正则表达式分行快得多，分析线程持有 GIL 的时间更短
+        text = text.replace('\r\n', '\n').replace('\r', '\n')
+    return text.split('\n')
+
+
+def shift_line(line, edit_line, added):
+    """edit_line 行之后插入（added > 0）或删除（added < 0）若干行后，line 行的新行号
+
+    删除时被删掉的换行之后的行并入 edit_line 行，原来的第 edit_line - added
+    行成为第 edit_line 行。
+    """
+    if line <= edit_line:
+        return line
+    if added > 0:
+        return line + added
+    return max(edit_line, line + added)
+
+
+def edited_lines(edit_line, added):
+    """修改后需要重新分析的行范围 (first, last)
+
+    修改过的行可能不再开始一块（例如删掉了 class），前一块要一起重新分析。
+    删除行时，被删掉的换行之后的内容并入 edit_line 行，原来在删除范围内的
+    块边界都移到这一行上，下一行所在的块也要重新分析。
+    """
+    return max(0, edit_line - 1), edit_line + (1 if added < 0 else added)
+
+
+def shift_chunks(chunks, edit_line, added):
+    """编辑后调整各块的行范围，返回新的分块列表（被整体删除的块去掉）"""
+    if not added:
+        return chunks
+    result = []
+    for chunk in chunks:
+        if chunk.end <= edit_line:
+            result.append(chunk)
+            continue
+        start = shift_line(chunk.start, edit_line, added)
+        end = shift_line(chunk.end, edit_line, added)
+        if end > start:
+            chunk = chunk.copy()
+            chunk.start, chunk.count = start, end - start
+            result.append(chunk)
+    return result
+
+
+def document_symbols(chunks):
+    """按行号顺序产生 (行号, Symbol)"""
+    for chunk in chunks:
+        for symbol in chunk.symbols:
+            yield chunk.start + symbol.line, symbol
+
+
+def parse_document(language, lines, chunks=None, first=0, last=0, cancelled=None):
+    """分析文档，返回分块列表
+
+    给出上次的分块 chunks 和修改过的行范围 first 到 last 时，尽量只重新分析
+    这些行所在的块。cancelled() 返回 True 时抛出 Cancelled。
+    """
+    if language == 'python':
+        if chunks:
+            result = _reparse_python(lines, chunks, first, last, cancelled)
+            if result is not None:
+                return result
+        return _parse_python_range(lines, 0, len(lines), '', (), False, cancelled)
+    return [Chunk(0, len(lines), PARSERS[language]('\n'.join(lines)))]
+
+
+def fuzzy_regex(query):
+    """按顺序包含 query 中所有字符（不区分大小写）的名称的正则表达式，用于预先筛选"""
+    return re.compile('.*?'.join(map(re.escape, query)), re.IGNORECASE)
+
+
+def fuzzy_score(query, name):
+    """query（小写）的字符按顺序出现在 name 中时返回得分（越大越匹配），否则返回 None
+
+    连续匹配、匹配在词首（开头、下划线或点之后、驼峰的大写字母）得分高，
+    跳过的字符越多得分越低。
+    """
+    lower = name.lower()
+    score = 0
+    pos = 0
+    previous = -2
+    for ch in query:
+        i = lower.find(ch, pos)
+        if i < 0:
+            return None
+        if i == previous + 1:
+            score += 5
+        if i == 0 or name[i - 1] in '_.:$-# ' or (name[i].isupper() and name[i - 1].islower()):
+            score += 10
+        score -= i - pos
+        previous = i
+        pos = i + 1
+    if lower.startswith(query):
+        score += 20
+    if lower == query:
+        score += 50
+    return score - len(name) // 10
+
+
+# ---------------------------------------------------------------- Python
+
+_PY_CONTINUATION = re.compile(r'(?:else|elif|except|finally)\b')
+_PY_CLASS = re.compile(r'class[ \t]+(\w+)')
+_PY_DEFINITION = re.compile(r'([ \t]*)(?:async[ \t]+)?(def|class)[ \t]+(\w+)')
+
+
+def _python_segments(lines, start, end, indent):
+    """把 start 到 end 行按 indent 层次的语句切分，产生 (开始, 结束) 行范围
+
+    以 indent 开头、之后不是空白、注释、右括号和 else/except 等续接关键字的
+    行开始一条新语句；装饰器和它修饰的定义在同一块中。块之间的空行和
+    注释归入前一块，所有块首尾相接。
+    """
+    width = len(indent)
+    segment = start
+    has_statement = False
+    for i in range(start, end):
+        line = lines[i]
+        if (len(line) <= width or not line.startswith(indent)
+                or line[width] in ' \t#)]}' or _PY_CONTINUATION.match(line, width)):
+            continue
+        if has_statement:
+            yield segment, i
+            segment = i
+        has_statement = line[width] != '@'
+    if end > start:
+        yield segment, end
+
+
+def _python_source(lines, start, end, indent):
+    """去掉 indent 后的源代码；有缩进更少的代码行时抛出 _Restructure"""
+    if not indent:
+        return '\n'.join(lines[start:end])
+    width = len(indent)
+    source = []
+    for line in lines[start:end]:
+        if line.startswith(indent):
+            source.append(line[width:])
+        else:
+            stripped = line.lstrip()
+            if stripped and not stripped.startswith('#'):
+                raise _Restructure()
+            source.append(stripped)
+    return '\n'.join(source)
+
+
+def _python_symbols(body, lines, offset, container, in_class, symbols):
+    """收集语句列表 body 中的定义，行号减去 offset（块开头在 ast 中的行号）"""
+    import ast
+    for node in body:
+        if isinstance(node, (ast.ClassDef, ast.FunctionDef, ast.AsyncFunctionDef)):
+            if isinstance(node, ast.ClassDef):
+                kind = 'class'
+            else:
+                kind = 'method' if in_class else 'function'
+            line = node.lineno - offset
+            column = max(0, lines[line].find(node.name))
+            symbols.append(Symbol(node.name, kind, line, column, len(container),
+                                  '.'.join(container)))
+            _python_symbols(node.body, lines, offset, container + (node.name,),
+                            kind == 'class', symbols)
+        elif isinstance(node, (ast.Assign, ast.AnnAssign)):
+            if container and not in_class:
+                # 函数中的局部变量不列出
+                continue
+            targets = node.targets if isinstance(node, ast.Assign) else [node.target]
+            for target in targets:
+                names = target.elts if isinstance(target, ast.Tuple) else [target]
+                for name in names:
+                    if isinstance(name, ast.Name):
+                        line = name.lineno - offset
+                        symbols.append(Symbol(name.id, 'variable', line, name.col_offset,
+                                              len(container), '.'.join(container)))
+        elif not container or in_class:
+            # 模块和类层次的 if/try/with 中的定义（例如按条件导入、定义）
+            children = (getattr(node, 'body', []) + getattr(node, 'orelse', [])
+                        + getattr(node, 'finalbody', []))
+            for handler in getattr(node, 'handlers', []):
+                children += handler.body
+            if children:
+                _python_symbols(children, lines, offset, container, in_class, symbols)
+
+
+def _parse_python_segment(lines, start, end, indent, container, in_class):
+    """用 ast 分析一块代码，返回符号列表（行号相对于 start），语法错误时返回 None"""
+    import ast
+    source = _python_source(lines, start, end, indent)
+    try:
+        tree = ast.parse(source)
+    except (SyntaxError, ValueError):
+        return None
+    symbols = []
+    # ast 的行号从 1 开始，lines[start + line] 是符号所在的行
+    _python_symbols(tree.body, lines[start:end], 1, container, in_class, symbols)
+    return symbols
+
+
+def _python_fallback(lines, start, end, container, in_class):
+    """解析失败时用正则表达式找出 def 和 class，按缩进推断嵌套关系"""
+    symbols = []
+    stack = []  # (缩进宽度, 名称, 是否是类)
+    for i in range(start, end):
+        match = _PY_DEFINITION.match(lines[i])
+        if not match:
+            continue
+        width = len(match.group(1).expandtabs())
+        while stack and stack[-1][0] >= width:
+            stack.pop()
+        names = container + tuple(name for _, name, _ in stack)
+        is_class = match.group(2) == 'class'
+        if is_class:
+            kind = 'class'
+        else:
+            kind = 'method' if (stack[-1][2] if stack else in_class) else 'function'
+        symbols.append(Symbol(match.group(3), kind, i - start, match.start(3), len(names),
+                              '.'.join(names)))
+        stack.append((width, match.group(3), is_class))
+    return symbols
+
+
+def _split_class(lines, start, end, cancelled):
+    """把很长的顶层类切成类头和各个成员，无法切分时返回 None"""
+    i = start
+    while i < end and (lines[i].startswith('@') or not lines[i].strip()
+                       or lines[i].startswith('#')):
+        i += 1
+    match = _PY_CLASS.match(lines[i]) if i < end else None
+    if not match:
+        return None
+    # 类头可能跨多行（基类列表），找到括号配平后以冒号结尾的行
+    balance = 0
+    header_end = i
+    while header_end < end:
+        code = lines[header_end].split('#', 1)[0]
+        balance += code.count('(') + code.count('[') - code.count(')') - code.count(']')
+        if balance <= 0 and code.rstrip().endswith(':'):
+            break
+        header_end += 1
+    else:
+        return None
+    body = header_end + 1
+    first = body
+    while first < end and (not lines[first].strip() or lines[first].lstrip().startswith('#')):
+        first += 1
+    if first >= end:
+        return None
+    member_indent = lines[first][:len(lines[first]) - len(lines[first].lstrip())]
+    if not member_indent:
+        return None
+    name = match.group(1)
+    header = Chunk(start, body - start, [Symbol(name, 'class', i - start, match.start(1))],
+                   header=True)
+    try:
+        members = _parse_python_range(lines, body, end, member_indent, (name,), True, cancelled)
+    except _Restructure:
+        return None
+    return [header] + members
+
+
+def _parse_python_range(lines, start, end, indent, container, in_class, cancelled=None):
+    """分析 start 到 end 行（indent 层次的若干语句），返回分块列表"""
+    segments = list(_python_segments(lines, start, end, indent))
+    chunks = []
+    k = 0
+    while k < len(segments):
+        if cancelled is not None and cancelled():
+            raise Cancelled()
+        segment_start, segment_end = segments[k]
+        if not indent and segment_end - segment_start > MAX_SEGMENT_LINES:
+            split = _split_class(lines, segment_start, segment_end, cancelled)
+            if split is not None:
+                chunks.extend(split)
+                k += 1
+                continue
+        # 多行字符串、括号跨越块边界时单独一块无法解析，与后面的块合并后重试
+        for merged in range(min(MAX_MERGED_SEGMENTS + 1, len(segments) - k)):
+            segment_end = segments[k + merged][1]
+            try:
+                symbols = _parse_python_segment(lines, segment_start, segment_end, indent,
+                                                container, in_class)
+            except _Restructure:
+                if merged == 0:
+                    raise
+                symbols = None
+            if symbols is not None:
+                chunks.append(Chunk(segment_start, segment_end - segment_start, symbols,
+                                    indent, container, in_class))
+                k += merged + 1
+                break
+        else:
+            segment_end = segments[k][1]
+            chunks.append(Chunk(segment_start, segment_end - segment_start,
+                                _python_fallback(lines, segment_start, segment_end,
+                                                 container, in_class),
+                                indent, container, in_class, approximate=True))
+            k += 1
+    return chunks
+
+
+def _reparse_python(lines, chunks, first, last, cancelled):
+    """只重新分析 first 到 last 行所在的块，返回新的分块列表
+
+    分块与文档对不上、修改涉及不同层次的块或类头、代码层次发生变化时返回
+    None，由调用者分析整个文档。
+    """
+    if chunks[0].start != 0 or chunks[-1].end != len(lines):
+        return None
+    for previous, chunk in zip(chunks, chunks[1:]):
+        if previous.end != chunk.start:
+            return None
+    starts = [chunk.start for chunk in chunks]
+    i = max(0, bisect.bisect_right(starts, first) - 1)
+    j = max(i, bisect.bisect_right(starts, last) - 1)
+    group = chunks[i:j + 1]
+    level = (group[0].indent, group[0].container, group[0].in_class)
+    if any(chunk.header or (chunk.indent, chunk.container, chunk.in_class) != level
+           for chunk in group):
+        return None
+    start = group[0].start
+    # 文档末尾新增的行归入最后一块
+    end = group[-1].end if j < len(chunks) - 1 else len(lines)
+    try:
+        new = _parse_python_range(lines, start, end, *level, cancelled)
+    except _Restructure:
+        return None
+    return chunks[:i] + new + chunks[j + 1:]
+
+
+# ---------------------------------------------------------------- 其他语言
+
+def _blank(match):
+    """把注释、字符串替换为等长的空格，保留换行，位置不变"""
+    return _NOT_NEWLINE.sub(' ', match.group())
+
+
+class _Positions:
+    """按递增的字符偏移计算行列号"""
+    def __init__(self, text):
+        self.text = text
+        self.offset = 0
+        self.line = 0
+
+    def __call__(self, offset):
+        text = self.text
+        if offset >= self.offset:
+            self.line += text.count('\n', self.offset, offset)
+        else:
+            self.line = text.count('\n', 0, offset)
+        self.offset = offset
+        return self.line, offset - text.rfind('\n', 0, offset) - 1
+
+
+def _short(name):
+    name = ' '.join(name.split())
+    return name if len(name) <= MAX_NAME_LENGTH else name[:MAX_NAME_LENGTH - 1] + '…'
+
+
+def _scan_braces(text, noise, classify, statements=None):
+    """去掉注释和字符串后按花括号配对扫描，对每个 { 之前的一段文字（头部）
+    调用 classify(头部, 外层种类) 得到 (名称, 种类, 名称在头部中的偏移)
+
+    statements 给出时，对以 ; 结尾的语句也调用它（识别 JavaScript 中不带
+    花括号的箭头函数等）。
+    """
+    code = noise.sub(_blank, text)
+    positions = _Positions(code)
+    symbols = []
+    scopes = []  # (种类, 名称)，不产生符号的块为 (None, None)
+    head_start = 0
+    for match in re.finditer(r'[{};]', code):
+        ch = match.group()
+        pos = match.start()
+        if ch == '}':
+            if scopes:
+                scopes.pop()
+        else:
+            outer = scopes[-1][0] if scopes else None
+            classifier = classify if ch == '{' else statements
+            result = None
+            if classifier is not None and outer not in ('function', 'method'):
+                result = classifier(code[head_start:pos], outer)
+            elif classifier is not None and statements is not None:
+                # JavaScript 函数中的嵌套函数
+                result = classifier(code[head_start:pos], outer)
+                if result and result[1] not in ('function', 'class'):
+                    result = None
+            if result:
+                name, kind, offset = result
+                line, column = positions(head_start + offset)
+                names = [scope_name for _, scope_name in scopes if scope_name]
+                symbols.append(Symbol(_short(name), kind, line, column, len(names),
+                                      '.'.join(names)))
+                if ch == '{':
+                    scopes.append((kind, name))
+            elif ch == '{':
+                scopes.append((outer if outer in ('function', 'method') else None, None))
+        head_start = pos + 1
+    return symbols
+
+
+_C_NOISE = re.compile(r'//[^\n]*|/\*.*?(?:\*/|$)|"(?:\\.|[^"\\\n])*"?|\'(?:\\.|[^\'\\\n])*\'?'
+                      r'|^[ \t]*#(?:[^\n]*\\\n)*[^\n]*', re.S | re.M)
+_C_MACRO = re.compile(r'^[ \t]*#[ \t]*define[ \t]+(\w+)', re.M)
+_C_TYPE = re.compile(r'\b(class|struct|union|enum|namespace)\b(?:\s+(?:class|struct)\b)?'
+                     r'(?:\s+\[\[[^\]]*\]\])?(?:\s+[A-Z_][A-Z0-9_]*(?=\s+\w))?\s*([A-Za-z_]\w*)?'
+                     r'[^(){};]*$')
+_C_FUNCTION = re.compile(r'(~?[A-Za-z_][\w:~]*|operator\s*[^\s(]+(?:\s*\(\))?)\s*'
+                         r'\([^()]*(?:\([^()]*\)[^()]*)*\)\s*'
+                         r'(?:const\b|noexcept\b|override\b|final\b|volatile\b|&&?|\s'
+                         r'|->\s*[\w:<>,*&\s]+|throw\s*\([^()]*\))*'
+                         r'(?::[^{};]*)?$')
+_C_KEYWORDS = {'if', 'for', 'while', 'switch', 'catch', 'return', 'sizeof', 'else', 'do',
+               'new', 'delete', 'case', 'defined', 'alignof', 'decltype', 'static_assert',
+               'try', 'throw'}
+
+
+def _classify_c(head, outer):
+    match = _C_TYPE.search(head)
+    if match:
+        kind = 'class' if match.group(1) == 'class' else match.group(1)
+        if match.group(2):
+            return match.group(2), kind, match.start(2)
+        return None
+    match = _C_FUNCTION.search(head)
+    if match and match.group(1) not in _C_KEYWORDS:
+        name = match.group(1)
+        kind = 'method' if '::' in name or outer in ('class', 'struct', 'union') else 'function'
+        return name, kind, match.start(1)
+    return None
+
+
+def parse_c(text):
+    symbols = _scan_braces(text, _C_NOISE, _classify_c)
+    positions = _Positions(text)
+    for match in _C_MACRO.finditer(text):
+        line, column = positions(match.start(1))
+        symbols.append(Symbol(match.group(1), 'macro', line, column))
+    symbols.sort(key=lambda symbol: symbol.line)
+    return symbols
+
+
+_JS_NOISE = re.compile(r'//[^\n]*|/\*.*?(?:\*/|$)|"(?:\\.|[^"\\\n])*"?|\'(?:\\.|[^\'\\\n])*\'?'
+                       r'|`(?:\\.|[^`\\])*`?', re.S)
+_JS_CLASS = re.compile(r'\bclass\s+([\w$]+)[^()]*$')
+_JS_FUNCTION = re.compile(r'\bfunction\s*\*?\s*([\w$]+)\s*\([^()]*\)\s*$')
+_JS_ASSIGNED = re.compile(r'(?:\b(?:const|let|var)\s+)?([\w$][\w$.]*)\s*[=:]\s*(?:async\s+)?'
+                          r'(?:function\b\s*\*?\s*[\w$]*\s*\([^()]*\)|\([^()]*\)\s*=>|[\w$]+\s*=>)'
+                          r'\s*$')
+_JS_ARROW = re.compile(r'\b(?:const|let|var)\s+([\w$]+)\s*=\s*(?:async\s+)?'
+                       r'(?:\([^()]*\)|[\w$]+)\s*=>')
+_JS_METHOD = re.compile(r'^\s*(?:(?:static|async|get|set)\s+|\*\s*)*([\w$#]+)\s*\([^()]*\)\s*$')
+_JS_KEYWORDS = {'if', 'for', 'while', 'switch', 'catch', 'function', 'return', 'with'}
+
+
+def _classify_js(head, outer):
+    for pattern, kind in ((_JS_CLASS, 'class'), (_JS_FUNCTION, 'function'),
+                          (_JS_ASSIGNED, 'function')):
+        match = pattern.search(head)
+        if match:
+            return match.group(1), kind, match.start(1)
+    if outer == 'class':
+        match = _JS_METHOD.search(head)
+        if match and match.group(1) not in _JS_KEYWORDS:
+            return match.group(1), 'method', match.start(1)
+    return None
+
+
+def _js_statement(head, outer):
+    match = _JS_ARROW.search(head)
+    if match:
+        return match.group(1), 'function', match.start(1)
+    return None
+
+
+def parse_javascript(text):
+    return _scan_braces(text, _JS_NOISE, _classify_js, _js_statement)
+
+
+_CSS_NOISE = re.compile(r'/\*.*?(?:\*/|$)|"(?:\\.|[^"\\\n])*"?|\'(?:\\.|[^\'\\\n])*\'?', re.S)
+
+
+def _classify_css(head, outer):
+    stripped = head.strip()
+    if not stripped or outer not in (None, 'selector'):
+        return None
+    return stripped, 'selector', head.index(stripped[0])
+
+
+def parse_css(text):
+    return _scan_braces(text, _CSS_NOISE, _classify_css)
+
+
+def _regex_parser(pattern, kind_of):
+    """用正则表达式识别定义的分析函数；kind_of(match) 返回 (名称, 种类, 深度, 名称组号)"""
+    def parse(text):
+        positions = _Positions(text)
+        symbols = []
+        for match in pattern.finditer(text):
+            result = kind_of(match)
+            if result:
+                name, kind, depth, group = result
+                line, column = positions(match.start(group))
+                symbols.append(Symbol(_short(name), kind, line, column, depth))
+        return symbols
+    return parse
+
+
+_MARKUP = re.compile(r'<(h[1-6])\b[^>]*>(.*?)</\1\s*>|<[\w:-]+[^>]*?\bid\s*=\s*["\']([^"\']+)',
+                     re.S | re.I)
+_TAGS = re.compile(r'<[^>]*>')
+
+
+def _markup_kind(match):
+    if match.group(1):
+        title = _TAGS.sub('', match.group(2)).strip()
+        return title or match.group(1), 'heading', int(match.group(1)[1]) - 1, 2
+    return '#' + match.group(3), 'id', 0, 3
+
+
+_SQL = re.compile(r'\bCREATE\s+(?:OR\s+REPLACE\s+)?(?:(?:TEMP|TEMPORARY|UNIQUE)\s+)?'
+                  r'(TABLE|VIEW|FUNCTION|PROCEDURE|INDEX|TRIGGER|SEQUENCE|TYPE)\s+'
+                  r'(?:IF\s+NOT\s+EXISTS\s+)?([\w."`\[\]]+)', re.I)
+_BASH = re.compile(r'^[ \t]*(?:function[ \t]+([\w:.-]+)(?:[ \t]*\(\))?|([\w:.-]+)[ \t]*\(\))',
+                   re.M)
+_INI = re.compile(r'^[ \t]*\[([^\]\r\n]+)\]', re.M)
+
+PARSERS = {
+    'cpp': parse_c,
+    'javascript': parse_javascript,
+    'css': parse_css,
+    'html': _regex_parser(_MARKUP, _markup_kind),
+    'xml': _regex_parser(_MARKUP, _markup_kind),
+    'sql': _regex_parser(_SQL, lambda m: (m.group(2), m.group(1).lower(), 0, 2)),
+    'bash': _regex_parser(_BASH, lambda m: (m.group(1) or m.group(2), 'function', 0,
+                                            1 if m.group(1) else 2)),
+    'ini': _regex_parser(_INI, lambda m: (m.group(1).strip(), 'section', 0, 1)),
+}
+# 支持符号索引的语言
+LANGUAGES = {'python'} | set(PARSERS)
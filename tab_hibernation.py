@@ -0,0 +1,107 @@
+"""标签页延迟创建与休眠
+
+打开但尚未查看过的文件只放一个轻量的占位标签，第一次切换过去时才创建
+Editor 并加载内容。长时间未使用、且没有未保存修改的标签会被"休眠"：
+释放 Scintilla 缓冲区，换回占位标签，只保留光标、滚动位置和缩放，
+再次切换过去时重新加载并恢复这些状态。
+"""
+import time
+
+from PyQt5.QtCore import QObject, QTimer
+from PyQt5.QtWidgets import QWidget
+
+import settings_store
+
+# 默认空闲多少分钟后休眠
+DEFAULT_HIBERNATE_MINUTES = 30
+# 默认所有已加载标签的内存预算（MB），超出时从最久未使用的开始休眠
+DEFAULT_MEMORY_BUDGET_MB = 512
+# 检查间隔（毫秒）
+CHECK_INTERVAL = 60 * 1000
+# 每个 Scintilla 编辑器除文本以外的大致固定开销
+EDITOR_OVERHEAD = 256 * 1024
+
+
+def estimate_memory(editor):
+    """估算一个编辑器占用的内存：文本和样式各一个字节，再加上固定开销"""
+    return editor.SendScintilla(editor.SCI_GETLENGTH) * 2 + EDITOR_OVERHEAD
+
+
+class TabPlaceholder(QWidget):
+    """尚未加载（或已休眠）的标签页，只保存路径和视图状态"""
+    def __init__(self, filepath, view_state=None, parent=None):
+        super().__init__(parent)
+        self.filepath = filepath
+        self.view_state = view_state  # Editor.viewState() 的结果
+        self.modified = False
+        self.encoding = ''
+        self.encoding_confidence = 0.0
+        self.line_ending = ''
+        self.mixed_line_endings = False
+        self.loader = None
+        self.saver = None
+        self.profile = None
+        self.profile_override = None
+        self.last_active = 0.0
+        self.follower = None
+        self.journal = None
+
+    def isReadOnly(self):
+        return True
+
+
+class TabHibernator(QObject):
+    """定期检查并休眠空闲标签"""
+    def __init__(self, window):
+        super().__init__(window)
+        self.window = window
+        self.settings = settings_store.get_store('EditorSettings')
+        self.hibernated_count = 0
+        self._timer = QTimer(self)
+        self._timer.setInterval(CHECK_INTERVAL)
+        self._timer.timeout.connect(self.check)
+        self._timer.start()
+
+    def candidates(self):
+        """可以休眠的标签：非当前、已保存到文件、没有未保存修改、没有后台任务"""
+        tabs = self.window.tabs
+        current = tabs.currentWidget()
+        result = []
+        for index in range(tabs.count()):
+            editor = tabs.widget(index)
+            if (editor is not current and self.window.isHibernatable(editor)):
+                result.append(editor)
+        return result
+
+    def check(self):
+        """休眠空闲过久的标签，并把已加载标签的内存控制在预算之内"""
+        idle_limit = self.settings.value('hibernateAfterMinutes',
+                                         DEFAULT_HIBERNATE_MINUTES, type=int) * 60
+        budget = self.settings.value('tabMemoryBudgetMB',
+                                     DEFAULT_MEMORY_BUDGET_MB, type=int) * 1024 * 1024
+        now = time.monotonic()
+        candidates = sorted(self.candidates(), key=lambda e: e.last_active)
+
+        remaining = []
+        for editor in candidates:
+            if idle_limit > 0 and now - editor.last_active >= idle_limit:
+                self.hibernate(editor)
+            else:
+                remaining.append(editor)
+
+        if budget <= 0:
+            return
+        tabs = self.window.tabs
+        total = sum(estimate_memory(tabs.widget(i)) for i in range(tabs.count())
+                    if self.window.isLoadedEditor(tabs.widget(i)))
+        for editor in remaining:
+            if total <= budget:
+                break
+            total -= estimate_memory(editor)
+            self.hibernate(editor)
+
+    def hibernate(self, editor):
+        index = self.window.tabs.indexOf(editor)
+        if index >= 0:
+            self.window.hibernateTab(index)
+            self.hibernated_count += 1
@@ -0,0 +1,78 @@
+"""符号索引的回归检查：随机插入、删除后局部重新分析的结果与整体分析一致
+
+    python -m unittest test_symbols
+"""
+import os
+import random
+import unittest
+
+import symbols
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+# 随机插入的代码片段
+SNIPPETS = ['\n', '\n\n', 'def f():\n    pass\n', 'class K:\n    x = 1\n', '    y = 2\n',
+            'z = 3', '\n    def g(self):\n        return 1\n', 'class ']
+# 随机删除的字符数
+DELETE_LENGTHS = [1, 5, 20, 80, 300]
+
+
+def flatten(chunks):
+    return [(line, s.name, s.kind, s.depth, s.container)
+            for line, s in symbols.document_symbols(chunks)]
+
+
+class IncrementalParseTest(unittest.TestCase):
+    def check_random_edits(self, path, runs):
+        with open(os.path.join(SCRIPT_DIR, path), encoding='utf-8') as f:
+            source = f.read()
+        for seed in range(runs):
+            rng = random.Random(seed)
+            text = source
+            chunks = symbols.parse_document('python', symbols.split_lines(text))
+            dirty = None
+            # 与 outline.DocumentSymbols.handleModified 相同地调整分块和修改范围
+            for _ in range(rng.randrange(1, 4)):
+                position = rng.randrange(len(text) + 1)
+                line = text.count('\n', 0, position)
+                if rng.random() < 0.5:
+                    inserted = rng.choice(SNIPPETS)
+                    text = text[:position] + inserted + text[position:]
+                    added = inserted.count('\n')
+                else:
+                    end = min(len(text), position + rng.choice(DELETE_LENGTHS))
+                    added = -text.count('\n', position, end)
+                    text = text[:position] + text[end:]
+                if added:
+                    chunks = symbols.shift_chunks(chunks, line, added)
+                    if dirty is not None:
+                        dirty = (symbols.shift_line(dirty[0], line, added),
+                                 symbols.shift_line(dirty[1], line, added))
+                first, last = symbols.edited_lines(line, added)
+                if dirty is None:
+                    dirty = (first, last)
+                else:
+                    dirty = (min(dirty[0], first), max(dirty[1], last))
+            lines = symbols.split_lines(text)
+            incremental = symbols.parse_document('python', lines, chunks, *dirty)
+            full = symbols.parse_document('python', lines)
+            self.assertEqual(flatten(incremental), flatten(full), f'{path} seed {seed}')
+
+    def test_editor_source(self):
+        self.check_random_edits('1.py', 100)
+
+    def test_symbols_source(self):
+        self.check_random_edits('symbols.py', 200)
+
+    def test_delete_blank_lines_between_functions(self):
+        lines = ['def alpha():', '    return 1', '', '', 'def beta():', '    return 2', '']
+        chunks = symbols.parse_document('python', lines)
+        del lines[2:4]
+        chunks = symbols.shift_chunks(chunks, 2, -2)
+        incremental = symbols.parse_document('python', lines, chunks,
+                                             *symbols.edited_lines(2, -2))
+        self.assertEqual([(line, s.name) for line, s in symbols.document_symbols(incremental)],
+                         [(0, 'alpha'), (2, 'beta')])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+"""界面更新调度
+
+每次按键都会触发 textChanged，如果每次都立即更新行号栏宽度、标签标题
+和状态栏，大文档下输入会明显变慢。这里把这些更新标记为"待更新"，
+在本轮事件循环空闲时统一执行一次。
+"""
+from PyQt5.QtCore import QObject, QTimer
+
+import perf_trace
+
+# 待更新的内容
+MARGIN = 1       # 行号栏宽度
+TAB_TITLE = 2    # 标签标题（修改标记）
+STATUS_BAR = 4   # 状态栏
+PROFILE = 8      # 大段修改后重新评估性能档位
+
+
+class UpdateScheduler(QObject):
+    """合并同一轮事件循环内的界面更新"""
+    def __init__(self, window):
+        super().__init__(window)
+        self.window = window
+        self._dirty = {}  # 编辑器 -> 待更新标记
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(0)  # 事件队列处理完后触发
+        self._timer.timeout.connect(self.flush)
+
+    def schedule(self, editor, flags):
+        """标记 editor 需要更新的内容"""
+        self._dirty[editor] = self._dirty.get(editor, 0) | flags
+        if not self._timer.isActive():
+            self._timer.start()
+
+    def discard(self, editor):
+        """丢弃 editor 的待更新内容（editor 即将被销毁时调用）"""
+        self._dirty.pop(editor, None)
+
+    @perf_trace.timed('ui.flush')
+    def flush(self):
+        """执行所有待更新的内容"""
+        dirty, self._dirty = self._dirty, {}
+        window = self.window
+        for editor, flags in dirty.items():
+            if flags & MARGIN:
+                editor.updateLineNumberWidth()
+            if flags & PROFILE:
+                editor.checkProfile()
+            if flags & TAB_TITLE:
+                index = window.tabs.indexOf(editor)
+                if index >= 0:
+                    window.updateTabTitle(index)
+            if flags & STATUS_BAR and editor is window.currentEditor():
+                window.updateStatusBar()